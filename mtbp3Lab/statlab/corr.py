@@ -13,10 +13,238 @@
 #  You should have received a copy of the GNU General Public license
 #  along with this program. If not, see <https://www.gnu.org/license/>
 
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+
+def _rank_codes(y):
+    """
+    Converts a 1-dimensional array into integer codes that preserve the order of the values.
+
+    Parameters:
+    - y: A 1-dimensional array of numbers or strings.
+
+    Returns:
+    - An int64 array where equal values share a code and smaller values have smaller codes.
+      Missing values (NA) are coded as -1.
+    """
+    codes, _ = pd.factorize(np.asarray(y), sort=True)
+    return codes.astype(np.int64, copy=False)
+
+def _count_inversions(a):
+    """
+    Counts the pairs i < j with a[i] > a[j] using a bottom-up merge sort.
+
+    Short runs are counted directly. Each following pass merges neighbouring sorted runs with a stable sort
+    keyed on (run pair, value), so every pass is linear in the length of the input and the memory use stays O(n).
+
+    Parameters:
+    - a: A 1-dimensional array of non-negative integer codes.
+
+    Returns:
+    - The number of inversions as an int.
+    """
+    a = np.asarray(a, dtype=np.int64)
+    n = a.size
+    if n < 2:
+        return 0
+    m = int(a.max()) + 1
+    pos = np.arange(n, dtype=np.int64)
+
+    # runs of 16 values are counted by direct comparison and sorted before merging
+    width = min(16, n)
+    n_run = n // width
+    head = a[:n_run * width].reshape(n_run, width)
+    tail = a[n_run * width:]
+    upper = np.triu(np.ones((width, width), dtype=bool), k=1)
+    swaps = int(np.sum((head[:, :, None] > head[:, None, :]) & upper))
+    swaps += int(np.sum((tail[:, None] > tail[None, :]) & upper[:tail.size, :tail.size]))
+    a = np.concatenate((np.sort(head, axis=1).ravel(), np.sort(tail)))
+    while width < n:
+        block = pos // width
+        pair = block // 2
+        is_left = (block % 2) == 0
+        order = np.argsort(pair * m + a, kind='stable')
+        a = a[order]
+        is_left = is_left[order]
+        pair = pair[order]
+        # for a right-run value, the left-run values merged after it are the ones greater than it
+        n_left = np.minimum(width, n - 2 * width * pair)
+        left_before = np.cumsum(is_left) - pair * width
+        swaps += int(np.sum((n_left - left_before)[~is_left]))
+        width *= 2
+    return swaps
+
+def _count_tied_pairs(codes):
+    """
+    Counts the number of tied pairs, sum of t(t-1)/2 over the groups of tied values.
+
+    Parameters:
+    - codes: A 1-dimensional array of non-negative integer codes.
+
+    Returns:
+    - The number of tied pairs as an int.
+    """
+    t = np.bincount(codes).astype(np.int64)
+    return int(np.sum(t * (t - 1) // 2))
+
+def _kendall_tau_b(y1, y2):
+    """
+    Calculates Kendall's tau-b in O(n log n) time and O(n) memory (Knight's algorithm).
+
+    Parameters:
+    - y1: A 1-dimensional array of numbers or strings.
+    - y2: A 1-dimensional array of numbers or strings with the same length as y1.
+
+    Returns:
+    - The Kendall's tau-b coefficient as a float, or nan if either input is constant.
+    """
+    return _kendall_tau_b_codes(_rank_codes(y1), _rank_codes(y2))
+
+def _kendall_tau_b_codes(c1, c2):
+    """
+    Calculates Kendall's tau-b from the rank codes of two columns without missing values.
+
+    Parameters:
+    - c1: A 1-dimensional array of rank codes, see _rank_codes.
+    - c2: A 1-dimensional array of rank codes with the same length as c1.
+
+    Returns:
+    - The Kendall's tau-b coefficient as a float, or nan if either input is constant.
+    """
+    return _tau_b_from_counts(*_kendall_pair_counts(c1, c2))
+
+def _kendall_pair_counts(c1, c2):
+    """
+    Counts the pairs needed for Kendall's tau-b from the rank codes of two columns without missing values.
+
+    Parameters:
+    - c1: A 1-dimensional array of rank codes, see _rank_codes.
+    - c2: A 1-dimensional array of rank codes with the same length as c1.
+
+    Returns:
+    - n0: The number of pairs.
+    - n1: The number of pairs tied in c1.
+    - n2: The number of pairs tied in c2.
+    - s: The number of concordant pairs minus the number of discordant pairs.
+    """
+    n = c1.size
+    order = np.lexsort((c2, c1))
+    c1 = c1[order]
+    c2 = c2[order]
+
+    n0 = n * (n - 1) // 2
+    n1 = _count_tied_pairs(c1)
+    n2 = _count_tied_pairs(c2)
+    if n > 1:
+        joint = np.flatnonzero((np.diff(c1) != 0) | (np.diff(c2) != 0))
+        t = np.diff(np.concatenate(([-1], joint, [n - 1])))
+        n3 = int(np.sum(t * (t - 1) // 2))
+    else:
+        n3 = 0
+    swaps = _count_inversions(c2)
+    return n0, n1, n2, n0 - n1 - n2 + n3 - 2 * swaps
+
+def _tau_b_from_counts(n0, n1, n2, s):
+    """
+    Calculates Kendall's tau-b from the pair counts, see _kendall_pair_counts.
+    """
+    denominator = (n0 - n1) * (n0 - n2)
+    if denominator == 0:
+        return np.nan
+    return s / np.sqrt(float(denominator))
+
+def _average_ranks(codes):
+    """
+    Converts rank codes into 1-based ranks, where tied values get the average of their ranks.
+
+    Parameters:
+    - codes: A 1-dimensional array of rank codes without missing values.
+
+    Returns:
+    - A float64 array of ranks.
+    """
+    t = np.bincount(codes)
+    return (np.cumsum(t) - (t - 1) / 2.0)[codes]
+
+def _standardize(r):
+    """
+    Centers and scales ranks so that the Pearson correlation of two columns is their mean product.
+
+    Parameters:
+    - r: A 1-dimensional array of ranks.
+
+    Returns:
+    - A float64 array, or an array of nan if all ranks are equal.
+    """
+    r = r - r.mean()
+    scale = np.sqrt(np.mean(r ** 2))
+    return r / scale if scale > 0 else np.full(r.shape, np.nan)
+
+def _spearman_rho_codes(c1, c2):
+    """
+    Calculates Spearman's rho from the rank codes of two columns without missing values.
+
+    Parameters:
+    - c1: A 1-dimensional array of rank codes, see _rank_codes.
+    - c2: A 1-dimensional array of rank codes with the same length as c1.
+
+    Returns:
+    - The Spearman's rho coefficient as a float, or nan if either input is constant.
+    """
+    z1 = _standardize(_average_ranks(c1))
+    z2 = _standardize(_average_ranks(c2))
+    return float(np.mean(z1 * z2))
+
+_PAIR_CODES = None
+_PAIR_Z = None
+
+def _init_pair_worker(codes, z):
+    """
+    Stores the rank codes (and standardized ranks) once per worker process.
+    """
+    global _PAIR_CODES, _PAIR_Z
+    _PAIR_CODES = codes
+    _PAIR_Z = z
+
+def _calculate_pairs(pairs, method, codes=None, z=None):
+    """
+    Calculates the correlation coefficient for a list of column pairs with pairwise deletion of NA.
+
+    Parameters:
+    - pairs: A list of (i, j) column indices.
+    - method: 'kendall' or 'spearman'.
+    - codes: A 2-dimensional array of rank codes (rows are samples), or None to use the worker copy.
+    - z: A 2-dimensional array of standardized ranks for 'spearman' (nan for columns with NA), or None to use the worker copy.
+
+    Returns:
+    - A list of float.
+    """
+    if codes is None:
+        codes, z = _PAIR_CODES, _PAIR_Z
+    out = []
+    for i, j in pairs:
+        c1 = codes[:, i]
+        c2 = codes[:, j]
+        keep = (c1 >= 0) & (c2 >= 0)
+        complete = keep.all()
+        if not complete:
+            c1 = c1[keep]
+            c2 = c2[keep]
+        if c1.size < 2:
+            out.append(np.nan)
+        elif method == 'kendall':
+            out.append(_kendall_tau_b_codes(c1, c2))
+        elif complete:
+            out.append(float(np.mean(z[:, i] * z[:, j])))
+        else:
+            out.append(_spearman_rho_codes(c1, c2))
+    return out
+
+
 class CorrCalculator:
     """
     A class for calculating correlation and plotting scatter plots.
@@ -25,15 +253,31 @@ class CorrCalculator:
     - y: A pandas DataFrame or a list
         - If y is a pandas DataFrame, it must be a 2-dimensional DataFrame with at least 2 columns and 2 rows.
         - If y is a list, it must be a list with at least 2 elements, where each element is a list of strings or numbers.
-    - remove_na: bool, optional (default=True)
+    - remove_na: bool or str, optional (default=True)
         - If True, remove rows with missing values (NA) from the input data.
         - If False, raise a ValueError if the input data contains missing values (NA).
+        - If 'pairwise', keep missing values and remove them separately for each pair of columns.
+
+    Attributes:
+    - y_arr: A 2-dimensional float64 array (samples by columns) used for all calculations.
+        - Non-numeric columns are stored as the codes of their sorted categories, see y_categories.
+        - A numeric DataFrame without NA is used without copying when pandas allows it.
+    - y_df, y_list: The input data as a DataFrame or as a list of columns, created only when first used.
 
     Methods:
-    - calculate_kendall_tau():
+    - calculate_kendall_tau(method='merge'):
         - Calculates the Kendall's tau correlation coefficient between the first two columns of the input data.
+        - method: 'merge' (default) for the O(n log n) merge-sort algorithm, or 'matrix' for the n by n sign matrix.
         - Returns the Kendall's tau coefficient as a float.
 
+    - calculate_spearman_rho():
+        - Calculates the Spearman's rho correlation coefficient between the first two columns of the input data.
+        - Returns the Spearman's rho coefficient as a float.
+
+    - calculate_corr_matrix(method='kendall', n_jobs=1):
+        - Calculates the correlation coefficients between all pairs of columns of the input data.
+        - Returns a pandas DataFrame.
+
     - plot_y_list(loc=[0,1], axis_label=['x','y']):
         - Plots a scatter plot of the input data.
         - loc: list, optional (default=[0,1])
@@ -48,44 +292,195 @@ class CorrCalculator:
         if isinstance(y, pd.DataFrame):
             assert y.ndim == 2, "y must be a 2-dimensional DataFrame"
             assert y.shape[0] >= 2 and y.shape[1] >= 2, "y must be a pd.DataFrame with at least 2 columns and 2 rows"
-            if remove_na == True:
-                self.y_df = y.dropna()
+            self.y_columns = y.columns
+            if all(pd.api.types.is_numeric_dtype(t) and not pd.api.types.is_bool_dtype(t) for t in y.dtypes):
+                y_arr = y.to_numpy(dtype=np.float64, na_value=np.nan)
+                self.y_categories = {}
             else:
-                if y.isna().any().any():
-                    raise ValueError("Input data contains missing values (NA)")
-            self.y_shape0, self.y_shape1 = self.y_df.shape
-            self.y_list = self.y_df.values.tolist()
+                y_arr, self.y_categories = self.__encode_columns([y.iloc[:, i].to_numpy() for i in range(y.shape[1])])
         else:
             assert isinstance(y, list) and len(y) >= 2, "y must be a list with at least 2 elements"
             assert all(isinstance(x, list) for x in y), "all elements of y must be lists"
             assert all(isinstance(x, (str, int)) for sublist in y for x in sublist if x is not None), "all elements of y must be strings or numbers"
             assert all(len(x) == len(y[0]) for x in y), "all sublists in y must have the same length"
-            self.y_shape0 = len(y[0])
-            self.y_shape1 = len(y)
-            self.y_list = y
-            self.y_df = pd.DataFrame(self.y_list).T.dropna()
+            self.y_columns = pd.RangeIndex(len(y))
+            try:
+                y_arr = np.array(y, dtype=np.float64).T
+                self.y_categories = {}
+            except (TypeError, ValueError):
+                y_arr, self.y_categories = self.__encode_columns(y)
+
+        self.__y = y
+        self.__keep = None
+        if remove_na != 'pairwise':
+            na = np.isnan(y_arr).any(axis=1)
+            if na.any():
+                if remove_na != True:
+                    raise ValueError("Input data contains missing values (NA)")
+                self.__keep = ~na
+                y_keep = np.empty((int(self.__keep.sum()), y_arr.shape[1]), dtype=np.float64, order='F')
+                for i in range(y_arr.shape[1]):
+                    y_keep[:, i] = y_arr[self.__keep, i]
+                y_arr = y_keep
+        self.y_arr = y_arr
+        self.y_shape0, self.y_shape1 = self.y_arr.shape
+        self.__y_df = None
+        self.__y_list = None
 
         return
-            
+
+    @staticmethod
+    def __encode_columns(columns):
+        """
+        Stores columns as float64, where non-numeric columns are replaced by their sorted category codes.
+
+        Parameters:
+        - columns: A list of 1-dimensional arrays or lists.
+
+        Returns:
+        - y_arr: A 2-dimensional float64 array with one column per input column and nan for missing values.
+        - categories: A dict from the index of each non-numeric column to its sorted categories.
+        """
+        y_arr = np.empty((len(columns[0]), len(columns)), dtype=np.float64, order='F')
+        categories = {}
+        for i, column in enumerate(columns):
+            column = pd.Series(column)
+            if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+                y_arr[:, i] = column.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                codes, categories[i] = pd.factorize(column, sort=True)
+                y_arr[:, i] = np.where(codes >= 0, codes, np.nan)
+        return y_arr, categories
+
+    @property
+    def y_df(self):
+        """
+        The input data as a pandas DataFrame (after removing rows with NA), created when first used.
+        """
+        if self.__y_df is None:
+            y_df = self.__y if isinstance(self.__y, pd.DataFrame) else pd.DataFrame(self.__y).T
+            self.__y_df = y_df if self.__keep is None else y_df[self.__keep]
+        return self.__y_df
+
+    @property
+    def y_list(self):
+        """
+        The input data as a list of columns (after removing rows with NA), created when first used.
+        """
+        if self.__y_list is None:
+            if isinstance(self.__y, list) and self.__keep is None:
+                self.__y_list = self.__y
+            else:
+                self.__y_list = [self.y_df.iloc[:, i].tolist() for i in range(self.y_shape1)]
+        return self.__y_list
+
+    def _column_codes(self, i):
+        """
+        Returns the rank codes of the i-th column, with -1 for missing values (NA).
+        """
+        if i in self.y_categories:
+            return np.where(np.isnan(self.y_arr[:, i]), -1, self.y_arr[:, i]).astype(np.int64)
+        return _rank_codes(self.y_arr[:, i])
+
+    def _pair_codes(self, i=0, j=1):
+        """
+        Returns the rank codes of the i-th and j-th columns after removing rows with NA in either column.
+        """
+        c1 = self._column_codes(i)
+        c2 = self._column_codes(j)
+        keep = (c1 >= 0) & (c2 >= 0)
+        if not keep.all():
+            c1 = c1[keep]
+            c2 = c2[keep]
+        return c1, c2
+
     @staticmethod
     def __g(x):
         result = [np.sign(sublist[0] - sublist[1]) for sublist in x]
         return result
 
-    def calculate_kendall_tau(self):
+    def calculate_kendall_tau(self, method='merge'):
         """
         Calculates the Kendall's tau correlation coefficient between the first two columns of the input data.
 
+        Parameters:
+        - method: str, optional (default='merge')
+            - 'merge': sorts the data and counts discordant pairs with a merge sort, in O(n log n) time and O(n) memory.
+            - 'matrix': builds the n by n sign matrices (for small sample sizes only).
+
         Returns:
         - tau: float
-            - The Kendall's tau correlation coefficient.
+            - The Kendall's tau (tau-b) correlation coefficient.
         """
-        tau1 = np.sign(np.repeat(self.y_list[0], self.y_shape0)-np.tile(self.y_list[0], self.y_shape0))
-        tau2 = np.sign(np.repeat(self.y_list[1], self.y_shape0)-np.tile(self.y_list[1], self.y_shape0))
+        assert method in ['merge', 'matrix'], "method must be either 'merge' or 'matrix'"
+        if method == 'merge':
+            return _kendall_tau_b_codes(*self._pair_codes(0, 1))
+
+        y1, y2 = self._pair_codes(0, 1)
+        tau1 = np.sign(np.repeat(y1, y1.size)-np.tile(y1, y1.size))
+        tau2 = np.sign(np.repeat(y2, y2.size)-np.tile(y2, y2.size))
         tau = np.sum(np.multiply(tau1,tau2))/np.sqrt(np.multiply(np.sum(np.abs(tau1)),np.sum(np.abs(tau2))))
         return tau
 
 
+    def calculate_spearman_rho(self):
+        """
+        Calculates the Spearman's rho correlation coefficient between the first two columns of the input data.
+
+        Returns:
+        - rho: float
+            - The Spearman's rho correlation coefficient, using average ranks for ties.
+        """
+        return _spearman_rho_codes(*self._pair_codes(0, 1))
+
+    def calculate_corr_matrix(self, method='kendall', n_jobs=1):
+        """
+        Calculates the correlation coefficients between all pairs of columns of the input data.
+
+        Each column is ranked once and the ranks are reused for every pair.
+        Missing values (NA) are removed separately for each pair when the object is created with remove_na='pairwise'.
+
+        Parameters:
+        - method: str, optional (default='kendall')
+            - 'kendall' for Kendall's tau-b, or 'spearman' for Spearman's rho.
+        - n_jobs: int, optional (default=1)
+            - The number of worker processes used to calculate the pairs. -1 uses all CPUs.
+
+        Returns:
+        - corr: pd.DataFrame
+            - A symmetric DataFrame with the coefficients, indexed by the columns of the input data.
+        """
+        assert method in ['kendall', 'spearman'], "method must be either 'kendall' or 'spearman'"
+        assert isinstance(n_jobs, int) and (n_jobs >= 1 or n_jobs == -1), "n_jobs must be a positive integer or -1"
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+
+        n_col = self.y_shape1
+        codes = np.column_stack([self._column_codes(i) for i in range(n_col)])
+        z = None
+        if method == 'spearman':
+            z = np.full(codes.shape, np.nan)
+            for i in range(n_col):
+                if (codes[:, i] >= 0).all():
+                    z[:, i] = _standardize(_average_ranks(codes[:, i]))
+
+        pairs = [(i, j) for i in range(n_col) for j in range(i + 1, n_col)]
+        if n_jobs == 1 or len(pairs) < 2:
+            values = _calculate_pairs(pairs, method, codes, z)
+        else:
+            n_chunk = min(len(pairs), n_jobs * 4)
+            chunks = [pairs[k::n_chunk] for k in range(n_chunk)]
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_pair_worker, initargs=(codes, z)) as executor:
+                results = list(executor.map(_calculate_pairs, chunks, [method] * n_chunk))
+            values = [None] * len(pairs)
+            for k, result in enumerate(results):
+                values[k::n_chunk] = result
+
+        corr = np.eye(n_col)
+        for (i, j), value in zip(pairs, values):
+            corr[i, j] = corr[j, i] = value
+        return pd.DataFrame(corr, index=self.y_columns, columns=self.y_columns)
+
     def plot_y_list(self, loc=[0,1], axis_label=['x','y']):
         """
         Plots a scatter plot of the input data.
@@ -102,6 +497,245 @@ class CorrCalculator:
         plt.title('Scatter Plot')
         plt.show()
 
+class _DominanceIndex:
+    """
+    A static index of points (x, y) that counts, for many query points at once, the stored points in each
+    quadrant around each query point.
+
+    The points are sorted by x and their y values replaced by ranks. For every level l, the ranks are sorted
+    within aligned chunks of 2**l points (a merge sort tree), and all levels are kept in one sorted int64 array
+    keyed on (level, chunk, rank). The points with x < X and y < Y are a prefix of the x order split into at most
+    one chunk per level, so they are counted with one np.searchsorted call over all levels and query points,
+    in O(log(n)**2) per query point.
+    """
+
+    def __init__(self, x, y):
+        order = np.lexsort((y, x))
+        self.x = x[order]
+        self.y = y[order]
+        self.n = self.x.size
+        y_order = np.argsort(self.y, kind='stable')
+        self.y_sorted = self.y[y_order]
+        rank = np.empty(self.n, dtype=np.int64)
+        rank[y_order] = np.arange(self.n, dtype=np.int64)
+        self.n_levels = self.n.bit_length()
+        # the ranks are padded to a power of two with a value above all ranks, which stays at the end of each chunk
+        ranks = np.full(1 << self.n_levels, self.n, dtype=np.int64)
+        ranks[:self.n] = rank
+        position = np.arange(self.n, dtype=np.int64)
+        self.keys = np.empty(self.n_levels * self.n, dtype=np.int64)
+        for level in range(self.n_levels):
+            ranks.reshape(-1, 1 << level).sort(axis=1)
+            self.keys[level * self.n:(level + 1) * self.n] = (level * self.n + (position >> level)) * self.n + ranks[:self.n]
+
+    def __dominated(self, i, r):
+        """
+        Counts the points among the first i in x order with a y rank below r, for arrays i and r.
+        """
+        level = np.arange(self.n_levels, dtype=np.int64)[:, None]
+        chunk = (i >> (level + 1)) << 1
+        start = level * self.n + (chunk << level)
+        pos = np.searchsorted(self.keys, (level * self.n + chunk) * self.n + r)
+        return np.sum(((i >> level) & 1) * (pos - start), axis=0)
+
+    def concordance(self, x, y):
+        """
+        Returns the number of concordant minus discordant pairs between the query points and the stored points.
+        """
+        if self.n == 0 or x.size == 0:
+            return 0
+        i_lo = np.searchsorted(self.x, x, side='left')
+        i_hi = np.searchsorted(self.x, x, side='right')
+        r_lo = np.searchsorted(self.y_sorted, y, side='left')
+        r_hi = np.searchsorted(self.y_sorted, y, side='right')
+        counts = self.__dominated(np.concatenate((i_lo, i_lo, i_hi, i_hi)), np.concatenate((r_lo, r_hi, r_lo, r_hi)))
+        d_ll, d_lh, d_hl, d_hh = np.split(counts, 4)
+        xl_yl = d_ll
+        xl_yg = i_lo - d_lh
+        xg_yl = r_lo - d_hl
+        xg_yg = (self.n - i_hi) - (r_hi - d_hh)
+        return int(np.sum(xl_yl + xg_yg - xl_yg - xg_yl))
+
+def _concordance_direct(x1, y1, x2, y2):
+    """
+    Returns the number of concordant minus discordant pairs between the points (x1, y1) and (x2, y2)
+    by comparing every pair.
+    """
+    sx = (x1[:, None] > x2[None, :]).astype(np.int8) - (x1[:, None] < x2[None, :])
+    sy = (y1[:, None] > y2[None, :]).astype(np.int8) - (y1[:, None] < y2[None, :])
+    return int(np.sum(sx * sy, dtype=np.int64))
+
+class OnlineCorrCalculator:
+    """
+    A class for keeping Kendall's tau up to date while paired data arrive in batches.
+
+    Every new pair is compared with the stored pairs through order-statistics structures instead of
+    revisiting the whole history: recent pairs wait in a small buffer that is compared directly, and
+    older pairs are kept in O(log(n)) static indexes of increasing size, which are merged as they fill
+    up (the logarithmic method). Comparing a pair with an index takes O(log(n)**2) in vectorized binary
+    searches, so adding a pair takes O(log(n)**3) amortized time instead of time that grows with n, and
+    the current tau-b is available at any time without a recompute.
+
+    Parameters:
+    - block_size: int, optional (default=1000)
+        - The number of stored pairs kept in the buffer before they are indexed.
+
+    Methods:
+    - update(x_batch, y_batch):
+        - Adds a batch of pairs. Pairs with missing values (NA) are ignored.
+        - A batch larger than the stored data is merged by rebuilding the structure once, which is cheaper than adding pairs one by one.
+    - calculate_kendall_tau():
+        - Returns the current Kendall's tau-b coefficient as a float.
+    - calculate_spearman_rho():
+        - Calculates the Spearman's rho correlation coefficient from all stored pairs.
+    - recompute():
+        - Recalculates the counts from all stored pairs with the merge algorithm and returns Kendall's tau-b.
+    """
+
+    def __init__(self, block_size=1000):
+        assert isinstance(block_size, int) and block_size >= 1, "block_size must be a positive integer"
+        self.block_size = block_size
+        self.n = 0
+        self.n_tied_x = 0
+        self.n_tied_y = 0
+        self.s = 0
+        self.__indexes = []
+        self.__buffer_x = np.empty(0, dtype=np.float64)
+        self.__buffer_y = np.empty(0, dtype=np.float64)
+        self.__count_x = {}
+        self.__count_y = {}
+
+    def update(self, x_batch, y_batch):
+        """
+        Adds a batch of pairs and updates the counts of concordant, discordant and tied pairs.
+
+        Parameters:
+        - x_batch: A list or 1-dimensional array of numbers.
+        - y_batch: A list or 1-dimensional array of numbers with the same length as x_batch.
+
+        Returns:
+        - self
+        """
+        x_batch = np.asarray(x_batch, dtype=np.float64).ravel()
+        y_batch = np.asarray(y_batch, dtype=np.float64).ravel()
+        assert x_batch.shape == y_batch.shape, "x_batch and y_batch must have the same length"
+        keep = ~(np.isnan(x_batch) | np.isnan(y_batch))
+        x_batch = x_batch[keep]
+        y_batch = y_batch[keep]
+        if x_batch.size > self.n:
+            x, y = self.__values()
+            self.__rebuild(np.concatenate((x, x_batch)), np.concatenate((y, y_batch)))
+            return self
+        if x_batch.size == 0:
+            return self
+
+        self.n_tied_x += self.__add_counts(self.__count_x, x_batch)
+        self.n_tied_y += self.__add_counts(self.__count_y, y_batch)
+        if x_batch.size > 1:
+            self.s += _kendall_pair_counts(_rank_codes(x_batch), _rank_codes(y_batch))[3]
+        for index in self.__indexes:
+            self.s += index.concordance(x_batch, y_batch)
+        if x_batch.size >= self.block_size:
+            index = _DominanceIndex(x_batch, y_batch)
+            self.s += index.concordance(self.__buffer_x, self.__buffer_y)
+            self.__push(index)
+        else:
+            self.s += _concordance_direct(x_batch, y_batch, self.__buffer_x, self.__buffer_y)
+            self.__buffer_x = np.concatenate((self.__buffer_x, x_batch))
+            self.__buffer_y = np.concatenate((self.__buffer_y, y_batch))
+            if self.__buffer_x.size >= self.block_size:
+                self.__push(_DominanceIndex(self.__buffer_x, self.__buffer_y))
+                self.__buffer_x = np.empty(0, dtype=np.float64)
+                self.__buffer_y = np.empty(0, dtype=np.float64)
+        self.n += x_batch.size
+        return self
+
+    @staticmethod
+    def __add_counts(counts, values):
+        """
+        Adds values to a dict of value counts and returns the number of new tied pairs.
+        """
+        tied = 0
+        values, n_new = np.unique(values, return_counts=True)
+        for v, k in zip(values.tolist(), n_new.tolist()):
+            n_old = counts.get(v, 0)
+            tied += n_old * k + k * (k - 1) // 2
+            counts[v] = n_old + k
+        return tied
+
+    def __push(self, index):
+        """
+        Adds an index and merges the last indexes while the one before the last is at most twice as large,
+        so the sizes at least double from the last index to the first.
+        """
+        self.__indexes.append(index)
+        while len(self.__indexes) > 1 and self.__indexes[-2].n <= 2 * self.__indexes[-1].n:
+            last = self.__indexes.pop()
+            before = self.__indexes.pop()
+            self.__indexes.append(_DominanceIndex(np.concatenate((before.x, last.x)), np.concatenate((before.y, last.y))))
+
+    def __values(self):
+        """
+        Returns the x and y values of all stored pairs as two arrays.
+        """
+        x = np.concatenate([index.x for index in self.__indexes] + [self.__buffer_x])
+        y = np.concatenate([index.y for index in self.__indexes] + [self.__buffer_y])
+        return x, y
+
+    def __rebuild(self, x, y):
+        """
+        Rebuilds the stored pairs and all counts from two arrays with the merge algorithm.
+        """
+        self.__indexes = []
+        self.__buffer_x = np.empty(0, dtype=np.float64)
+        self.__buffer_y = np.empty(0, dtype=np.float64)
+        if x.size >= self.block_size:
+            self.__indexes.append(_DominanceIndex(x, y))
+        else:
+            self.__buffer_x = x
+            self.__buffer_y = y
+        self.n = x.size
+        values, counts = np.unique(x, return_counts=True)
+        self.__count_x = dict(zip(values.tolist(), counts.tolist()))
+        values, counts = np.unique(y, return_counts=True)
+        self.__count_y = dict(zip(values.tolist(), counts.tolist()))
+        _, self.n_tied_x, self.n_tied_y, self.s = _kendall_pair_counts(_rank_codes(x), _rank_codes(y))
+
+    def calculate_kendall_tau(self):
+        """
+        Returns the current Kendall's tau-b coefficient.
+
+        Returns:
+        - tau: float
+            - The Kendall's tau (tau-b) correlation coefficient, or nan if either variable is constant.
+        """
+        return _tau_b_from_counts(self.n * (self.n - 1) // 2, self.n_tied_x, self.n_tied_y, self.s)
+
+    def calculate_spearman_rho(self):
+        """
+        Calculates the Spearman's rho correlation coefficient from all stored pairs.
+
+        Returns:
+        - rho: float
+            - The Spearman's rho correlation coefficient, using average ranks for ties.
+        """
+        if self.n < 2:
+            return np.nan
+        x, y = self.__values()
+        return _spearman_rho_codes(_rank_codes(x), _rank_codes(y))
+
+    def recompute(self):
+        """
+        Recalculates the counts from all stored pairs with the merge algorithm.
+
+        Returns:
+        - tau: float
+            - The Kendall's tau (tau-b) correlation coefficient.
+        """
+        x, y = self.__values()
+        self.__rebuild(x, y)
+        return self.calculate_kendall_tau()
+
 if __name__ == "__main__":
 
     pass
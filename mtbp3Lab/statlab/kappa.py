@@ -16,10 +16,383 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.utils import resample
 import os
 import seaborn as sns
 import random
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+
+def _factorize_ratings(y, stringna=None, to_string=False):
+    """
+    Converts the ratings of several raters into integer codes with one shared set of categories.
+
+    Parameters:
+    - y: A list of lists or 1-dimensional arrays (one per rater) with the same length.
+    - stringna: If given, missing values (None or nan) are coded as this category.
+    - to_string: If True, numbers are converted to strings before the categories are sorted.
+
+    Returns:
+    - codes: A 2-dimensional int64 array (raters by samples) of category codes, with -1 for missing values if stringna is None.
+    - categories: The sorted categories as a pandas Index, where codes index into categories.
+    """
+    values = np.empty(sum(len(x) for x in y), dtype=object)
+    values[:] = [v for x in y for v in x]
+    codes, uniques = pd.factorize(values)
+    uniques = list(uniques)
+    if to_string:
+        uniques = [str(u) if isinstance(u, (int, float)) else u for u in uniques]
+    if stringna is not None and (codes < 0).any():
+        uniques.append(stringna)
+        codes = np.where(codes < 0, len(uniques) - 1, codes)
+    tmp_uniques = np.empty(len(uniques), dtype=object)
+    tmp_uniques[:] = uniques
+    remap, categories = pd.factorize(tmp_uniques, sort=True)
+    codes = np.where(codes < 0, -1, remap[codes]).astype(np.int64)
+    return codes.reshape(len(y), -1), pd.Index(categories)
+
+def _count_matrix(codes, n_category):
+    """
+    Counts the ratings of each category for each sample with a single bincount.
+
+    Parameters:
+    - codes: A 2-dimensional array (raters by samples) of category codes. Negative codes are not counted.
+    - n_category: The number of categories.
+
+    Returns:
+    - A samples by n_category float64 array of counts.
+    """
+    n = codes.shape[1]
+    idx = (np.arange(n) * n_category + codes)[codes >= 0]
+    return np.bincount(idx, minlength=n * n_category).reshape(n, n_category).astype(np.float64)
+
+def _confusion_matrix(c1, c2, n_category):
+    """
+    Counts the pairs of codes from two raters with a single bincount.
+
+    Parameters:
+    - c1: A 1-dimensional array of category codes from the first rater.
+    - c2: A 1-dimensional array of category codes from the second rater.
+    - n_category: The number of categories.
+
+    Returns:
+    - A n_category by n_category int64 array, where rows are c1 and columns are c2.
+    """
+    return np.bincount(c1 * n_category + c2, minlength=n_category * n_category).reshape(n_category, n_category)
+
+def _cohen_kappa_from_table(table, weights=None):
+    """
+    Calculates Cohen's kappa from a square table of counts.
+
+    Parameters:
+    - table: A K by K array of counts, where rows are the first rater and columns are the second rater.
+    - weights: None for the unweighted kappa, or a K by K array of disagreement weights, see _kappa_weights.
+
+    Returns:
+    - The calculated Cohen's kappa value.
+    """
+    return float(_cohen_kappa_from_tables(np.asarray(table)[np.newaxis], weights)[0])
+
+def _cohen_kappa_from_tables(tables, weights=None):
+    """
+    Calculates Cohen's kappa for a stack of square tables of counts.
+
+    Parameters:
+    - tables: A m by K by K array of counts.
+    - weights: None for the unweighted kappa, or a K by K array of disagreement weights, see _kappa_weights.
+
+    Returns:
+    - A length m array of Cohen's kappa values.
+    """
+    total_pairs = tables.sum(axis=(1, 2)).astype(np.float64)
+    if weights is None:
+        observed_agreement = np.trace(tables, axis1=1, axis2=2) / total_pairs
+        expected_agreement = np.einsum('mi,mi->m', tables.sum(axis=2), tables.sum(axis=1)) / total_pairs ** 2
+        return (observed_agreement - expected_agreement) / (1 - expected_agreement)
+    observed_disagreement = np.einsum('mij,ij->m', tables, weights) / total_pairs
+    expected_disagreement = np.einsum('mi,ij,mj->m', tables.sum(axis=2), weights, tables.sum(axis=1)) / total_pairs ** 2
+    return 1 - observed_disagreement / expected_disagreement
+
+def _kappa_weights(weights, category):
+    """
+    Creates the disagreement weights for weighted Cohen's kappa.
+
+    Parameters:
+    - weights: None or 'unweighted', 'linear', 'quadratic', or a K by K array of disagreement weights.
+    - category: The K categories. If all of them are numbers (or strings of numbers), the numbers are used as scores.
+      Otherwise the positions 0, 1, ..., K-1 are used.
+
+    Returns:
+    - None for the unweighted kappa, or a K by K float64 array with zeros on the diagonal.
+    """
+    if weights is None or (isinstance(weights, str) and weights == 'unweighted'):
+        return None
+    n_category = len(category)
+    if not isinstance(weights, str):
+        weights = np.asarray(weights, dtype=np.float64)
+        assert weights.shape == (n_category, n_category), "weights must be a K by K array, where K is the number of categories"
+        return weights
+    assert weights in ['linear', 'quadratic'], "weights must be None, 'unweighted', 'linear', 'quadratic', or a K by K array"
+    try:
+        scores = np.array([float(x) for x in category])
+    except (TypeError, ValueError):
+        scores = np.arange(n_category, dtype=np.float64)
+    distance = np.abs(scores[:, np.newaxis] - scores[np.newaxis, :])
+    if distance.max() > 0:
+        distance = distance / distance.max()
+    return distance if weights == 'linear' else distance ** 2
+
+def _cohen_kappa_from_cell_counts(counts, n_category, weights=None):
+    """
+    Calculates Cohen's kappa for bootstrap replicates given as flattened K by K tables.
+
+    Parameters:
+    - counts: A m by K*K array of counts.
+    - n_category: The number of categories K.
+    - weights: None for the unweighted kappa, or a K by K array of disagreement weights, see _kappa_weights.
+
+    Returns:
+    - A length m array of Cohen's kappa values.
+    """
+    return _cohen_kappa_from_tables(counts.reshape(-1, n_category, n_category), weights)
+
+def _fleiss_kappa_from_totals(col_total, sum_sq, n, R):
+    """
+    Calculates Fleiss' kappa from its sufficient statistics.
+
+    Parameters:
+    - col_total: A (..., K) array, the total count of each category.
+    - sum_sq: A (...) array, the sum of the squared counts over all samples and categories.
+    - n: A (...) array, the number of samples.
+    - R: The number of raters per sample.
+
+    Returns:
+    - A (...) array of Fleiss' kappa values.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    p = col_total / (n * R)[..., np.newaxis]
+    Pbar_E = (p ** 2).sum(axis=-1)
+    Pbar_O = (sum_sq / n - R) / (R * (R - 1))
+    return (Pbar_O - Pbar_E) / (1 - Pbar_E)
+
+def _fleiss_kappa_null_var(col_total, n, R):
+    """
+    Calculates the variance of Fleiss' kappa under the hypothesis of no agreement beyond chance (Fleiss, 1971).
+
+    Parameters:
+    - col_total: A (..., K) array, the total count of each category.
+    - n: A (...) array, the number of samples.
+    - R: The number of raters per sample.
+
+    Returns:
+    - A (...) array of variances.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    R = np.asarray(R, dtype=np.float64)
+    p = col_total / (n * R)[..., np.newaxis]
+    S_p2 = (p ** 2).sum(axis=-1)
+    S_p3 = (p ** 3).sum(axis=-1)
+    return 2 * (S_p2 - (2 * R - 3) * S_p2 ** 2 + 2 * (R - 2) * S_p3) / (n * R * (R - 1) * (1 - S_p2) ** 2)
+
+def _fleiss_kappa_from_pattern_counts(counts, patterns):
+    """
+    Calculates Fleiss' kappa for bootstrap replicates given as counts of distinct rows of the count matrix.
+
+    Parameters:
+    - counts: A m by P array, the number of samples with each of the P distinct rows.
+    - patterns: A P by K array of the distinct rows of the count matrix.
+
+    Returns:
+    - A length m array of Fleiss' kappa values.
+    """
+    patterns = np.asarray(patterns, dtype=np.float64)
+    return _fleiss_kappa_from_totals(counts @ patterns, counts @ (patterns ** 2).sum(axis=1), counts.sum(axis=1), patterns[0].sum())
+
+def _fleiss_kappa_jackknife(patterns, freq):
+    """
+    Calculates the leave-one-out Fleiss' kappa for every distinct row of the count matrix in closed form.
+
+    Removing a sample with row q only subtracts q from the category totals and the squared counts of q
+    from the sum of squares, so all leave-one-out values are found in O(P*K) without refitting.
+
+    Parameters:
+    - patterns: A P by K array of the distinct rows of the count matrix.
+    - freq: A length P array with the number of samples having each row.
+
+    Returns:
+    - A length P array, the kappa without one sample having the corresponding row.
+    """
+    patterns = np.asarray(patterns, dtype=np.float64)
+    freq = np.asarray(freq, dtype=np.float64)
+    sq = (patterns ** 2).sum(axis=1)
+    col_total = freq @ patterns
+    sum_sq = freq @ sq
+    n = freq.sum()
+    return _fleiss_kappa_from_totals(col_total - patterns, sum_sq - sq, np.full(len(freq), n - 1), patterns[0].sum())
+
+def _fleiss_kappa_delta_var(patterns, freq):
+    """
+    Calculates the large-sample variance of Fleiss' kappa without assuming no agreement, with the delta method.
+
+    The kappa is a smooth function of the sample means of the agreement of each sample and of the category counts,
+    so its variance is estimated by the mean of the squared influence of each sample divided by n.
+
+    Parameters:
+    - patterns: A P by K array of the distinct rows of the count matrix.
+    - freq: A length P array, the number of samples with each row.
+
+    Returns:
+    - The estimated variance.
+    """
+    patterns = np.asarray(patterns, dtype=np.float64)
+    freq = np.asarray(freq, dtype=np.float64)
+    n = freq.sum()
+    R = patterns[0].sum()
+    agreement = ((patterns ** 2).sum(axis=1) - R) / (R * (R - 1))
+    p = freq @ patterns / (n * R)
+    Pbar_O = freq @ agreement / n
+    Pbar_E = (p ** 2).sum()
+    kappa = (Pbar_O - Pbar_E) / (1 - Pbar_E)
+    influence = ((agreement - Pbar_O) - 2 * (1 - kappa) * (patterns / R - p) @ p) / (1 - Pbar_E)
+    return float(freq @ influence ** 2 / n ** 2)
+
+def _bca_percentiles(kappa, kappa_values, jackknife, weight, confidence_level):
+    """
+    Calculates the percentiles of the bias-corrected and accelerated (BCa) bootstrap interval.
+
+    Parameters:
+    - kappa: The estimate from the data.
+    - kappa_values: The bootstrap replicates.
+    - jackknife: The leave-one-out estimates.
+    - weight: The number of samples for each leave-one-out estimate.
+    - confidence_level: The desired confidence level.
+
+    Returns:
+    - The lower and upper percentiles (between 0 and 100), or None if there are no replicates.
+    """
+    if len(kappa_values) == 0:
+        return None
+    finite = np.isfinite(jackknife)
+    jackknife = jackknife[finite]
+    weight = np.asarray(weight)[finite]
+    normal = NormalDist()
+    prop = np.clip(np.mean(kappa_values < kappa), 1 / (len(kappa_values) + 1), len(kappa_values) / (len(kappa_values) + 1))
+    z0 = normal.inv_cdf(float(prop))
+    a = 0.0
+    if weight.sum() > 0:
+        d = np.average(jackknife, weights=weight) - jackknife
+        denominator = 6 * np.sum(weight * d ** 2) ** 1.5
+        a = float(np.sum(weight * d ** 3) / denominator) if denominator > 0 else 0.0
+    out = []
+    for alpha in [(1 - confidence_level) / 2, (1 + confidence_level) / 2]:
+        z = z0 + normal.inv_cdf(alpha)
+        out.append(100 * normal.cdf(z0 + z / (1 - a * z)))
+    return out
+
+def _spawn_seeds(seed, n_shard):
+    """
+    Creates independent random streams for the shards of a bootstrap.
+
+    Parameters:
+    - seed: None, an int, a numpy.random.SeedSequence, or a numpy.random.Generator.
+    - n_shard: The number of shards.
+
+    Returns:
+    - A list of n_shard objects accepted by numpy.random.default_rng.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(n_shard)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n_shard)
+
+def _bootstrap_shard(stat, p, n, m, seed):
+    """
+    Calculates a statistic for m bootstrap replicates drawn from one random stream.
+    """
+    counts = np.random.default_rng(seed).multinomial(n, p, size=m)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return stat(counts)
+
+def _bootstrap_replicates(stat, freq, n_iterations, seed=None, chunk_size=10000, n_jobs=1):
+    """
+    Calculates a statistic for bootstrap resamples of the samples, in shards of replicates.
+
+    Resampling n samples with replacement is the same as drawing multinomial counts of the
+    distinct data patterns (for example the cells of a K by K table) with probabilities freq / n,
+    so every replicate is a vector of pattern counts and no resampled data are created.
+    The replicates are split into shards of chunk_size, and every shard has its own random stream
+    spawned from seed, so the result depends on seed and chunk_size but not on n_jobs.
+
+    Parameters:
+    - stat: A picklable function that maps a m by P array of pattern counts to a length m array.
+    - freq: A length P array with the number of samples having each pattern.
+    - n_iterations: The number of bootstrap replicates.
+    - seed: None, an int, a numpy.random.SeedSequence, or a numpy.random.Generator.
+    - chunk_size: The number of replicates in a shard, which bounds the memory to chunk_size by P counts.
+    - n_jobs: The number of worker processes. -1 uses all CPUs.
+
+    Returns:
+    - A length n_iterations array of the statistic.
+    """
+    freq = np.asarray(freq, dtype=np.int64)
+    n = int(freq.sum())
+    p = freq / n
+    sizes = [min(chunk_size, n_iterations - start) for start in range(0, n_iterations, chunk_size)]
+    seeds = _spawn_seeds(seed, len(sizes))
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1 or len(sizes) == 1:
+        out = [_bootstrap_shard(stat, p, n, m, s) for m, s in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(sizes))) as executor:
+            out = list(executor.map(_bootstrap_shard, [stat] * len(sizes), [p] * len(sizes), [n] * len(sizes), sizes, seeds))
+    return np.concatenate(out)
+
+
+def _batch_kappa_shard(codes, endpoint, n_endpoint, n_category, weights=None):
+    """
+    Calculates the pairwise Cohen's kappa and the Fleiss' kappa of every endpoint with grouped bincounts.
+
+    Parameters:
+    - codes: A rows by raters int64 array of category codes, where a row is one subject of one endpoint and -1 is missing.
+    - endpoint: A length rows array of endpoint codes in range(n_endpoint).
+    - n_endpoint: The number of endpoints.
+    - n_category: The number of categories.
+    - weights: None for the unweighted Cohen's kappa, or a K by K array of disagreement weights, see _kappa_weights.
+
+    Returns:
+    - cohen_kappa: A pairs by n_endpoint array of Cohen's kappa, with pairs in the order of itertools.combinations(range(raters), 2).
+    - cohen_n: A pairs by n_endpoint array of the number of subjects rated by both raters.
+    - fleiss_kappa: A length n_endpoint array of Fleiss' kappa, using the subjects rated by the most raters of each endpoint.
+    - fleiss_n: A length n_endpoint array of the number of subjects used for Fleiss' kappa.
+    - fleiss_r: A length n_endpoint array of the number of raters per subject used for Fleiss' kappa.
+    """
+    n_row, n_rater = codes.shape
+    kk = n_category * n_category
+    pairs = [(a, b) for a in range(n_rater) for b in range(a + 1, n_rater)]
+    cohen_kappa = np.full((len(pairs), n_endpoint), np.nan)
+    cohen_n = np.zeros((len(pairs), n_endpoint), dtype=np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k, (a, b) in enumerate(pairs):
+            mask = (codes[:, a] >= 0) & (codes[:, b] >= 0)
+            idx = endpoint[mask] * kk + codes[mask, a] * n_category + codes[mask, b]
+            tables = np.bincount(idx, minlength=n_endpoint * kk).reshape(n_endpoint, n_category, n_category)
+            cohen_n[k] = tables.sum(axis=(1, 2))
+            cohen_kappa[k] = _cohen_kappa_from_tables(tables, weights)
+
+        count = _count_matrix(codes.T, n_category)
+        n_rated = count.sum(axis=1).astype(np.int64)
+        fleiss_r = np.zeros(n_endpoint, dtype=np.int64)
+        np.maximum.at(fleiss_r, endpoint, n_rated)
+        use = n_rated == fleiss_r[endpoint]
+        e = endpoint[use]
+        fleiss_n = np.bincount(e, minlength=n_endpoint)
+        sum_sq = np.bincount(e, weights=(count[use] ** 2).sum(axis=1), minlength=n_endpoint)
+        col_total = np.bincount((e[:, np.newaxis] * n_category + np.arange(n_category)).ravel(), weights=count[use].ravel(), minlength=n_endpoint * n_category).reshape(n_endpoint, n_category)
+        fleiss_kappa = _fleiss_kappa_from_totals(col_total, sum_sq, fleiss_n, fleiss_r)
+    return cohen_kappa, cohen_n, fleiss_kappa, fleiss_n, fleiss_r
 
 
 class KappaCalculator:
@@ -32,7 +405,11 @@ class KappaCalculator:
     - stringna: The string representation of missing values.
 
     Methods:
-    - bootstrap_cohen_ci(n_iterations, confidence_level, outfmt, out_digits): Calculates the bootstrap confidence interval for Cohen's kappa.
+    - calculate_weighted_cohen_kappa(weights): Calculates the weighted Cohen's kappa.
+    - bootstrap_cohen_ci(n_iterations, confidence_level, outfmt, out_digits, seed, chunk_size, n_jobs, weights): Calculates the bootstrap confidence interval for Cohen's kappa.
+    - bootstrap_fleiss_ci(n_iterations, confidence_level, outfmt, out_digits, seed, chunk_size, n_jobs, method): Calculates the bootstrap confidence interval for Fleiss' kappa.
+    - fleiss_z_test(outfmt, out_digits, alternative): Tests the hypothesis of no agreement beyond chance for Fleiss' kappa.
+    - asymptotic_fleiss_ci(confidence_level, outfmt, out_digits): Calculates the large-sample confidence interval for Fleiss' kappa.
 
     """
 
@@ -64,44 +441,55 @@ class KappaCalculator:
         if infmt not in ['sample_list', 'sample_df', 'count_sq_df', 'count_df']:
             raise ValueError("Invalid value for infmt. Allowed values are 'sample_list', 'sample_df', 'count_sq_df' and 'count_df'.")
 
+        self.__infmt = infmt
+        self.__y_list = None
+        self.__y_df = None
+        self.__y_count = None
+        self.__table = None
+        self.__patterns = None
+        self.__freq = None
+        self.y_codes = None
+        self.y_code_category = None
+
         if infmt == 'sample_list' or infmt == 'sample_df':
             if infmt == 'sample_list':
                 self.y_list = self.__convert_2dlist_to_string(y, stringna=stringna)
-                self.y_df = pd.DataFrame(self.y_list).T
+                tmp_codes, tmp_category = _factorize_ratings(self.y_list, stringna=stringna)
+                self.y_df = pd.DataFrame(dict(enumerate(self.y_list)))
             else:
-                self.y_df = y.replace({np.nan: stringna, None: stringna})
-                self.y_df = self.y_df.applymap(lambda x: str(x) if isinstance(x, (int, float)) else x)
-                self.y_list = self.y_df.values.tolist()
+                tmp_codes, tmp_category = _factorize_ratings([y.iloc[:, i].to_numpy(dtype=object) for i in range(y.shape[1])], stringna=stringna, to_string=True)
+                self.y_df = pd.DataFrame(tmp_category.to_numpy(dtype=object)[tmp_codes.T], index=y.index, columns=y.columns)
+                self.y_list = [self.y_df.iloc[:, i].tolist() for i in range(self.y_df.shape[1])]
 
-            self.y_count = self.y_df.apply(pd.Series.value_counts, axis=1).fillna(0)
+            self.y_count = pd.DataFrame(_count_matrix(tmp_codes, len(tmp_category)), index=self.y_df.index, columns=tmp_category)
             if stringna in self.y_count.columns:
                 column_values = self.y_count[stringna].unique()
                 assert len(column_values) == 1, f"Total number in value '{stringna}' must be the same for all sample"
                 self.y_count.drop(columns=stringna, inplace=True)
             tmp_row_sum = self.y_count.sum(axis=1) 
-            assert tmp_row_sum.eq(tmp_row_sum[0]).all(), "Total number of raters per sample must be equal"
+            assert tmp_row_sum.eq(tmp_row_sum.iloc[0]).all(), "Total number of raters per sample must be equal"
             self.category = self.y_count.columns
             self.n_category = len(self.category)
-            self.n_rater = tmp_row_sum[0]
+            self.n_rater = tmp_row_sum.iloc[0]
 
             if self.n_rater == 2:
-                self.y_count_sq = pd.crosstab(self.y_list[0], self.y_list[1], margins = False, dropna=False)
-                i = self.y_count_sq.index.union(self.y_count_sq.columns, sort=True)
-                self.y_count_sq.reindex(index=i, columns=i, fill_value=0)
+                self.y_codes = tmp_codes[:2]
+                self.y_code_category = tmp_category
+                self.__table = _confusion_matrix(self.y_codes[0], self.y_codes[1], len(self.y_code_category))
+                self.y_count_sq = pd.DataFrame(self.__table, index=self.y_code_category, columns=self.y_code_category)
             else:
                 self.y_count_sq = None
 
         elif infmt == 'count_sq_df':
             assert y.shape[0] == y.shape[1], "y must be a square DataFrame"
+            if not y.index.equals(y.columns) and set(y.index) == set(y.columns):
+                y = y.reindex(index=y.columns)
             self.y_count_sq = y
             self.category = y.columns
             self.n_category = len(self.category)
             self.n_rater = 2
-            tmp_count = self.y_count_sq.unstack().reset_index(name='count')
-            self.y_df = tmp_count.loc[np.repeat(tmp_count.index.values, tmp_count['count'])]
-            self.y_df.drop(columns='count', inplace=True)
-            self.y_list = self.y_df.values.tolist()
-            self.y_count = self.y_df.apply(pd.Series.value_counts, axis=1).fillna(0)
+            self.__table = y.to_numpy(dtype=np.int64)
+            self.__patterns, self.__freq = self.__count_sq_patterns(self.__table)
 
         elif infmt == 'count_df':
             self.y_count = y
@@ -110,10 +498,10 @@ class KappaCalculator:
                 assert len(column_values) == 1, f"All values in column '{stringna}' must be the same"
                 self.y_count.drop(columns=stringna, inplace=True)
             tmp_row_sum = self.y_count.sum(axis=1) 
-            assert tmp_row_sum.eq(tmp_row_sum[0]).all(), "Row sums of y must be equal"
+            assert tmp_row_sum.eq(tmp_row_sum.iloc[0]).all(), "Row sums of y must be equal"
             self.category = self.y_count.columns
             self.n_category = len(self.category)
-            self.n_rater = tmp_row_sum[0]
+            self.n_rater = tmp_row_sum.iloc[0]
             self.y_count_sq= None
             self.y_list = None
             self.y_df = None
@@ -129,16 +517,15 @@ class KappaCalculator:
             return
 
 
-        if self.n_rater == 2:
-            if self.y_list is not None:
-                self.cohen_kappa = self.__calculate_cohen_kappa(self.y_list[0],self.y_list[1])
-            else:
-                self.cohen_kappa = None
+        if self.n_rater == 2 and self.__table is not None:
+            self.cohen_kappa = _cohen_kappa_from_table(self.__table)
         else:
             self.cohen_kappa = None
         
         if self.n_rater >= 2:
-            if self.y_count is not None:
+            if self.__patterns is not None:
+                self.fleiss_kappa = float(_fleiss_kappa_from_pattern_counts(self.__freq[np.newaxis], self.__patterns)[0])
+            elif self.y_count is not None:
                 self.fleiss_kappa = self.__calculate_fleiss_kappa(self.y_count)
             else:
                 self.fleiss_kappa = None
@@ -146,43 +533,92 @@ class KappaCalculator:
             self.fleiss_kappa = None
 
         return
-            
+
+    @property
+    def y_list(self):
+        """
+        The ratings as a list of lists, one per rater. For 'count_sq_df' input it is expanded from the table when first used.
+        """
+        if self.__y_list is None and self.__is_count_sq():
+            self.__y_list = [self.y_df.iloc[:, i].tolist() for i in range(2)]
+        return self.__y_list
+
+    @y_list.setter
+    def y_list(self, value):
+        self.__y_list = value
+
+    @property
+    def y_df(self):
+        """
+        The ratings as a DataFrame with one row per sample. For 'count_sq_df' input it is expanded from the table when first used.
+        """
+        if self.__y_df is None and self.__is_count_sq():
+            tmp_count = self.y_count_sq.unstack().reset_index(name='count')
+            self.__y_df = tmp_count.loc[np.repeat(tmp_count.index.values, tmp_count['count'])].drop(columns='count')
+        return self.__y_df
+
+    @y_df.setter
+    def y_df(self, value):
+        self.__y_df = value
+
+    @property
+    def y_count(self):
+        """
+        The count matrix with one row per sample. For 'count_sq_df' input it is expanded from the table when first used.
+        """
+        if self.__y_count is None and self.__is_count_sq():
+            self.__y_count = pd.DataFrame(np.repeat(self.__patterns, self.__freq, axis=0), columns=self.category)
+        return self.__y_count
+
+    @y_count.setter
+    def y_count(self, value):
+        self.__y_count = value
+
+    def __is_count_sq(self):
+        return self.__infmt == 'count_sq_df'
+
     @staticmethod
-    def __convert_2dlist_to_string(y=[], stringna=""):
+    def __count_sq_patterns(table):
         """
-        Converts a 2-dimensional list to a string representation.
+        Converts a K by K table of two raters into the distinct rows of the count matrix and their frequencies.
 
         Parameters:
-        - y: The input list.
-        - stringna: The string representation of missing values.
+        - table: A K by K array of counts.
 
         Returns:
-        - The converted list.
+        - patterns: A K*K by K float64 array, the count matrix row of each cell.
+        - freq: A length K*K int64 array, the count of each cell.
+        """
+        n_category = table.shape[0]
+        eye = np.eye(n_category)
+        patterns = (eye[:, np.newaxis, :] + eye[np.newaxis, :, :]).reshape(-1, n_category)
+        return patterns, table.ravel().astype(np.int64)
 
+    def __fleiss_patterns(self):
         """
-        for i in range(len(y)):
-            if any(isinstance(x, (int)) for x in y[i]):
-                y[i] = [str(x) if x is not None else stringna for x in y[i]]
-        return y
+        Returns the distinct rows of the count matrix and their frequencies.
+        """
+        if self.__patterns is None:
+            self.__patterns, self.__freq = np.unique(self.y_count.to_numpy(dtype=np.float64), axis=0, return_counts=True)
+        return self.__patterns, self.__freq
 
     @staticmethod
-    def __calculate_cohen_kappa(y1, y2):
+    def __convert_2dlist_to_string(y=[], stringna=""):
         """
-        Calculates Cohen's kappa.
+        Converts a 2-dimensional list to a string representation.
 
         Parameters:
-        - y1: The first rater's ratings.
-        - y2: The second rater's ratings.
+        - y: The input list.
+        - stringna: The string representation of missing values.
 
         Returns:
-        - The calculated Cohen's kappa value.
+        - The converted list.
 
         """
-        total_pairs = len(y1)
-        observed_agreement = sum(1 for i in range(total_pairs) if y1[i] == y2[i]) / total_pairs
-        unique_labels = set(y1 + y2)
-        expected_agreement = sum((y1.count(label) / total_pairs) * (y2.count(label) / total_pairs) for label in unique_labels)
-        return (observed_agreement - expected_agreement) / (1 - expected_agreement)
+        for i in range(len(y)):
+            if any(isinstance(x, (int)) for x in y[i]):
+                y[i] = [str(x) if x is not None else stringna for x in y[i]]
+        return y
 
     @staticmethod
     def __calculate_fleiss_kappa(y):
@@ -204,47 +640,189 @@ class KappaCalculator:
 
         return (Pbar_O - Pbar_E) / (1 - Pbar_E)
 
-    def bootstrap_cohen_ci(self, n_iterations=1000, confidence_level=0.95, outfmt='string', out_digits=6):
+    def calculate_weighted_cohen_kappa(self, weights='linear'):
+        """
+        Calculates the weighted Cohen's kappa from the cached confusion matrix (y_count_sq).
+
+        Parameters:
+        - weights: 'unweighted', 'linear', 'quadratic', or a K by K array of disagreement weights.
+          For 'linear' and 'quadratic', numeric categories are used as scores, otherwise the category order is used.
+
+        Returns:
+        - The calculated weighted Cohen's kappa value, or None if there are not 2 raters.
+
+        """
+        if self.n_rater != 2 or self.__table is None:
+            return None
+        return _cohen_kappa_from_table(self.__table, _kappa_weights(weights, self.y_count_sq.columns))
+
+    def bootstrap_cohen_ci(self, n_iterations=1000, confidence_level=0.95, outfmt='string', out_digits=6, seed=None, chunk_size=10000, n_jobs=1, weights=None):
         """
         Calculates the bootstrap confidence interval for Cohen's kappa.
 
+        The replicates are drawn as multinomial counts of the cells of the cached confusion matrix,
+        and the kappa of all replicates in a chunk is calculated at once.
+
         Parameters:
         - n_iterations: The number of bootstrap iterations.
         - confidence_level: The desired confidence level.
         - outfmt: The output format. Allowed values are 'string' and 'list'.
         - out_digits: The number of digits to round the output values.
+        - seed: None, an int, a numpy.random.SeedSequence or a numpy.random.Generator, for reproducible intervals.
+        - chunk_size: The number of replicates calculated at once. Each chunk has its own random stream.
+        - n_jobs: The number of worker processes for the chunks. The interval does not depend on n_jobs. -1 uses all CPUs.
+        - weights: None for the unweighted kappa, or 'linear', 'quadratic', or a K by K array for the weighted kappa.
 
         Returns:
         - If outfmt is 'string', returns a string representation of the result.
         - If outfmt is 'list', returns a list containing the result values.
 
         """
-        assert isinstance(n_iterations, int) and n_iterations > 1, "n_iterations must be an integer greater than 1"
-        assert isinstance(confidence_level, (float)) and 0 < confidence_level < 1, "confidence_level must be a number between 0 and 1"
+        self.__check_bootstrap_args(n_iterations, confidence_level, chunk_size, n_jobs)
+
+        if self.n_rater != 2 or self.__table is None:
+            return []
+
+        n_category = self.__table.shape[0]
+        weight_matrix = _kappa_weights(weights, self.y_count_sq.columns)
+        kappa = self.cohen_kappa if weight_matrix is None else _cohen_kappa_from_table(self.__table, weight_matrix)
+        kappa_values = _bootstrap_replicates(partial(_cohen_kappa_from_cell_counts, n_category=n_category, weights=weight_matrix), self.__table.ravel(), n_iterations, seed, chunk_size, n_jobs)
+
+        name = "Cohen's kappa" if weight_matrix is None else "Weighted Cohen's kappa"
+        return self.__format_ci(name, kappa, kappa_values, n_iterations, confidence_level, outfmt, out_digits)
 
-        if self.n_rater != 2:
+    def bootstrap_fleiss_ci(self, n_iterations=1000, confidence_level=0.95, outfmt='string', out_digits=6, seed=None, chunk_size=10000, n_jobs=1, method='percentile'):
+        """
+        Calculates the bootstrap confidence interval for Fleiss' kappa.
+
+        The samples (rows of y_count) are resampled as multinomial counts of the distinct rows,
+        and the kappa of all replicates in a chunk is calculated at once.
+
+        Parameters:
+        - n_iterations: The number of bootstrap iterations.
+        - confidence_level: The desired confidence level.
+        - outfmt: The output format. Allowed values are 'string' and 'list'.
+        - out_digits: The number of digits to round the output values.
+        - seed: None, an int, a numpy.random.SeedSequence or a numpy.random.Generator, for reproducible intervals.
+        - chunk_size: The number of replicates calculated at once. Each chunk has its own random stream.
+        - n_jobs: The number of worker processes for the chunks. The interval does not depend on n_jobs. -1 uses all CPUs.
+        - method: 'percentile' for the percentile interval, or 'bca' for the bias-corrected and accelerated interval,
+          where the acceleration is estimated with the jackknife.
+
+        Returns:
+        - If outfmt is 'string', returns a string representation of the result.
+        - If outfmt is 'list', returns a list containing the result values.
+
+        """
+        self.__check_bootstrap_args(n_iterations, confidence_level, chunk_size, n_jobs)
+        assert method in ['percentile', 'bca'], "method must be either 'percentile' or 'bca'"
+
+        if self.fleiss_kappa is None:
             return []
 
-        y1 = self.y_list[0]
-        y2 = self.y_list[1]
-        kappa_values = []
-        idx = range(len(y1))
-        for _ in range(n_iterations):
-            idxr = resample(idx)
-            y1r = [y1[i] for i in idxr]
-            y2r = [y2[i] for i in idxr]
-
-            kappa = self.__calculate_cohen_kappa(y1r, y2r)
-            kappa_values.append(kappa)
-
-        lower_percentile = (1 - confidence_level) / 2
-        upper_percentile = 1 - lower_percentile
-        lower_bound = np.percentile(kappa_values, lower_percentile * 100)
-        upper_bound = np.percentile(kappa_values, upper_percentile * 100)
+        patterns, freq = self.__fleiss_patterns()
+        kappa_values = _bootstrap_replicates(partial(_fleiss_kappa_from_pattern_counts, patterns=patterns), freq, n_iterations, seed, chunk_size, n_jobs)
+
+        percentiles = None
+        if method == 'bca':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                jackknife = _fleiss_kappa_jackknife(patterns, freq)
+            percentiles = _bca_percentiles(self.fleiss_kappa, kappa_values[np.isfinite(kappa_values)], jackknife, freq, confidence_level)
+
+        return self.__format_ci("Fleiss' kappa", self.fleiss_kappa, kappa_values, n_iterations, confidence_level, outfmt, out_digits, percentiles)
+
+    def fleiss_z_test(self, outfmt='string', out_digits=6, alternative='greater'):
+        """
+        Tests the hypothesis of no agreement beyond chance with the asymptotic variance of Fleiss' kappa.
+
+        The variance under the hypothesis is calculated from S_p2 and S_p3 (Fleiss, 1971), see statlab_kappa2.
+
+        Parameters:
+        - outfmt: The output format. Allowed values are 'string' and 'list'.
+        - out_digits: The number of digits to round the output values.
+        - alternative: 'greater' for agreement greater than by chance, or 'two-sided'.
+
+        Returns:
+        - If outfmt is 'string', returns a string representation of the result.
+        - If outfmt is 'list', returns a list [kappa, variance, z, p-value].
+
+        """
+        assert alternative in ['greater', 'two-sided'], "alternative must be either 'greater' or 'two-sided'"
+        if self.fleiss_kappa is None:
+            return []
+
+        patterns, freq = self.__fleiss_patterns()
+        var = float(_fleiss_kappa_null_var(freq @ patterns, freq.sum(), patterns[0].sum()))
+        z = self.fleiss_kappa / np.sqrt(var)
+        p_value = 1 - NormalDist().cdf(z) if alternative == 'greater' else 2 * (1 - NormalDist().cdf(abs(z)))
+
+        if outfmt == 'string':
+            return "Fleiss' kappa: {:.{}f}".format(self.fleiss_kappa, out_digits) + "\nVariance under no agreement: {:.{}f}".format(var, out_digits) + "\nz: {:.{}f}, p-value ({}): {:.{}f}".format(z, out_digits, alternative, p_value, out_digits)
+        else:
+            return [self.fleiss_kappa, var, z, p_value]
+
+    def asymptotic_fleiss_ci(self, confidence_level=0.95, outfmt='string', out_digits=6):
+        """
+        Calculates the confidence interval for Fleiss' kappa with the large-sample (delta method) variance,
+        which does not assume no agreement.
+
+        Parameters:
+        - confidence_level: The desired confidence level.
+        - outfmt: The output format. Allowed values are 'string' and 'list'.
+        - out_digits: The number of digits to round the output values.
+
+        Returns:
+        - If outfmt is 'string', returns a string representation of the result.
+        - If outfmt is 'list', returns a list [kappa, variance, confidence_level, lower bound, upper bound].
+
+        """
+        assert isinstance(confidence_level, (float)) and 0 < confidence_level < 1, "confidence_level must be a number between 0 and 1"
+        if self.fleiss_kappa is None:
+            return []
+
+        patterns, freq = self.__fleiss_patterns()
+        var = _fleiss_kappa_delta_var(patterns, freq)
+        half_width = NormalDist().inv_cdf(1 - (1 - confidence_level) / 2) * np.sqrt(var)
+        lower_bound = self.fleiss_kappa - half_width
+        upper_bound = self.fleiss_kappa + half_width
+
+        if outfmt == 'string':
+            return "Fleiss' kappa: {:.{}f}".format(self.fleiss_kappa, out_digits) + "\nVariance: {:.{}f}".format(var, out_digits) + "\nConfidence Interval ({}%): [{:.{}f}, {:.{}f}]".format(confidence_level * 100, lower_bound, out_digits, upper_bound, out_digits)
+        else:
+            return [self.fleiss_kappa, var, confidence_level, lower_bound, upper_bound]
+
+    @staticmethod
+    def __check_bootstrap_args(n_iterations, confidence_level, chunk_size, n_jobs):
+        assert isinstance(n_iterations, int) and n_iterations > 1, "n_iterations must be an integer greater than 1"
+        assert isinstance(confidence_level, (float)) and 0 < confidence_level < 1, "confidence_level must be a number between 0 and 1"
+        assert isinstance(chunk_size, int) and chunk_size >= 1, "chunk_size must be a positive integer"
+        assert isinstance(n_jobs, int) and (n_jobs >= 1 or n_jobs == -1), "n_jobs must be a positive integer or -1"
+
+    @staticmethod
+    def __format_ci(name, kappa, kappa_values, n_iterations, confidence_level, outfmt, out_digits, percentiles=None):
+        """
+        Calculates the interval from the bootstrap replicates and formats the result.
+        The percentile interval is used unless percentiles (between 0 and 100) are given.
+        Replicates with an undefined kappa (e.g. all ratings in one category) are dropped, and the string output reports how many.
+        """
+        if percentiles is None:
+            lower_percentile = (1 - confidence_level) / 2
+            upper_percentile = 1 - lower_percentile
+            percentiles = [lower_percentile * 100, upper_percentile * 100]
+        finite = np.isfinite(kappa_values)
+        n_dropped = int(len(kappa_values) - finite.sum())
+        if n_dropped < len(kappa_values):
+            lower_bound = np.percentile(kappa_values[finite], percentiles[0])
+            upper_bound = np.percentile(kappa_values[finite], percentiles[1])
+        else:
+            lower_bound = upper_bound = np.nan
         if outfmt=='string':
-            return "Cohen's kappa: {:.{}f}".format(self.cohen_kappa, out_digits) + "\nConfidence Interval ({}%): [{:.{}f}, {:.{}f}]".format(confidence_level * 100, lower_bound, out_digits, upper_bound, out_digits)
+            out = "{}: {:.{}f}".format(name, kappa, out_digits) + "\nConfidence Interval ({}%): [{:.{}f}, {:.{}f}]".format(confidence_level * 100, lower_bound, out_digits, upper_bound, out_digits)
+            if n_dropped:
+                out += "\nReplicates with undefined kappa dropped: {} of {}".format(n_dropped, n_iterations)
+            return out
         else:
-            return [self.cohen_kappa, n_iterations, confidence_level, lower_bound, upper_bound]
+            return [kappa, n_iterations, confidence_level, lower_bound, upper_bound]
 
     def create_bubble_plot(self, out_path="", axis_label=[], max_size_ratio=0, hist=False, reverse_y=False):
         """
@@ -325,6 +903,236 @@ class KappaCalculator:
         else:
             print("Cannot create bubble plot. y_count_sq is not a square non-empty matrix.")
 
+class FleissKappaAccumulator:
+    """
+    A class for calculating Fleiss' kappa from data read in chunks.
+
+    Only the sufficient statistics are kept: the total count of each category,
+    the sum of the squared counts over all samples and categories, and the number of samples.
+    Missing ratings are not counted, and every sample must have the same number of ratings.
+    In 'sample_df' chunks, numbers are converted to strings, as in KappaCalculator.
+
+    Parameters:
+    - infmt: The format of the chunks. Allowed values are 'sample_df' (one column per rater) and 'count_df' (one column per category).
+
+    Methods:
+    - update(y): Adds a chunk of samples.
+    - update_csv(path, chunksize, **kwargs): Adds all samples of a CSV file, read in chunks.
+    - update_parquet(path, batch_size, columns): Adds all samples of a Parquet file, read in batches.
+
+    """
+
+    def __init__(self, infmt='sample_df'):
+        """
+        Initializes the FleissKappaAccumulator object.
+
+        Parameters:
+        - infmt: The format of the chunks. Allowed values are 'sample_df' and 'count_df'.
+
+        Raises:
+        - ValueError: If the value of infmt is invalid.
+
+        """
+        if infmt not in ['sample_df', 'count_df']:
+            raise ValueError("Invalid value for infmt. Allowed values are 'sample_df' and 'count_df'.")
+        self.__infmt = infmt
+        self.__category_code = {}
+        self.col_total = np.zeros(0, dtype=np.float64)
+        self.sum_sq = 0.0
+        self.n_sample = 0
+        self.n_rater = None
+
+    @property
+    def category(self):
+        return pd.Index(list(self.__category_code))
+
+    @property
+    def n_category(self):
+        return len(self.__category_code)
+
+    def __category_codes(self, values):
+        for x in values:
+            if x not in self.__category_code:
+                self.__category_code[x] = len(self.__category_code)
+        if len(self.col_total) < len(self.__category_code):
+            self.col_total = np.concatenate([self.col_total, np.zeros(len(self.__category_code) - len(self.col_total))])
+        return np.array([self.__category_code[x] for x in values], dtype=np.int64)
+
+    def update(self, y):
+        """
+        Adds a chunk of samples to the sufficient statistics.
+
+        Parameters:
+        - y: A pandas DataFrame in the format of infmt.
+
+        Returns:
+        - self
+
+        """
+        assert isinstance(y, pd.DataFrame), "y must be a pandas DataFrame"
+        if y.shape[0] == 0:
+            return self
+        if self.__infmt == 'sample_df':
+            codes, uniques = pd.factorize(y.to_numpy(dtype=object).T.ravel())
+            uniques = [str(u) if isinstance(u, (int, float)) else u for u in uniques]
+            remap = np.append(self.__category_codes(uniques), -1)
+            codes = remap[codes].reshape(y.shape[1], -1)
+            count = _count_matrix(codes, self.n_category)
+        else:
+            remap = self.__category_codes(list(y.columns))
+            count = np.zeros((y.shape[0], self.n_category))
+            np.add.at(count, (slice(None), remap), y.to_numpy(dtype=np.float64))
+        row_sum = count.sum(axis=1)
+        if self.n_rater is None:
+            self.n_rater = row_sum[0]
+        assert (row_sum == self.n_rater).all(), "Total number of raters per sample must be equal"
+        self.col_total[:count.shape[1]] += count.sum(axis=0)
+        self.sum_sq += float((count ** 2).sum())
+        self.n_sample += count.shape[0]
+        return self
+
+    def update_csv(self, path, chunksize=100000, **kwargs):
+        """
+        Adds all samples of a CSV file, read with pandas.read_csv in chunks.
+
+        The ratings are read as strings unless dtype is given, so a category is the same in every chunk
+        even if pandas would infer a different type for each chunk.
+
+        Parameters:
+        - path: The path of the CSV file.
+        - chunksize: The number of rows in a chunk.
+        - kwargs: Other arguments of pandas.read_csv, for example usecols.
+
+        Returns:
+        - self
+
+        """
+        kwargs.setdefault('dtype', str)
+        with pd.read_csv(path, chunksize=chunksize, **kwargs) as reader:
+            for chunk in reader:
+                self.update(chunk)
+        return self
+
+    def update_parquet(self, path, batch_size=100000, columns=None):
+        """
+        Adds all samples of a Parquet file, read in record batches. Requires pyarrow.
+
+        Parameters:
+        - path: The path of the Parquet file.
+        - batch_size: The number of rows in a batch.
+        - columns: The columns to read. If None, all columns are read.
+
+        Returns:
+        - self
+
+        """
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+            self.update(batch.to_pandas())
+        return self
+
+    @property
+    def fleiss_kappa(self):
+        if self.n_sample == 0 or self.n_rater is None or self.n_rater < 2:
+            return None
+        return float(_fleiss_kappa_from_totals(self.col_total, self.sum_sq, self.n_sample, self.n_rater))
+
+    @property
+    def fleiss_kappa_var(self):
+        """
+        The variance of Fleiss' kappa under the hypothesis of no agreement beyond chance, see statlab_kappa2.
+        """
+        if self.n_sample == 0 or self.n_rater is None or self.n_rater < 2:
+            return None
+        return float(_fleiss_kappa_null_var(self.col_total, self.n_sample, self.n_rater))
+
+def calculate_batch_kappa(df, subject='subject', endpoint='endpoint', rater='rater', rating='rating', weights=None, n_jobs=1):
+    """
+    Calculates the pairwise Cohen's kappa and the Fleiss' kappa of many endpoints in one call.
+
+    The ratings are factorized once, and the confusion matrices of all endpoints for a pair of raters
+    (and the category counts of all subjects) are built with a single bincount.
+
+    Parameters:
+    - df: A long-format pandas DataFrame with one rating per row.
+    - subject: The column name of the subject (sample) identifier.
+    - endpoint: The column name of the endpoint. Each endpoint is rated independently.
+    - rater: The column name of the rater identifier.
+    - rating: The column name of the rating. Missing ratings are ignored.
+    - weights: None for the unweighted Cohen's kappa, or 'linear', 'quadratic', or a K by K array for the weighted Cohen's kappa.
+    - n_jobs: The number of worker processes. Endpoints are split into n_jobs shards. -1 uses all CPUs.
+
+    Returns:
+    - A pandas DataFrame with columns 'endpoint', 'method', 'rater_1', 'rater_2', 'n_rater', 'n_subject' and 'kappa'.
+      'method' is 'cohen' for a pair of raters (rows for pairs without common subjects are omitted) or 'fleiss' for all raters
+      of an endpoint. Fleiss' kappa uses the subjects rated by the most raters of the endpoint, and 'n_rater' is that number.
+
+    """
+    assert isinstance(df, pd.DataFrame), "df must be a pandas DataFrame"
+    assert all(x in df.columns for x in [subject, endpoint, rater, rating]), "df must include the subject, endpoint, rater and rating columns"
+    assert isinstance(n_jobs, int) and (n_jobs >= 1 or n_jobs == -1), "n_jobs must be a positive integer or -1"
+
+    df = df[df[rating].notna()]
+    endpoint_code, endpoints = pd.factorize(df[endpoint], sort=True)
+    subject_code = pd.factorize(df[subject])[0]
+    rater_code, raters = pd.factorize(df[rater], sort=True)
+    rating_code, categories = pd.factorize(df[rating], sort=True)
+    assert (endpoint_code >= 0).all() and (subject_code >= 0).all() and (rater_code >= 0).all(), "subject, endpoint and rater must not be missing"
+
+    row_code, row_key = pd.factorize(endpoint_code.astype(np.int64) * (subject_code.max(initial=0) + 1) + subject_code)
+    n_rater = len(raters)
+    assert np.bincount(row_code * n_rater + rater_code, minlength=1).max(initial=0) <= 1, "each rater must rate each subject of an endpoint at most once"
+    codes = np.full((len(row_key), n_rater), -1, dtype=np.int64)
+    codes[row_code, rater_code] = rating_code
+    row_endpoint = np.empty(len(row_key), dtype=np.int64)
+    row_endpoint[row_code] = endpoint_code
+
+    n_endpoint = len(endpoints)
+    n_category = len(categories)
+    weight_matrix = _kappa_weights(weights, categories)
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_shard = max(1, min(n_jobs, n_endpoint))
+    bounds = np.linspace(0, n_endpoint, n_shard + 1).astype(np.int64)
+    order = np.argsort(row_endpoint, kind='stable')
+    cuts = np.searchsorted(row_endpoint[order], bounds)
+    shards = [(codes[order[cuts[i]:cuts[i + 1]]], row_endpoint[order[cuts[i]:cuts[i + 1]]] - bounds[i], int(bounds[i + 1] - bounds[i])) for i in range(n_shard)]
+    if n_shard == 1:
+        out = [_batch_kappa_shard(c, e, m, n_category, weight_matrix) for c, e, m in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=n_shard) as executor:
+            out = list(executor.map(partial(_batch_kappa_shard, n_category=n_category, weights=weight_matrix), *zip(*shards)))
+    cohen_kappa, cohen_n, fleiss_kappa, fleiss_n, fleiss_r = [np.concatenate(x, axis=-1) for x in zip(*out)]
+
+    pairs = [(a, b) for a in range(n_rater) for b in range(a + 1, n_rater)]
+    pair_a = np.repeat([a for a, _ in pairs], n_endpoint).astype(np.int64)
+    pair_b = np.repeat([b for _, b in pairs], n_endpoint).astype(np.int64)
+    pair_e = np.tile(np.arange(n_endpoint), len(pairs))
+    keep = cohen_n.ravel() > 0
+    cohen = pd.DataFrame({
+        'e': pair_e[keep],
+        'method': 'cohen',
+        'rater_1': raters[pair_a[keep]],
+        'rater_2': raters[pair_b[keep]],
+        'n_rater': 2,
+        'n_subject': cohen_n.ravel()[keep],
+        'kappa': cohen_kappa.ravel()[keep],
+    })
+    keep = fleiss_r >= 2
+    fleiss = pd.DataFrame({
+        'e': np.arange(n_endpoint)[keep],
+        'method': 'fleiss',
+        'rater_1': None,
+        'rater_2': None,
+        'n_rater': fleiss_r[keep],
+        'n_subject': fleiss_n[keep],
+        'kappa': fleiss_kappa[keep],
+    })
+    result = pd.concat([cohen, fleiss], ignore_index=True).sort_values('e', kind='stable', ignore_index=True)
+    result.insert(0, 'endpoint', endpoints[result.pop('e').to_numpy()])
+    return result
+
 if __name__ == "__main__":
 
     pass
@@ -165,6 +165,54 @@ def summarize_1nc_by_2group(df=None, column="", cutoff=None, group_col0="", grou
 
     return [out, tmp]
 
+def render_tree(rows, to_right=False):
+    """
+    Render the lines of a tree in a single pass.
+
+    The rows must be in depth-first order, where every folder is followed by its subtree. A folder connects
+    its children from the first to the last one with '├──', '│' and '└──' in the column of its level,
+    and every other column before the level of a row is blank.
+
+    Args:
+        rows (list): A list of (key, parent, level, is_folder, text) tuples, where key identifies a node,
+            parent is the key of its folder, and level is its depth.
+        to_right (bool): If True, the text is put before the connectors, which point to the right.
+
+    Returns:
+        list: The lines of the tree, without padding.
+    """
+    if to_right:
+        pre = ['', '    ', '   │', ' ──┤', ' ──┘', '  ']
+    else:
+        pre = ['', '    ', '│   ', '├── ', '└── ', '  ']
+
+    first_child = {}
+    last_child = {}
+    for index, (key, parent, level, is_folder, text) in enumerate(rows):
+        first_child.setdefault(parent, index)
+        last_child[parent] = index
+
+    folder_at_level = {}
+    lines = []
+    for index, (key, parent, level, is_folder, text) in enumerate(rows):
+        cells = []
+        for column in range(level):
+            folder = folder_at_level.get(column)
+            if folder is not None and folder[1] is not None and folder[1] <= index <= folder[2]:
+                if parent == folder[0]:
+                    cells.append(pre[4] if index == folder[2] else pre[3])
+                else:
+                    cells.append(pre[2])
+            else:
+                cells.append(pre[1])
+        if is_folder:
+            folder_at_level[level] = (key, first_child.get(key), last_child.get(key))
+        if to_right:
+            lines.append(text + ''.join(reversed(cells)))
+        else:
+            lines.append(''.join(cells) + text)
+    return lines
+
 class ListTree:
     def __init__(self, lst=[], label=[], infmt='path'):
         self.lst = lst
@@ -194,7 +242,8 @@ class ListTree:
             df0['property'] = df0['property'].apply(lambda x: x.split(' ', 1)[1] if '.pseudo' in x else x)
             df0['lst'] = df0['c1'].str.replace('.', '/')
             df0['lst'] = df0['lst'].apply(lambda x: '/'.join([part.zfill(3) for part in x.split('/')]))
-            df0['lst'] = df0['lst'].apply(lambda x: x + '/' if df0['lst'].str.contains(x+'/').any() else x)
+            parents = {x[:i + 1] for x in df0['lst'] for i, c in enumerate(x) if c == '/'}
+            df0['lst'] = df0['lst'].apply(lambda x: x + '/' if x + '/' in parents else x)
             df0 = df0.drop('c1', axis=1)
             df0 = df0.sort_values('lst').reset_index(drop=True)
         else:
@@ -207,21 +256,25 @@ class ListTree:
         df0['lst'] = df0['lst'].str.replace('^/', '', regex=True)
         df0['type'] = df0['lst'].apply(lambda x: True if x.endswith('/') else False)
         
-        for index, row in df0.iterrows():
-            r0, r1 = row['lst'].rsplit('/', 1)
+        t1 = []
+        t0 = []
+        for x in df0['lst']:
+            r0, r1 = x.rsplit('/', 1)
             if r1 == "":
                 if '/' in r0:
                     s0, s1 = r0.rsplit('/',1)
-                    df0.loc[index, 't1'] = s0
-                    df0.loc[index, 't0'] = s1
+                    t1.append(s0)
+                    t0.append(s1)
                 else:
-                    df0.loc[index, 't1'] = ""
-                    df0.loc[index, 't0'] = r0
+                    t1.append("")
+                    t0.append(r0)
             else:
-                df0.loc[index, 't1'] = r0
-                df0.loc[index, 't0'] = r1
+                t1.append(r0)
+                t0.append(r1)
+        df0['t1'] = t1
+        df0['t0'] = t0
                 
-        df0 = df0.sort_values(by=['lst']).reset_index(drop=True)
+        df0 = df0.sort_values(by=['lst'], key=lambda x: x.str.split('/')).reset_index(drop=True)
         df0['level'] = df0['lst'].str.count('/') + 1
         df0['level'] = df0['level'] - df0['type']
         
@@ -231,64 +284,27 @@ class ListTree:
         df0['row_index'] = df0.index
         df0 = df0[['lst', 'type', 't1', 't0', 'level', 'row_index', 'property']]
         
-        self.df = df0.groupby(df0.columns.difference(['property', 'row_index']).tolist(), sort=False).agg({'row_index': 'max', 'property': lambda x: ''.join(x)}).reset_index().sort_values('row_index')
+        self.df = df0.groupby(df0.columns.difference(['property', 'row_index']).tolist(), sort=False).agg({'row_index': 'max', 'property': 'sum'}).reset_index().sort_values('row_index')
     
     def __list_tree_pre(self, to_right=False):
         self.__list_tree_df()
         if self.df.empty:
             self.prelst = self.df
             return self.prelst
-        
-        max_level = self.df['level'].max()
-        prelst = pd.DataFrame("", index=self.df.index, columns=range(max_level))
-        prelst = pd.DataFrame([['' for _ in range(self.df['level'].max())] for _ in range(len(self.df))])
-        prelst = pd.concat([prelst, self.df[['t0','property','t1','type','level','row_index']]], axis=1).sort_values('row_index')
-        prelst.reset_index(drop=True, inplace=True)
-        prelst['row_index'] = prelst.index
-        
-        if to_right:
-            pre = ['', '    ', '   │', ' ──┤', ' ──┘', '  ']
-        else:
-            pre = ['', '    ', '│   ', '├── ', '└── ', '  ']
-        
-        t1_list = prelst[prelst['type'] == True][['t1','level','t0']]
-        
-        if t1_list.empty:
-            self.prelst = self.df['lst']
-            return self.prelst
-        
-        for index, row in prelst.iterrows():
-            if row['level'] > 0:
-                prelst.loc[index, :(row['level'] - 1)] = [pre[1]] * (row['level'])
-        
-        for index, row in t1_list.iterrows():
-            index_set = prelst[prelst['t1'] == row['t1']+'/'+row['t0']]['row_index']
-            
-            if row['t1'] == "":
-                index_set = prelst[prelst['t1'] == row['t0']]['row_index']
+
+        rows = []
+        for t0, t1, is_folder, level, prop in zip(self.df['t0'], self.df['t1'], self.df['type'], self.df['level'], self.df['property']):
+            key = t1 + '/' + t0 if t1 else t0
+            if self.infmt == 'dotspace':
+                text = prop
+            elif to_right:
+                text = prop + t0
             else:
-                index_set = prelst[prelst['t1'] == row['t1']+'/'+row['t0']]['row_index']
-            
-            if not index_set.empty:
-                min_row_index = index_set.min()
-                max_row_index = index_set.max()
-                prelst.loc[(min_row_index):(max_row_index), row['level']] = [pre[2]] * (max_row_index - min_row_index + 1)
-                prelst.loc[index_set, row['level']] = [pre[3]] * len(index_set)
-                prelst.loc[max_row_index, row['level']] = pre[4]
-        
-        if to_right:
-            prelst['t0'] = prelst.apply(lambda row: row['t0'] if row['type'] == True else row['t0'], axis=1)
-            prelst = prelst.loc[:, :'property']
-            prelst = prelst.iloc[:, ::-1]
-        else:
-            prelst['t0'] = prelst.apply(lambda row: row['t0'] + ':' if row['type'] == True else row['t0'], axis=1)
-            prelst = prelst.loc[:, :'property']
+                text = t0 + (':' if is_folder else '') + prop
+            rows.append((key, t1, level, is_folder, text))
+
+        self.prelst = pd.Series(render_tree(rows, to_right=to_right), dtype=object)
 
-        if self.infmt == 'dotspace':
-            prelst['t0'] = ''
-        
-        self.prelst = prelst
-    
     def list_tree(self, to_right=False):
         """
         Returns a DataFrame representing the tree structure of the object.
@@ -305,7 +321,7 @@ class ListTree:
             self.tree = pd.DataFrame()
             return self.tree
         
-        out_joined = self.prelst.apply(lambda row: ''.join(row), axis=1)
+        out_joined = self.prelst
         
         if to_right:
             max_length = out_joined.str.len().max()
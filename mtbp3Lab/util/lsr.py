@@ -1,4 +1,3 @@
-
 #  Copyright (C) 2023 Y Hsu <yh202109@gmail.com>
 #
 #  This program is free software: you can redistribute it and/or modify
@@ -21,9 +20,1359 @@ import pandas as pd
 import time
 import numpy as np
 import pypdf 
+import sqlite3
+import hashlib
+import re
+import fnmatch
+import mmap
+import csv
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import signal
+import heapq
+import threading
+from collections import namedtuple
+
+from .cdt import render_tree
+
+class PathFilter:
+    """
+    Include and exclude patterns and a depth limit, applied while a directory tree is read.
+
+    Patterns are matched against paths relative to the root, with '/' as separator. A glob pattern without '/'
+    matches the base name (e.g. '*.xpt', '.git'), and a glob pattern with '/' matches the whole relative path
+    (e.g. 'm5/*.xpt', where '*' also matches '/'). With regex=True the patterns are regular expressions searched
+    in the relative path. Excluded directories are not read. Directories that cannot hold an included file,
+    judged by the literal leading folders of the include globs, are not read either.
+
+    Args:
+        include (str or list): The patterns of files to keep. None keeps all files. Defaults to None.
+        exclude (str or list): The patterns of files and directories to skip. Defaults to None.
+        max_depth (int): The deepest folder level to read, where the root is level 0. Deeper folders are listed
+            in their parent but not read. None for no limit. Defaults to None.
+        regex (bool): Whether the patterns are regular expressions instead of globs. Defaults to False.
+    """
+
+    def __init__(self, include=None, exclude=None, max_depth=None, regex=False):
+        include = [include] if isinstance(include, str) else list(include or [])
+        exclude = [exclude] if isinstance(exclude, str) else list(exclude or [])
+        assert max_depth is None or (isinstance(max_depth, int) and max_depth >= 0), "max_depth must be a non-negative integer or None"
+        if not regex:
+            include = [x.rstrip('/') for x in include]
+            exclude = [x.rstrip('/') for x in exclude]
+        self.max_depth = max_depth
+        self.regex = regex
+        self.__include = self.__matcher(include, regex)
+        self.__exclude = self.__matcher(exclude, regex)
+        self.__prefixes = None
+        if include and not regex and all('/' in x for x in include):
+            self.__prefixes = []
+            for x in include:
+                prefix = []
+                for part in x.split('/')[:-1]:
+                    if any(c in part for c in '*?['):
+                        break
+                    prefix.append(part)
+                self.__prefixes.append(prefix)
+
+    @staticmethod
+    def __matcher(patterns, regex):
+        """
+        Compile the patterns into one function of (relative path, base name).
+        """
+        if not patterns:
+            return None
+        if regex:
+            compiled = re.compile('|'.join(f'(?:{x})' for x in patterns))
+            return lambda rel, name: compiled.search(rel) is not None
+        base = [fnmatch.translate(x) for x in patterns if '/' not in x]
+        full = [fnmatch.translate(x) for x in patterns if '/' in x]
+        base = re.compile('|'.join(base)).match if base else (lambda name: None)
+        full = re.compile('|'.join(full)).match if full else (lambda rel: None)
+        return lambda rel, name: base(name) is not None or full(rel) is not None
+
+    def keep_file(self, rel, name):
+        """
+        Whether to list a file.
+
+        Args:
+            rel (str): The path relative to the root, with '/' as separator.
+            name (str): The base name.
+
+        Returns:
+            bool: True if the file is included and not excluded.
+        """
+        if self.__exclude is not None and self.__exclude(rel, name):
+            return False
+        return self.__include is None or self.__include(rel, name)
+
+    def keep_dir(self, rel, name):
+        """
+        Whether to list a directory.
+
+        Args:
+            rel (str): The path relative to the root, with '/' as separator.
+            name (str): The base name.
+
+        Returns:
+            bool: True if the directory is not excluded and can hold an included file.
+        """
+        if self.__exclude is not None and self.__exclude(rel, name):
+            return False
+        if self.__prefixes is None:
+            return True
+        parts = rel.split('/')
+        return any(prefix[:len(parts)] == parts[:len(prefix)] for prefix in self.__prefixes)
+
+    def walk_dir(self, rel):
+        """
+        Whether to read a listed directory, by max_depth.
+
+        Args:
+            rel (str): The path relative to the root, with '/' as separator.
+
+        Returns:
+            bool: True if the directory level is at most max_depth.
+        """
+        return self.max_depth is None or rel.count('/') + 1 <= self.max_depth
+
+    def filter_listing(self, rel, dirnames, filenames, stats, walk_dirs):
+        """
+        Apply the filter to a directory listing read without it, such as a cached listing.
+
+        Args:
+            rel (str): The relative path of the directory, '' for the root.
+            dirnames, filenames, stats, walk_dirs: The listing, see _scan_dir.
+
+        Returns:
+            tuple: The filtered (dirnames, filenames, stats, walk_dirs).
+        """
+        join = (lambda name: rel + '/' + name) if rel else (lambda name: name)
+        dirnames = [d for d in dirnames if self.keep_dir(join(d), d)]
+        kept = set(dirnames)
+        walk_dirs = [d for d in walk_dirs if d in kept and self.walk_dir(join(d))]
+        keep = [self.keep_file(join(f), f) for f in filenames]
+        filenames = [f for f, k in zip(filenames, keep) if k]
+        if stats is not None:
+            stats = [st for st, k in zip(stats, keep) if k]
+        return dirnames, filenames, stats, walk_dirs
+
+def _is_empty_dir(dirpath):
+    """
+    Whether a directory has no entries on disk. False if it cannot be read.
+    """
+    try:
+        with os.scandir(dirpath) as it:
+            return next(it, None) is None
+    except OSError:
+        return False
+
+def _relative_dir(dirpath, root):
+    """
+    The path of dirpath relative to root with '/' as separator, '' for the root.
+    """
+    rel = dirpath[len(root):].lstrip(os.sep) if dirpath.startswith(root) else dirpath
+    return rel.replace(os.sep, '/') if os.sep != '/' else rel
+
+def _scan_dir(dirpath, with_stat=False, cached=None, check_files=True, path_filter=None, root=None):
+    """
+    Read one directory with os.scandir, or take its listing from the cache if its mtime has not changed.
+
+    Args:
+        dirpath (str): The directory to read.
+        with_stat (bool): Whether to stat the files. Defaults to False.
+        cached (dict): A dict from the absolute directory path to (mtime_ns, dirnames, filenames, stats, walk_dirs),
+            see ScanCache.load_dirs. None for no cache. Defaults to None.
+        check_files (bool): Whether to stat the files of a cached directory again when with_stat is True. Defaults to True.
+        path_filter (PathFilter): Skips the filtered files and directories, so the excluded files are not stat'ed. Defaults to None.
+        root (str): The root directory the path_filter patterns are relative to. Required with path_filter. Defaults to None.
+
+    Returns:
+        tuple or None: (dirnames, filenames, stats, walk_dirs, mtime_ns) in os.scandir order, where stats is a list of
+        (size, mtime_ns, ctime_ns) tuples (or None if the file cannot be stat'ed) aligned with filenames, or None if
+        with_stat is False, walk_dirs are the dirnames that are not symbolic links, and mtime_ns is the
+        directory mtime if cached is given. None if the directory cannot be read, as os.walk skips it.
+    """
+    mtime_ns = None
+    rel = _relative_dir(dirpath, root) if path_filter is not None else None
+    if cached is not None:
+        try:
+            mtime_ns = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            return None
+        hit = cached.get(os.path.abspath(dirpath))
+        if hit is not None and hit[0] == mtime_ns and (not with_stat or hit[3] is not None):
+            _, dirnames, filenames, stats, walk_dirs = hit
+            if path_filter is not None:
+                dirnames, filenames, stats, walk_dirs = path_filter.filter_listing(rel, dirnames, filenames, stats, walk_dirs)
+            if with_stat and check_files:
+                stats = []
+                for f in filenames:
+                    try:
+                        st = os.stat(os.path.join(dirpath, f))
+                        stats.append((st.st_size, st.st_mtime_ns, st.st_ctime_ns))
+                    except OSError:
+                        stats.append(None)
+            return dirnames, filenames, stats, walk_dirs, mtime_ns
+
+    dirnames = []
+    filenames = []
+    walk_dirs = []
+    stats = [] if with_stat else None
+    try:
+        scandir_it = os.scandir(dirpath)
+    except OSError:
+        return None
+    prefix = rel + '/' if rel else ''
+    with scandir_it:
+        for entry in scandir_it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if path_filter is not None and not path_filter.keep_dir(prefix + entry.name, entry.name):
+                    continue
+                dirnames.append(entry.name)
+                try:
+                    is_symlink = entry.is_symlink()
+                except OSError:
+                    is_symlink = False
+                if not is_symlink and (path_filter is None or path_filter.walk_dir(prefix + entry.name)):
+                    walk_dirs.append(entry.name)
+            else:
+                if path_filter is not None and not path_filter.keep_file(prefix + entry.name, entry.name):
+                    continue
+                filenames.append(entry.name)
+                if with_stat:
+                    try:
+                        st = entry.stat()
+                        stats.append((st.st_size, st.st_mtime_ns, st.st_ctime_ns))
+                    except OSError:
+                        stats.append(None)
+    return dirnames, filenames, stats, walk_dirs, mtime_ns
+
+def scan_dir_tree(path, n_threads=8, with_stat=False, cache=None, path_filter=None):
+    """
+    Scan a directory tree with os.scandir, reading subdirectories concurrently in a bounded thread pool.
+
+    The result has the same directories, dirnames and filenames as sorted(os.walk(path)): the records are
+    sorted by dirpath, and symbolic links to directories are listed in dirnames but not descended into.
+
+    Args:
+        path (str): The root directory.
+        n_threads (int): The number of threads reading directories. 1 reads them in the calling thread. Defaults to 8.
+        with_stat (bool): Whether to collect (size, mtime_ns, ctime_ns) of the files. Defaults to False.
+        cache (ScanCache): A cache of earlier scans. Directories with an unchanged mtime are not read again. Defaults to None.
+        path_filter (PathFilter): Include and exclude patterns and a depth limit applied while reading, so skipped
+            directories are never read. Filtered listings are read from the cache but not saved to it. Defaults to None.
+
+    Returns:
+        list: A list of (dirpath, dirnames, filenames, stats) tuples, see _scan_dir for stats.
+    """
+    assert isinstance(n_threads, int) and n_threads >= 1, "n_threads must be a positive integer"
+    cached = cache.load_dirs(path) if cache is not None else None
+    check_files = cache.check_files if cache is not None else True
+    results = []
+    if n_threads == 1:
+        stack = [path]
+        while stack:
+            dirpath = stack.pop()
+            result = _scan_dir(dirpath, with_stat, cached, check_files, path_filter, path)
+            if result is None:
+                continue
+            results.append((dirpath, result))
+            stack.extend(os.path.join(dirpath, d) for d in result[3])
+    else:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            pending = {executor.submit(_scan_dir, path, with_stat, cached, check_files, path_filter, path): path}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dirpath = pending.pop(future)
+                    result = future.result()
+                    if result is None:
+                        continue
+                    results.append((dirpath, result))
+                    for d in result[3]:
+                        subdir = os.path.join(dirpath, d)
+                        pending[executor.submit(_scan_dir, subdir, with_stat, cached, check_files, path_filter, path)] = subdir
+    results.sort(key=lambda x: x[0])
+    if cache is not None and path_filter is None:
+        cache.save_dirs([(os.path.abspath(dirpath), r[4], r[0], r[1], r[2], r[3]) for dirpath, r in results])
+    return [(dirpath, r[0], r[1], r[2]) for dirpath, r in results]
+
+_BLOCK_SIZE = 1 << 20
+class EntryTable:
+    """
+    A columnar table of a directory scan.
+
+    Directories are numbered in sorted(os.walk) order. The subfolder names and the files of directory i are
+    subdir_name[subdir_offset[i]:subdir_offset[i + 1]] and file_*[file_offset[i]:file_offset[i + 1]], in os.scandir order.
+    File sizes and times are int64 arrays, with -1 where they are unknown. file_digest holds the checksums
+    (in digest_algorithm) filled in by LsrTree.file_hashes, or is None.
+
+    Args:
+        root (str): The root directory of the scan.
+        records (list): The (dirpath, dirnames, filenames, stats) records of scan_dir_tree.
+    """
+
+    def __init__(self, root, records):
+        self.root = root
+        n_dirs = len(records)
+        self.dir_path = np.empty(n_dirs, dtype=object)
+        self.dir_path[:] = [r[0] for r in records]
+        index = {path: i for i, path in enumerate(self.dir_path)}
+        self.dir_parent = np.array([index.get(os.path.dirname(path), -1) if i > 0 else -1 for i, path in enumerate(self.dir_path)], dtype=np.int32)
+        self.dir_level = np.array([path[len(root):].count(os.sep) if path.startswith(root) else path.count(os.sep) for path in self.dir_path], dtype=np.int32)
+        self.subdir_offset = np.zeros(n_dirs + 1, dtype=np.int64)
+        self.subdir_offset[1:] = np.cumsum([len(r[1]) for r in records])
+        self.subdir_name = np.empty(self.subdir_offset[-1], dtype=object)
+        self.subdir_name[:] = [d for r in records for d in r[1]]
+        self.file_offset = np.zeros(n_dirs + 1, dtype=np.int64)
+        self.file_offset[1:] = np.cumsum([len(r[2]) for r in records])
+        self.file_name = np.empty(self.file_offset[-1], dtype=object)
+        self.file_name[:] = [f for r in records for f in r[2]]
+        self.with_stat = n_dirs > 0 and all(r[3] is not None for r in records)
+        stats = np.full((len(self.file_name), 3), -1, dtype=np.int64)
+        if self.with_stat:
+            known = [(i, st) for i, st in enumerate(st for r in records for st in r[3]) if st is not None]
+            if known:
+                rows, values = zip(*known)
+                stats[list(rows)] = values
+        self.file_size = stats[:, 0]
+        self.file_mtime_ns = stats[:, 1]
+        self.file_ctime_ns = stats[:, 2]
+        self.file_digest = None
+        self.digest_algorithm = None
+
+    @property
+    def n_dirs(self):
+        return len(self.dir_path)
+
+    @property
+    def n_files(self):
+        return len(self.file_name)
+
+    @property
+    def file_dir(self):
+        """
+        The directory number of each file.
+        """
+        return np.repeat(np.arange(self.n_dirs, dtype=np.int32), np.diff(self.file_offset))
+
+    @property
+    def file_type(self):
+        """
+        The extension of each file as a pandas Categorical.
+        """
+        return pd.Categorical([f.split(".")[-1] for f in self.file_name])
+
+    def file_paths(self, relative=False):
+        """
+        The path of each file.
+
+        Args:
+            relative (bool): Whether to give the paths relative to the root, without a leading separator. Defaults to False.
+
+        Returns:
+            np.ndarray: An object array of paths.
+        """
+        if relative:
+            root = self.root
+            dirs = [path[len(root):].lstrip(os.sep) if path.startswith(root) else path for path in self.dir_path]
+        else:
+            dirs = self.dir_path.tolist()
+        out = np.empty(self.n_files, dtype=object)
+        out[:] = [os.path.join(dirs[d], f) for d, f in zip(self.file_dir.tolist(), self.file_name.tolist())]
+        return out
+
+    def __len__(self):
+        return self.n_dirs
+
+    def __getitem__(self, i):
+        """
+        The (dirpath, dirnames, filenames, stats) record of directory i, as in scan_dir_tree.
+        """
+        start, end = self.file_offset[i], self.file_offset[i + 1]
+        filenames = self.file_name[start:end].tolist()
+        stats = None
+        if self.with_stat:
+            stats = [None if size < 0 else (size, mtime, ctime) for size, mtime, ctime in zip(self.file_size[start:end].tolist(), self.file_mtime_ns[start:end].tolist(), self.file_ctime_ns[start:end].tolist())]
+        return self.dir_path[i], self.subdir_name[self.subdir_offset[i]:self.subdir_offset[i + 1]].tolist(), filenames, stats
+
+    def __iter__(self):
+        for i in range(self.n_dirs):
+            yield self[i]
+
+    def save(self, path):
+        """
+        Save the scan to a JSON file, for example to compare a later scan with it in LsrTree.diff.
+        The file checksums are saved too, so a diff with with_hash does not need the old files.
+
+        Args:
+            path (str): The path to the JSON file.
+        """
+        data = {"root": self.root, "records": list(self)}
+        if self.file_digest is not None:
+            data["algorithm"] = self.digest_algorithm
+            data["digests"] = self.file_digest.tolist()
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a scan saved with save.
+
+        Args:
+            path (str): The path to the JSON file.
+
+        Returns:
+            EntryTable: The saved scan.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        records = [(r[0], r[1], r[2], None if r[3] is None else [None if st is None else tuple(st) for st in r[3]]) for r in data["records"]]
+        table = cls(data["root"], records)
+        if "digests" in data:
+            table.file_digest = np.empty(table.n_files, dtype=object)
+            table.file_digest[:] = data["digests"]
+            table.digest_algorithm = data["algorithm"]
+        return table
+
+    def to_dataframe(self):
+        """
+        Convert the files to a pandas DataFrame.
+
+        Returns:
+            pd.DataFrame: One row per file with columns 'path' (the folder path relative to the root, categorical),
+            'level', 'file', 'size_in_bytes' (int64), 'modified' and 'created' (datetime64[ns]), and 'file_type' (categorical).
+        """
+        root = self.root
+        rel_path = [path[len(root):] if path.startswith(root) else path for path in self.dir_path]
+        file_dir = self.file_dir
+        return pd.DataFrame({
+            "path": pd.Categorical.from_codes(file_dir, rel_path),
+            "level": self.dir_level[file_dir] + 1,
+            "file": self.file_name,
+            "size_in_bytes": self.file_size,
+            "modified": np.where(self.file_mtime_ns < 0, np.datetime64("NaT"), self.file_mtime_ns.astype("datetime64[ns]")),
+            "created": np.where(self.file_ctime_ns < 0, np.datetime64("NaT"), self.file_ctime_ns.astype("datetime64[ns]")),
+            "file_type": self.file_type,
+        })
+
+def _file_hash(file_path, algorithm="sha256", block_size=_BLOCK_SIZE):
+    """
+    Calculate the checksum of a file, read in blocks of a memory map.
+
+    Args:
+        file_path (str): The path to the file.
+        algorithm (str): A hashlib algorithm. Defaults to 'sha256'.
+        block_size (int): The number of bytes hashed at a time. Defaults to 1 MiB.
+
+    Returns:
+        str: The hex digest, or None if the file cannot be read.
+    """
+    h = hashlib.new(algorithm)
+    try:
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    view = memoryview(m)
+                    try:
+                        for start in range(0, len(view), block_size):
+                            h.update(view[start:start + block_size])
+                    finally:
+                        view.release()
+    except (OSError, ValueError):
+        return None
+    return h.hexdigest()
+
+def hash_files(paths, algorithm="sha256", n_threads=8):
+    """
+    Calculate the checksums of files in a thread pool. hashlib releases the GIL while hashing large blocks,
+    so the threads hash in parallel.
+
+    Args:
+        paths (list): The paths to the files.
+        algorithm (str): A hashlib algorithm. Defaults to 'sha256'.
+        n_threads (int): The number of threads. Defaults to 8.
+
+    Returns:
+        list: The hex digests in the order of paths, None for files that cannot be read.
+    """
+    if n_threads <= 1 or len(paths) <= 1:
+        return [_file_hash(path, algorithm) for path in paths]
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        return list(executor.map(lambda path: _file_hash(path, algorithm), paths))
+
+def diff_entry_tables(old, new, with_hash=False, algorithm="sha256", cache=None):
+    """
+    Compare two scans by the file paths relative to their roots.
+
+    The files are joined on the relative path with dicts. A file in both scans is modified if its size changed,
+    or if its mtime changed and (with with_hash) its content changed. A removed file and an added file are
+    a move if they have the same size and content (with with_hash), or else the same size and mtime; both are
+    joined on that key, so the comparison stays linear in the number of files. Files are only hashed when they
+    look changed or when a removed and an added file have the same size.
+
+    The checksum of a file is taken from the digests kept in its scan (see LsrTree.file_hashes), then from the
+    cache by (path, size, mtime), and is only read from disk if the file still has the size and mtime of the scan.
+    The old files are never read from disk when both scans have the same root, since those paths now hold the new
+    tree. A file in both scans without an old checksum is reported as modified.
+
+    Args:
+        old (EntryTable): The earlier scan, with file stats.
+        new (EntryTable): The later scan, with file stats.
+        with_hash (bool): Whether to compare the content of files with a changed mtime or a possible move. Defaults to False.
+        algorithm (str): A hashlib algorithm for with_hash. Defaults to 'sha256'.
+        cache (ScanCache): A cache with file checksums saved by LsrTree.file_hashes. Defaults to None.
+
+    Returns:
+        pd.DataFrame: One row per changed file, sorted by path, with columns 'status' ('added', 'removed', 'modified'
+        or 'moved'), 'path' (the relative path, in the new scan unless removed), 'old_path' (for moved files),
+        'old_size' and 'new_size'.
+    """
+    assert old.with_stat and new.with_stat, "both scans must have file stats"
+    old_index = {p: i for i, p in enumerate(old.file_paths(relative=True))}
+    new_index = {p: i for i, p in enumerate(new.file_paths(relative=True))}
+    old_abs = old.file_paths()
+    new_abs = new.file_paths()
+    cached = {}
+    if with_hash and cache is not None:
+        cached.update(cache.load_hashes(old.root, algorithm))
+        cached.update(cache.load_hashes(new.root, algorithm))
+    same_root = os.path.abspath(old.root) == os.path.abspath(new.root)
+    hashes = {}
+
+    def file_hash(table, paths, i):
+        key = (id(table), i)
+        if key not in hashes:
+            hashes[key] = None
+            size, mtime_ns = int(table.file_size[i]), int(table.file_mtime_ns[i])
+            hit = cached.get(os.path.abspath(paths[i]))
+            if table.file_digest is not None and table.digest_algorithm == algorithm and table.file_digest[i] is not None:
+                hashes[key] = table.file_digest[i]
+            elif hit is not None and hit[0] == size and hit[1] == mtime_ns:
+                hashes[key] = hit[2]
+            elif table is new or not same_root:
+                try:
+                    st = os.stat(paths[i])
+                except OSError:
+                    st = None
+                if st is not None and st.st_size == size and st.st_mtime_ns == mtime_ns:
+                    hashes[key] = _file_hash(paths[i], algorithm)
+        return hashes[key]
+
+    rows = []
+    for path, j in new_index.items():
+        i = old_index.get(path)
+        if i is None:
+            continue
+        if old.file_size[i] != new.file_size[j]:
+            rows.append(("modified", path, None, old.file_size[i], new.file_size[j]))
+        elif old.file_mtime_ns[i] != new.file_mtime_ns[j]:
+            h = file_hash(old, old_abs, i) if with_hash else None
+            if h is None or h != file_hash(new, new_abs, j):
+                rows.append(("modified", path, None, old.file_size[i], new.file_size[j]))
+
+    removed = sorted(p for p in old_index if p not in new_index)
+    added = sorted(p for p in new_index if p not in old_index)
+    removed_sizes = {int(old.file_size[old_index[p]]) for p in removed}
+    added_sizes = {int(new.file_size[new_index[p]]) for p in added}
+
+    def move_keys(table, paths, i):
+        # the (size, digest) key, None without a checksum, and the (size, mtime) key
+        size = int(table.file_size[i])
+        digest = None
+        if with_hash and size in removed_sizes and size in added_sizes:
+            digest = file_hash(table, paths, i)
+        return (size, digest) if digest is not None else None, (size, int(table.file_mtime_ns[i]))
+
+    # a removed and an added file are a move if both checksums are known and equal, or else if the size and mtime are equal
+    by_digest, by_mtime, by_mtime_hashed = {}, {}, {}
+    for path in reversed(removed):
+        digest_key, mtime_key = move_keys(old, old_abs, old_index[path])
+        if digest_key is not None:
+            by_digest.setdefault(digest_key, []).append(path)
+            by_mtime_hashed.setdefault(mtime_key, []).append(path)
+        else:
+            by_mtime.setdefault(mtime_key, []).append(path)
+    moved_from = set()
+    for path in added:
+        j = new_index[path]
+        digest_key, mtime_key = move_keys(new, new_abs, j)
+        lookups = [(by_digest, digest_key), (by_mtime, mtime_key)] if digest_key is not None else [(by_mtime, mtime_key), (by_mtime_hashed, mtime_key)]
+        match = None
+        for candidates, key in lookups:
+            paths = candidates.get(key, [])
+            while paths and match is None:
+                match = paths.pop()
+                if match in moved_from:
+                    match = None
+            if match is not None:
+                break
+        if match is not None:
+            moved_from.add(match)
+            rows.append(("moved", path, match, old.file_size[old_index[match]], new.file_size[j]))
+        else:
+            rows.append(("added", path, None, None, new.file_size[j]))
+    for path in removed:
+        if path not in moved_from:
+            rows.append(("removed", path, None, old.file_size[old_index[path]], None))
+
+    df = pd.DataFrame(rows, columns=["status", "path", "old_path", "old_size", "new_size"])
+    df["old_size"] = df["old_size"].astype("Int64")
+    df["new_size"] = df["new_size"].astype("Int64")
+    return df.sort_values(["path", "status"], ignore_index=True)
+
+LsrEntry = namedtuple("LsrEntry", ["path", "level", "type", "name", "size", "mtime", "ctime"])
+_INSPECTED_TYPES = {"xlsx", "sas7bdat", "xpt", "csv", "pdf"}
+
+_CSV_BLANK_LINE = re.compile(rb"\n[ \t]*\r?\n|\r(?!\n)")
+_CSV_LONE_CR = re.compile(rb"\r(?!\n)")
+
+class _InspectTimeout(Exception):
+    pass
+
+def _inspect_csv(file_path):
+    """
+    Count the columns and rows of a CSV file without loading it.
+
+    The rows are counted from the newlines, read in large blocks, after the leading blank lines and the header.
+    Files with quotes (where a field may hold a newline), blank or whitespace-only lines (which pandas skips)
+    or lone carriage returns (which pandas reads as line breaks) are counted with the csv module instead.
+
+    Args:
+        file_path (str): The path to the CSV file.
+
+    Returns:
+        tuple: (num_columns, num_rows) as pd.read_csv would give.
+
+    Raises:
+        pd.errors.EmptyDataError: If the file is empty.
+    """
+    with open(file_path, "rb") as f:
+        # leading blank lines are skipped, as pandas does; the read is bounded, since a file with lone carriage
+        # returns has no b"\n" to stop readline
+        header = f.readline(_BLOCK_SIZE)
+        while header.endswith(b"\n") and not header.strip():
+            header = f.readline(_BLOCK_SIZE)
+        simple = (header.endswith(b"\n") or len(header) < _BLOCK_SIZE) and b'"' not in header and not _CSV_LONE_CR.search(header)
+        if simple and not header.strip():
+            raise pd.errors.EmptyDataError("No columns to parse from file")
+        if simple:
+            num_columns = len(next(csv.reader([header.decode("utf-8", errors="replace")])))
+        num_rows = 0
+        # the unfinished line at the end of the last block, after a b"\n" while it is blank so far
+        line = b"\n"
+        while simple:
+            block = f.read(_BLOCK_SIZE)
+            if not block:
+                break
+            if b'"' in block or _CSV_BLANK_LINE.search(line + block):
+                simple = False
+                break
+            num_rows += block.count(b"\n")
+            end = block.rfind(b"\n")
+            line = (b"\n" if end != -1 else line) + block[end + 1:]
+            if line.strip():
+                line = b""
+        if simple:
+            return num_columns, num_rows + (0 if line.startswith(b"\n") else 1)
+
+    with open(file_path, "r", newline="", encoding="utf-8", errors="replace") as f:
+        rows = (row for row in csv.reader(f) if len(row) > 1 or (row and row[0].strip()))
+        header = next(rows, None)
+        if header is None:
+            raise pd.errors.EmptyDataError("No columns to parse from file")
+        num_rows = sum(1 for _ in rows)
+    return len(header), num_rows
+
+def _inspect_sas7bdat(file_path):
+    """
+    Read the columns and rows of a SAS7BDAT file from its header and metadata pages, without reading the data.
+
+    Args:
+        file_path (str): The path to the SAS7BDAT file.
+
+    Returns:
+        tuple: (num_columns, num_rows).
+    """
+    with pd.read_sas(file_path, format="sas7bdat", iterator=True) as reader:
+        return reader.column_count, reader.row_count
+
+def _inspect_xpt(file_path):
+    """
+    Read the columns and rows of a SAS XPORT file from its header, without reading the data.
+
+    Args:
+        file_path (str): The path to the XPT file.
+
+    Returns:
+        tuple: (num_columns, num_rows).
+    """
+    with pd.read_sas(file_path, format="xport", iterator=True) as reader:
+        return len(reader.fields), reader.nobs
+
+def _xlsx_cell_index(cell):
+    """
+    Convert a cell reference such as 'C10' to the 1-based (column, row).
+    """
+    letters = cell.rstrip("0123456789")
+    column = 0
+    for c in letters.upper():
+        column = column * 26 + ord(c) - ord("A") + 1
+    return column, int(cell[len(letters):])
+
+def _inspect_xlsx(file_path):
+    """
+    Read the number of sheets and the used range of the first sheet from the workbook XML, without loading the cells.
+
+    The sheet XML is streamed, and only the last row and column that hold a value are kept. The declared
+    <dimension> is not used, since it also covers formatted empty cells.
+
+    Args:
+        file_path (str): The path to the xlsx file.
+
+    Returns:
+        tuple: (num_pages, num_columns, num_rows) as parsing the first sheet with a header row would give,
+        or None if the sheet cannot be read this way (e.g. cells without a reference).
+    """
+    ns_main = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+    ns_rel = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+    with zipfile.ZipFile(file_path) as z:
+        sheets = ET.fromstring(z.read("xl/workbook.xml")).find(f"{ns_main}sheets")
+        if sheets is None or len(sheets) == 0:
+            return None
+        rel_id = sheets[0].get(f"{ns_rel}id")
+        target = None
+        for rel in ET.fromstring(z.read("xl/_rels/workbook.xml.rels")):
+            if rel.get("Id") == rel_id:
+                target = rel.get("Target")
+        if target is None:
+            return None
+        target = target.lstrip("/") if target.startswith("/") else "xl/" + target
+        num_columns = 0
+        last_row = 0
+        with z.open(target) as f:
+            for _, elem in ET.iterparse(f, events=("end",)):
+                if elem.tag == f"{ns_main}c":
+                    value = elem.find(f"{ns_main}v")
+                    if (value is not None and value.text) or elem.find(f"{ns_main}is") is not None:
+                        cell = elem.get("r")
+                        if cell is None:
+                            return None
+                        column, row = _xlsx_cell_index(cell)
+                        num_columns = max(num_columns, column)
+                        last_row = max(last_row, row)
+                    elem.clear()
+                elif elem.tag == f"{ns_main}row":
+                    elem.clear()
+                elif elem.tag == f"{ns_main}sheetData":
+                    break
+    return len(sheets), num_columns, max(last_row - 1, 0)
+
+_PDF_REF = re.compile(rb"/Root\s+(\d+)\s+(\d+)\s+R")
+_PDF_XREF_SECTION = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n?")
+_PDF_XREF_ENTRY = re.compile(rb"\s*(\d{10})\s+(\d{5})\s+([nf])")
+_PDF_STREAM_OBJ = re.compile(rb"\s*\d+\s+\d+\s+obj\s*<<")
+_PDF_STREAM_DATA = re.compile(rb"stream\r?\n")
+
+def _pdf_int(head, key):
+    """
+    The direct integer value of a key in a PDF dictionary, or None if it is missing or an indirect reference.
+    """
+    m = re.search(rb"/%s\s+(\d+)(?![0-9])(?!\s+\d+\s+R)" % key, head)
+    return int(m.group(1)) if m else None
+
+def _pdf_unpredict(body, columns):
+    """
+    Undo the PNG None and Up predictors of a decoded stream with one byte per column.
+
+    Args:
+        body (bytes): The decoded stream, one filter type byte followed by the columns per row.
+        columns (int): The number of columns per row.
+
+    Returns:
+        bytes: The rows without their filter type bytes, or None for other predictors or a partial row.
+    """
+    width = columns + 1
+    if len(body) % width:
+        return None
+    rows = np.frombuffer(body, dtype=np.uint8).reshape(-1, width)
+    types = rows[:, 0]
+    if not np.isin(types, (0, 2)).all():
+        return None
+    # an Up row adds the row above, so each row is the sum since the last None row
+    total = np.cumsum(rows[:, 1:], axis=0, dtype=np.int64)
+    last = np.maximum.accumulate(np.where(types == 0, np.arange(len(rows)), -1))
+    base = np.where((last > 0)[:, None], total[np.maximum(last - 1, 0)], 0)
+    return ((total - base) % 256).astype(np.uint8).tobytes()
+
+def _pdf_stream(data, pos):
+    """
+    Read the dictionary and the decoded data of the PDF stream object at an offset.
+
+    FlateDecode data is decompressed block by block until the end of the zlib stream, so an indirect /Length is
+    not needed.
+
+    Args:
+        data (mmap.mmap): The file contents.
+        pos (int): The offset of the object.
+
+    Returns:
+        tuple: The dictionary text and the decoded data, or None if there is no stream at pos or it uses other
+        filters or predictors.
+    """
+    m = _PDF_STREAM_OBJ.match(data, pos)
+    if m is None:
+        return None
+    s = _PDF_STREAM_DATA.search(data, m.end(), m.end() + _BLOCK_SIZE)
+    if s is None:
+        return None
+    head = data[m.end():s.start()]
+    filters = re.search(rb"/Filter\s*(\[[^\]]*\]|/\w+)", head)
+    filters = re.findall(rb"/(\w+)", filters.group(1)) if filters else []
+    if not filters:
+        length = _pdf_int(head, b"Length")
+        if length is None:
+            return None
+        body = data[s.end():s.end() + length]
+    elif filters == [b"FlateDecode"]:
+        decoder = zlib.decompressobj()
+        chunks = []
+        i = s.end()
+        while not decoder.eof:
+            chunk = data[i:i + _BLOCK_SIZE]
+            if not chunk:
+                return None
+            chunks.append(decoder.decompress(chunk))
+            i += len(chunk)
+        body = b"".join(chunks)
+    else:
+        return None
+    predictor = _pdf_int(head, b"Predictor") or 1
+    if predictor >= 10:
+        if (_pdf_int(head, b"Colors") or 1) != 1 or (_pdf_int(head, b"BitsPerComponent") or 8) != 8:
+            return None
+        body = _pdf_unpredict(body, _pdf_int(head, b"Columns") or 1)
+    elif predictor != 1:
+        return None
+    return (head, body) if body is not None else None
+
+def _pdf_xref_table(data, pos, offsets):
+    """
+    Add the entries of the classic cross-reference table at an offset.
+
+    Args:
+        data (mmap.mmap): The file contents.
+        pos (int): The offset of the xref keyword.
+        offsets (dict): The entries read so far, which take precedence.
+
+    Returns:
+        bytes: The trailer text, or None if an entry is malformed.
+    """
+    i = pos + 4
+    while True:
+        m = _PDF_XREF_SECTION.match(data, i)
+        if m is None:
+            break
+        start, count = int(m.group(1)), int(m.group(2))
+        i = m.end()
+        for k in range(count):
+            e = _PDF_XREF_ENTRY.match(data, i)
+            if e is None:
+                return None
+            if e.group(3) == b"n":
+                offsets.setdefault(start + k, int(e.group(1)))
+            i = e.end()
+    trailer = data[i:i + 4096]
+    end = trailer.find(b"startxref")
+    return trailer[:end] if end != -1 else trailer
+
+def _pdf_xref_stream(data, pos, offsets):
+    """
+    Add the entries of the cross-reference stream at an offset.
+
+    Args:
+        data (mmap.mmap): The file contents.
+        pos (int): The offset of the stream object.
+        offsets (dict): The entries read so far, which take precedence.
+
+    Returns:
+        bytes: The stream dictionary text, or None if there is no cross-reference stream at pos.
+    """
+    stream = _pdf_stream(data, pos)
+    if stream is None or not re.search(rb"/Type\s*/XRef\b", stream[0]):
+        return None
+    head, body = stream
+    w = re.search(rb"/W\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s*\]", head)
+    size = _pdf_int(head, b"Size")
+    if w is None or size is None:
+        return None
+    widths = [int(x) for x in w.groups()]
+    index = re.search(rb"/Index\s*\[([\d\s]*)\]", head)
+    index = [int(x) for x in index.group(1).split()] if index else [0, size]
+    width = sum(widths)
+    if width == 0 or len(index) % 2:
+        return None
+    rows = np.frombuffer(body, dtype=np.uint8)[:len(body) // width * width].reshape(-1, width).astype(np.int64)
+    fields = []
+    column = 0
+    for n in widths:
+        field = np.zeros(len(rows), dtype=np.int64)
+        for c in range(column, column + n):
+            field = field * 256 + rows[:, c]
+        fields.append(field.tolist())
+        column += n
+    if widths[0] == 0:
+        fields[0] = [1] * len(rows)
+    kinds, first, second = fields
+    k = 0
+    for start, count in zip(index[::2], index[1::2]):
+        for num in range(start, start + min(count, len(rows) - k)):
+            # type 1 is an offset in the file, type 2 an object stream and an index in it
+            if kinds[k] == 1:
+                offsets.setdefault(num, first[k])
+            elif kinds[k] == 2:
+                offsets.setdefault(num, (first[k], second[k]))
+            k += 1
+    return head
+
+def _pdf_xref_offsets(data):
+    """
+    Read the cross-reference sections of a PDF, following /Prev from the last startxref.
+
+    Both classic tables and cross-reference streams are read, including the /XRefStm streams of hybrid files.
+
+    Args:
+        data (mmap.mmap): The file contents.
+
+    Returns:
+        tuple: A dict from the object number to its offset, or to its object stream number and index for
+        compressed objects, and the (number, generation) of the /Root from the newest trailer, or None.
+    """
+    offsets = {}
+    root = None
+    found = re.findall(rb"startxref\s+(\d+)", data[-1024:])
+    pos = int(found[-1]) if found else None
+    seen = set()
+    while pos is not None and pos not in seen:
+        seen.add(pos)
+        if data[pos:pos + 4] == b"xref":
+            trailer = _pdf_xref_table(data, pos, offsets)
+            stm = _pdf_int(trailer, b"XRefStm") if trailer is not None else None
+            if stm is not None:
+                _pdf_xref_stream(data, stm, offsets)
+        else:
+            trailer = _pdf_xref_stream(data, pos, offsets)
+        if trailer is None:
+            break
+        ref = _PDF_REF.search(trailer)
+        if root is None and ref is not None:
+            root = (int(ref.group(1)), int(ref.group(2)))
+        pos = _pdf_int(trailer, b"Prev")
+    return offsets, root
+
+def _pdf_object(data, num, gen, offsets, streams):
+    """
+    The text of a PDF object, up to its endobj or from its object stream.
+
+    Args:
+        data (mmap.mmap): The file contents.
+        num (int): The object number.
+        gen (int): The generation number.
+        offsets (dict): The entries from _pdf_xref_offsets.
+        streams (dict): The object streams decoded so far, by object number.
+
+    Returns:
+        bytes: The object text, or None if it is not where the cross-reference says or does not end within
+        _BLOCK_SIZE bytes.
+    """
+    entry = offsets.get(num)
+    if isinstance(entry, tuple):
+        stm, index = entry
+        if stm not in streams:
+            pos = offsets.get(stm)
+            streams[stm] = _pdf_stream(data, pos) if isinstance(pos, int) else None
+        if streams[stm] is None:
+            return None
+        head, body = streams[stm]
+        n, first = _pdf_int(head, b"N"), _pdf_int(head, b"First")
+        if n is None or first is None or index >= n:
+            return None
+        # the stream starts with n pairs of object number and offset relative to first
+        pairs = body[:first].split()
+        if len(pairs) < 2 * n or int(pairs[2 * index]) != num:
+            return None
+        end = first + int(pairs[2 * index + 3]) if index + 1 < n else len(body)
+        return body[first + int(pairs[2 * index + 1]):end]
+    if entry is None:
+        return None
+    m = re.compile(rb"%d\s+%d\s+obj\b" % (num, gen)).match(data, entry)
+    if m is None:
+        return None
+    end = data.find(b"endobj", m.end(), m.end() + _BLOCK_SIZE)
+    return data[m.end():end] if end != -1 else None
+
+def _pdf_num_pages(file_path):
+    """
+    Read the number of pages of a PDF from the /Count of its root Pages object, without parsing the whole file.
+
+    The file is memory-mapped. The /Root reference is taken from the newest trailer or cross-reference stream,
+    and the catalog and Pages objects are read at their offsets or from their object streams. Only the
+    cross-reference sections and these objects are read, and the file is never searched as a whole.
+
+    Args:
+        file_path (str): The path to the PDF file.
+
+    Returns:
+        int: The number of pages, or None if it cannot be read this way, e.g. for malformed files, filters other
+        than FlateDecode or an indirect /Count.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                offsets, root = _pdf_xref_offsets(data)
+                if root is None:
+                    return None
+                streams = {}
+                catalog = _pdf_object(data, root[0], root[1], offsets, streams)
+                pages = re.search(rb"/Pages\s+(\d+)\s+(\d+)\s+R", catalog) if catalog is not None else None
+                if pages is None:
+                    return None
+                pages = _pdf_object(data, int(pages.group(1)), int(pages.group(2)), offsets, streams)
+                count = re.search(rb"/Count\s+(\d+)(?!\s+\d+\s+R)(?![0-9])", pages) if pages is not None else None
+                return int(count.group(1)) if count is not None else None
+    except (OSError, ValueError, zlib.error):
+        return None
+
+def _inspect_file(file_path, file_type):
+    """
+    Read the number of pages, columns and rows of a known file type.
+
+    Only the parts of the file that hold these numbers are read. A full parse is the fallback when they cannot be found.
+
+    Args:
+        file_path (str): The path to the file.
+        file_type (str): The file extension, one of 'xlsx', 'sas7bdat', 'xpt', 'csv' or 'pdf'. Other types are not read.
+
+    Returns:
+        tuple: (num_pages, num_columns, num_rows), where unknown values are None.
+    """
+    num_pages = None
+    num_columns = None
+    num_rows = None
+    if file_type == "xlsx":
+        try:
+            dimension = _inspect_xlsx(file_path)
+        except (zipfile.BadZipFile, KeyError, ET.ParseError, ValueError):
+            dimension = None
+        if dimension is not None:
+            num_pages, num_columns, num_rows = dimension
+        else:
+            try:
+                excel_file = pd.ExcelFile(file_path)
+                num_pages = len(excel_file.sheet_names)
+                first_sheet = excel_file.sheet_names[0]
+                sheet = excel_file.parse(first_sheet)
+                num_columns = sheet.shape[1]
+                num_rows = sheet.shape[0]
+            except pd.errors.EmptyDataError:
+                num_pages = 0
+                num_columns = 0
+                num_rows = 0
+    elif file_type == "sas7bdat":
+        try:
+            num_columns, num_rows = _inspect_sas7bdat(file_path)
+        except pd.errors.EmptyDataError:
+            num_columns = 0
+            num_rows = 0
+        except Exception:
+            sas_file = pd.read_sas(file_path)
+            num_columns = sas_file.shape[1]
+            num_rows = sas_file.shape[0]
+    elif file_type == "xpt":
+        try:
+            num_columns, num_rows = _inspect_xpt(file_path)
+        except pd.errors.EmptyDataError:
+            num_columns = 0
+            num_rows = 0
+        except Exception:
+            # not a valid XPORT file: list it without counts
+            num_columns = None
+            num_rows = None
+    elif file_type == "csv":
+        try:
+            num_columns, num_rows = _inspect_csv(file_path)
+        except pd.errors.EmptyDataError:
+            num_columns = 0
+            num_rows = 0
+    elif file_type == "pdf":
+        num_pages = _pdf_num_pages(file_path)
+        if num_pages is None:
+            with open(file_path, "rb") as f:
+                pdf = pypdf.PdfReader(f, strict=False)
+                num_pages = pdf.get_num_pages()
+    return num_pages, num_columns, num_rows
+
+def iter_dir_tree(path, n_threads=8, with_stat=False, prefetch=None, path_filter=None):
+    """
+    Scan a directory tree like scan_dir_tree, but yield each directory as soon as it is the next one in sorted order.
+
+    The directories waiting to be read are kept in a heap. Every directory sorts after its parent, so the smallest
+    path in the heap is always the next one in sorted(os.walk(path)) order. After each directory is taken from
+    the heap, the smallest directories not read yet are submitted to a bounded thread pool until prefetch reads
+    are running, so the reads stay concurrent on wide trees.
+
+    Args:
+        path (str): The root directory.
+        n_threads (int): The number of threads reading directories. 1 reads them in the calling thread. Defaults to 8.
+        with_stat (bool): Whether to collect (size, mtime_ns, ctime_ns) of the files. Defaults to False.
+        prefetch (int): The maximum number of directory reads running or queued at a time. None for 4 * n_threads. Defaults to None.
+        path_filter (PathFilter): Include and exclude patterns and a depth limit applied while reading. Defaults to None.
+
+    Yields:
+        tuple: (dirpath, dirnames, filenames, stats), see _scan_dir for stats.
+    """
+    assert isinstance(n_threads, int) and n_threads >= 1, "n_threads must be a positive integer"
+    if n_threads == 1:
+        heap = [path]
+        while heap:
+            dirpath = heapq.heappop(heap)
+            result = _scan_dir(dirpath, with_stat, path_filter=path_filter, root=path)
+            if result is None:
+                continue
+            for d in result[3]:
+                heapq.heappush(heap, os.path.join(dirpath, d))
+            yield dirpath, result[0], result[1], result[2]
+        return
+
+    prefetch = 4 * n_threads if prefetch is None else prefetch
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        heap = [path]
+        # the directories in heap that are not submitted yet, in the same order
+        unsubmitted = []
+        futures = {path: executor.submit(_scan_dir, path, with_stat, None, True, path_filter, path)}
+        while heap:
+            dirpath = heapq.heappop(heap)
+            future = futures.pop(dirpath, None)
+            if future is None:
+                heapq.heappop(unsubmitted)
+            result = future.result() if future is not None else _scan_dir(dirpath, with_stat, path_filter=path_filter, root=path)
+            if result is None:
+                continue
+            for d in result[3]:
+                subdir = os.path.join(dirpath, d)
+                heapq.heappush(heap, subdir)
+                heapq.heappush(unsubmitted, subdir)
+            # keep prefetch reads running, starting with the directories that are yielded first
+            running = sum(1 for f in futures.values() if not f.done())
+            while unsubmitted and running < prefetch:
+                subdir = heapq.heappop(unsubmitted)
+                futures[subdir] = executor.submit(_scan_dir, subdir, with_stat, None, True, path_filter, path)
+                running += 1
+            yield dirpath, result[0], result[1], result[2]
+
+def _inspect_file_with_timeout(file_path, file_type, timeout=None):
+    """
+    Run _inspect_file with a time limit, for the worker processes of LsrTree.list_files_dataframe.
+
+    The limit uses SIGALRM, so it is only applied in the main thread on platforms that have it.
+    A file that cannot be read (e.g. a truncated PDF) fails on its own instead of stopping the listing.
+
+    Args:
+        file_path (str): The path to the file.
+        file_type (str): The file extension.
+        timeout (float): The number of seconds allowed. None for no limit. Defaults to None.
+
+    Returns:
+        tuple: ((num_pages, num_columns, num_rows), failed), where the values are None if the file timed out
+        or raised an error, and failed is True.
+    """
+    if not timeout or not hasattr(signal, "SIGALRM") or threading.current_thread() is not threading.main_thread():
+        try:
+            return _inspect_file(file_path, file_type), False
+        except Exception:
+            return (None, None, None), True
+
+    def handler(signum, frame):
+        raise _InspectTimeout()
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return _inspect_file(file_path, file_type), False
+    except Exception:
+        return (None, None, None), True
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+class ScanCache:
+    """
+    An SQLite cache of LsrTree scans.
+
+    Each directory is stored with its mtime, listing and file stats, so a directory whose mtime has not changed
+    is not read again. The pages, columns and rows of each inspected file are stored with its (size, mtime_ns),
+    so only new or changed files are inspected again. File checksums are stored the same way.
+
+    Args:
+        path (str): The path to the SQLite file. ':memory:' keeps the cache in memory.
+        max_files (int): The maximum number of inspected files to keep. The least recently seen files are removed first. None for no limit. Defaults to None.
+        max_dirs (int): The maximum number of directories to keep, removed the same way. None for no limit. Defaults to None.
+        check_files (bool): Whether to stat the files of an unchanged directory again, which finds files changed in place
+            (the directory mtime only changes when files are added, removed or renamed). Defaults to True.
+    """
+
+    def __init__(self, path, max_files=None, max_dirs=None, check_files=True):
+        self.path = path
+        self.max_files = max_files
+        self.max_dirs = max_dirs
+        self.check_files = check_files
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER, listing TEXT, last_seen REAL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, info TEXT, last_seen REAL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS hashes (path TEXT, algorithm TEXT, size INTEGER, mtime_ns INTEGER, digest TEXT, last_seen REAL, PRIMARY KEY (path, algorithm))")
+        self.connection.commit()
+
+    @staticmethod
+    def __under(root):
+        """
+        The SQL condition and parameters for the paths at or under root.
+        """
+        root = os.path.abspath(root)
+        prefix = root.rstrip(os.sep) + os.sep
+        return "(path = ? OR (path >= ? AND path < ?))", (root, prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+
+    def load_dirs(self, root):
+        """
+        Load the cached directories under root.
+
+        Args:
+            root (str): The root directory.
+
+        Returns:
+            dict: A dict from the absolute directory path to (mtime_ns, dirnames, filenames, stats, walk_dirs).
+        """
+        condition, params = self.__under(root)
+        out = {}
+        for path, mtime_ns, listing in self.connection.execute(f"SELECT path, mtime_ns, listing FROM dirs WHERE {condition}", params):
+            listing = json.loads(listing)
+            stats = None if listing[2] is None else [None if x is None else tuple(x) for x in listing[2]]
+            out[path] = (mtime_ns, listing[0], listing[1], stats, listing[3])
+        return out
+
+    def save_dirs(self, rows):
+        """
+        Save scanned directories.
+
+        Args:
+            rows (list): A list of (absolute path, mtime_ns, dirnames, filenames, stats, walk_dirs) tuples.
+        """
+        now = time.time()
+        self.connection.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)", [(r[0], r[1], json.dumps(r[2:]), now) for r in rows])
+        self.connection.commit()
+        self.__enforce_limit("dirs", self.max_dirs)
+
+    def load_files(self, root):
+        """
+        Load the cached file inspections under root.
+
+        Args:
+            root (str): The root directory.
+
+        Returns:
+            dict: A dict from the absolute file path to (size, mtime_ns, (num_pages, num_columns, num_rows)).
+        """
+        condition, params = self.__under(root)
+        return {path: (size, mtime_ns, tuple(json.loads(info))) for path, size, mtime_ns, info in self.connection.execute(f"SELECT path, size, mtime_ns, info FROM files WHERE {condition}", params)}
+
+    def save_files(self, rows):
+        """
+        Save file inspections.
+
+        Args:
+            rows (list): A list of (absolute path, size, mtime_ns, (num_pages, num_columns, num_rows)) tuples.
+        """
+        now = time.time()
+        self.connection.executemany("INSERT OR REPLACE INTO files (path, size, mtime_ns, info, last_seen) VALUES (?, ?, ?, ?, ?)", [(r[0], r[1], r[2], json.dumps(r[3]), now) for r in rows])
+        self.connection.commit()
+        self.__enforce_limit("files", self.max_files)
+
+    def load_hashes(self, root, algorithm="sha256"):
+        """
+        Load the cached file checksums under root.
+
+        Args:
+            root (str): The root directory.
+            algorithm (str): The hashlib algorithm of the checksums. Defaults to 'sha256'.
+
+        Returns:
+            dict: A dict from the absolute file path to (size, mtime_ns, digest).
+        """
+        condition, params = self.__under(root)
+        return {path: (size, mtime_ns, digest) for path, size, mtime_ns, digest in self.connection.execute(f"SELECT path, size, mtime_ns, digest FROM hashes WHERE algorithm = ? AND {condition}", (algorithm,) + params)}
+
+    def save_hashes(self, rows, algorithm="sha256"):
+        """
+        Save file checksums.
+
+        Args:
+            rows (list): A list of (absolute path, size, mtime_ns, digest) tuples.
+            algorithm (str): The hashlib algorithm of the checksums. Defaults to 'sha256'.
+        """
+        now = time.time()
+        self.connection.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)", [(r[0], algorithm, r[1], r[2], r[3], now) for r in rows])
+        self.connection.commit()
+        self.__enforce_limit("hashes", self.max_files)
+
+    def __enforce_limit(self, table, limit):
+        if limit is None:
+            return
+        self.connection.execute(f"DELETE FROM {table} WHERE path IN (SELECT path FROM {table} ORDER BY last_seen DESC, path LIMIT -1 OFFSET ?)", (limit,))
+        self.connection.commit()
+
+    def prune(self, root=None):
+        """
+        Remove the cached directories and files that no longer exist.
+
+        Args:
+            root (str): Only check the paths under root. None checks all paths. Defaults to None.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        condition, params = self.__under(root) if root is not None else ("1", ())
+        removed = 0
+        for table, exists in [("dirs", os.path.isdir), ("files", os.path.isfile), ("hashes", os.path.isfile)]:
+            gone = [(path,) for (path,) in self.connection.execute(f"SELECT path FROM {table} WHERE {condition}", params) if not exists(path)]
+            self.connection.executemany(f"DELETE FROM {table} WHERE path = ?", gone)
+            removed += len(gone)
+        self.connection.commit()
+        return removed
+
+    def clear(self):
+        """
+        Remove all cached entries.
+        """
+        self.connection.execute("DELETE FROM dirs")
+        self.connection.execute("DELETE FROM files")
+        self.connection.execute("DELETE FROM hashes")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
 
 class LsrTree:
-    def __init__(self, path="", outfmt="list", with_counts=False, count_str="", with_file_label=False, label_str=""):
+    def __init__(self, path="", outfmt="list", with_counts=False, count_str="", with_file_label=False, label_str="", n_threads=8, cache=None, n_jobs=1, timeout=None, include=None, exclude=None, max_depth=None, regex=False):
         """
         Initialize the LsrTree object.
 
@@ -34,6 +1383,15 @@ class LsrTree:
             with_file_label (bool): Whether to include the label of known files in the dataframe output. Defaults to False.
             count_str (str): The string to use for search for the count of files. Defaults to an empty string.
             label_str (str): The string to use for label files. Defaults to an empty string.
+            n_threads (int): The number of threads reading directories during the scan. Defaults to 8.
+            cache (str or ScanCache): An SQLite cache file (or ScanCache object) of earlier scans. Unchanged directories
+                are not read again and unchanged files are not inspected again. Defaults to None.
+            n_jobs (int): The number of worker processes inspecting files for the dataframe output. -1 uses all CPUs. Defaults to 1.
+            timeout (float): The number of seconds allowed for inspecting one file for the dataframe output. None for no limit. Defaults to None.
+            include (str or list): Glob (or regex) patterns of the files to list, e.g. 'm5/*.xpt'. None lists all files. Defaults to None.
+            exclude (str or list): Patterns of the files and folders to skip, e.g. ['.git', 'archive']. Excluded folders are not read. Defaults to None.
+            max_depth (int): The deepest folder level to read, where the root is level 0. None for no limit. Defaults to None.
+            regex (bool): Whether include and exclude are regular expressions instead of globs. See PathFilter. Defaults to False.
         """
         if path and path.endswith('/'):
             path = path[:-1]
@@ -41,6 +1399,44 @@ class LsrTree:
         self.outfmt = outfmt
         self.with_counts = with_counts
         self.count_str = count_str
+        self.n_threads = n_threads
+        self.cache = ScanCache(cache) if isinstance(cache, str) else cache
+        self.n_jobs = n_jobs
+        self.timeout = timeout
+        if include or exclude or max_depth is not None:
+            self.path_filter = PathFilter(include, exclude, max_depth, regex)
+        else:
+            self.path_filter = None
+        self.entries = None
+        self.__entries_with_stat = False
+
+    def scan(self, with_stat=False, refresh=False):
+        """
+        Scan the directory tree and keep the entry table in entries.
+
+        list_files, diff and find_duplicates rescan on every call, so their output is never stale. Without refresh,
+        the last table is returned, and the list_files_* methods render it, for several outputs of the same scan.
+
+        Args:
+            with_stat (bool): Whether file sizes and times are needed. A table scanned without them is rescanned. Defaults to False.
+            refresh (bool): Whether to rescan the directory tree even if it was scanned before. Defaults to False.
+
+        Returns:
+            EntryTable: The columnar entry table. Iterating it gives (dirpath, dirnames, filenames, stats) records sorted by dirpath.
+        """
+        if refresh or self.entries is None or (with_stat and not self.__entries_with_stat):
+            self.entries = EntryTable(self.path, scan_dir_tree(self.path, n_threads=self.n_threads, with_stat=with_stat, cache=self.cache, path_filter=self.path_filter))
+            self.__entries_with_stat = with_stat
+        return self.entries
+
+    def __empty_folder(self, dirpath, dirnames, filenames):
+        """
+        Whether to mark a scanned folder as empty. With include or exclude patterns, a folder with nothing listed is
+        only marked if it is also empty on disk, so folders that are empty only because of the filter are left out.
+        """
+        if dirnames or filenames:
+            return False
+        return self.path_filter is None or _is_empty_dir(dirpath)
 
     def list_files(self):
         """
@@ -64,6 +1460,9 @@ class LsrTree:
 
         assert self.outfmt in ["list", "json", "string", "dataframe", "tree"], "Invalid output format. Must be one of 'list', 'json', 'string', 'tree', or 'dataframe'."
 
+        # one fresh scan per call, rendered by the list_files_* method of the output format
+        self.scan(with_stat=self.outfmt == "dataframe", refresh=True)
+
         if self.outfmt == "json":
             return self.list_files_json()
         elif self.outfmt == "list":
@@ -75,16 +1474,133 @@ class LsrTree:
         else:
             return self.list_files_string()
 
-    def list_files_json(self):
+    def iter_entries(self, with_stat=False):
+        """
+        Yield the folders and files one at a time, in the order of list_files_list, as the directories are read.
+
+        Nothing is kept after it is yielded, so a caller can stop early or write the records out incrementally.
+
+        Args:
+            with_stat (bool): Whether to fill in the size, mtime and ctime (in nanoseconds) of files. Defaults to False.
+
+        Yields:
+            LsrEntry: A (path, level, type, name, size, mtime, ctime) record. For a folder, type is 'folder', path is
+            the folder path relative to the root ('' for the root) and name is its base name. For a file, type is 'file',
+            path is the relative path of its folder and level is one more than the folder level. size, mtime and ctime
+            are None for folders, or when with_stat is False.
+        """
+        for s0, d0, f0, st0 in iter_dir_tree(self.path, n_threads=self.n_threads, with_stat=with_stat, path_filter=self.path_filter):
+            if s0.startswith(self.path):
+                s1 = s0[len(self.path):] if len(s0) > len(self.path) else ""
+            else:
+                s1 = s0
+            level = s1.count(os.sep)
+            yield LsrEntry(s1, level, "folder", os.path.basename(s0), None, None, None)
+            if with_stat:
+                for f1, st in sorted(zip(f0, st0)):
+                    yield LsrEntry(s1, level + 1, "file", f1, *(st if st is not None else (None, None, None)))
+            else:
+                for f1 in sorted(f0):
+                    yield LsrEntry(s1, level + 1, "file", f1, None, None, None)
+
+    def diff(self, other, with_hash=False, algorithm="sha256"):
+        """
+        Compare this directory with another scan, for example an earlier or later delivery.
+
+        Args:
+            other (LsrTree or EntryTable or str): The later scan, as an LsrTree, an EntryTable (such as a scan loaded
+                with EntryTable.load) or a directory path, which is scanned with the filter and cache of this tree.
+            with_hash (bool): Whether to compare the content of files that look changed. Defaults to False.
+            algorithm (str): A hashlib algorithm for with_hash. Defaults to 'sha256'.
+
+        Returns:
+            pd.DataFrame: The added, removed, modified and moved files, see diff_entry_tables.
+        """
+        if isinstance(other, str):
+            other = LsrTree(other, n_threads=self.n_threads, cache=self.cache)
+            other.path_filter = self.path_filter
+        if isinstance(other, LsrTree):
+            other = other.scan(with_stat=True)
+        return diff_entry_tables(self.scan(with_stat=True, refresh=True), other, with_hash=with_hash, algorithm=algorithm, cache=self.cache)
+
+    def file_hashes(self, index=None, algorithm="sha256"):
+        """
+        Calculate the checksums of files in the scan, in a thread pool of n_threads. With a cache, the checksums
+        of unchanged files are reused and new ones are saved. The checksums are also kept in the file_digest of
+        the entry table, so a saved scan carries them.
+
+        Args:
+            index (array-like): The positions of the files in the current entry table (entries). None rescans and hashes all files. Defaults to None.
+            algorithm (str): A hashlib algorithm. Defaults to 'sha256'.
+
+        Returns:
+            list: The hex digests, None for files that cannot be read.
+        """
+        table = self.scan(with_stat=True, refresh=index is None)
+        index = np.arange(table.n_files) if index is None else np.asarray(index, dtype=np.int64)
+        paths = table.file_paths()[index].tolist()
+        sizes = table.file_size[index].tolist()
+        mtimes = table.file_mtime_ns[index].tolist()
+        cached = self.cache.load_hashes(self.path, algorithm) if self.cache is not None else {}
+        digests = [None] * len(paths)
+        todo = []
+        for k, (path, size, mtime_ns) in enumerate(zip(paths, sizes, mtimes)):
+            hit = cached.get(os.path.abspath(path))
+            if hit is not None and hit[0] == size and hit[1] == mtime_ns:
+                digests[k] = hit[2]
+            else:
+                todo.append(k)
+        for k, digest in zip(todo, hash_files([paths[k] for k in todo], algorithm, self.n_threads)):
+            digests[k] = digest
+        if self.cache is not None and todo:
+            self.cache.save_hashes([(os.path.abspath(paths[k]), sizes[k], mtimes[k], digests[k]) for k in todo if digests[k] is not None], algorithm)
+        if table.file_digest is None or table.digest_algorithm != algorithm:
+            table.file_digest = np.full(table.n_files, None, dtype=object)
+            table.digest_algorithm = algorithm
+        table.file_digest[index] = digests
+        return digests
+
+    def find_duplicates(self, algorithm="sha256", min_size=1):
+        """
+        Find files with the same content, such as a define.xml copied into several folders.
+
+        Files are grouped by size first, so only files that share their size with another file are hashed.
+
+        Args:
+            algorithm (str): A hashlib algorithm. Defaults to 'sha256'.
+            min_size (int): The smallest file size in bytes to consider. Defaults to 1, which skips empty files.
+
+        Returns:
+            pd.DataFrame: One row per duplicated file with columns 'group', 'digest', 'size' and 'path' (relative to
+            the root), sorted by decreasing size, then digest and path. Files in the same group have the same content.
+        """
+        table = self.scan(with_stat=True, refresh=True)
+        size, counts = np.unique(table.file_size, return_counts=True)
+        index = np.flatnonzero(np.isin(table.file_size, size[(counts > 1) & (size >= min_size)]))
+        df = pd.DataFrame({
+            'digest': self.file_hashes(index, algorithm),
+            'size': table.file_size[index],
+            'path': table.file_paths(relative=True)[index],
+        })
+        df = df[df['digest'].notna() & df['digest'].duplicated(keep=False)]
+        df = df.sort_values(['size', 'digest', 'path'], ascending=[False, True, True], ignore_index=True)
+        df.insert(0, 'group', (df['digest'] != df['digest'].shift()).cumsum() - 1)
+        return df
+
+    def list_files_json(self, refresh=False):
         """
         List files in the specified directory and return the result as a JSON string.
 
+        Args:
+            refresh (bool): Whether to rescan the directory tree. Without it, the last scan is rendered, so several
+                outputs can be rendered from one scan; a tree that was not scanned yet is scanned. Defaults to False.
+
         Returns:
             str: The JSON string representing the file list.
         """
         data = {}
         idx = 0
-        for s0, d0, f0 in sorted(os.walk(self.path)):
+        for s0, d0, f0, _ in self.scan(refresh=refresh):
             if s0.startswith(self.path):
                 s1 = s0[len(self.path):] if len(s0) > len(self.path) else ""
             else:
@@ -94,34 +1610,51 @@ class LsrTree:
             idx = idx + 1
         return json.dumps(data)
 
-    def list_files_list(self):
+    def list_files_list(self, refresh=False):
         """
         List files in the specified directory and return the result as a list.
 
+        Args:
+            refresh (bool): Whether to rescan the directory tree. Without it, the last scan is rendered, so several
+                outputs can be rendered from one scan; a tree that was not scanned yet is scanned. Defaults to False.
+
         Returns:
             list: The list of files.
         """
         files = []
-        for s0, d0, f0 in sorted(os.walk(self.path)):
+        for s0, d0, f0, _ in self.scan(refresh=refresh):
             if s0.startswith(self.path):
                 s1 = s0[len(self.path):] if len(s0) > len(self.path) else ""
             else:
                 s1 = s0 
             for f1 in sorted(f0):
                 files.append(os.path.join(s1, f1))
-            if len(f0) == 0 and len(d0) == 0:
+            if self.__empty_folder(s0, d0, f0):
                 files.append(s1 + "/(((empty folder)))")
         return files
 
-    def list_files_dataframe(self):
+    def list_files_dataframe(self, n_jobs=None, timeout=None, refresh=False):
         """
         List files in the specified directory and return the result as a pandas DataFrame.
 
+        Args:
+            n_jobs (int): The number of worker processes inspecting the files. -1 uses all CPUs. None uses the value given to LsrTree. Defaults to None.
+            timeout (float): The number of seconds allowed for inspecting one file. The pages, columns and rows of a file
+                that times out or cannot be read are left as None and not cached. None uses the value given to LsrTree. Defaults to None.
+            refresh (bool): Whether to rescan the directory tree. Without it, the last scan is rendered, so several
+                outputs can be rendered from one scan; a tree that was not scanned yet is scanned. Defaults to False.
+
         Returns:
             pd.DataFrame: The DataFrame representing the file list.
         """
+        n_jobs = self.n_jobs if n_jobs is None else n_jobs
+        timeout = self.timeout if timeout is None else timeout
+        assert isinstance(n_jobs, int) and (n_jobs >= 1 or n_jobs == -1), "n_jobs must be a positive integer or -1"
+
         data = []
-        for s0, d0, f0 in sorted(os.walk(self.path)):
+        tasks = []
+        file_info = self.cache.load_files(self.path) if self.cache is not None else {}
+        for s0, d0, f0, st0 in self.scan(with_stat=True, refresh=refresh):
             if s0.startswith(self.path):
                 s1 = s0[len(self.path):] if len(s0) > len(self.path) else ""
             else:
@@ -130,63 +1663,59 @@ class LsrTree:
             if level == 0:
                 s1 = "."
             if len(f0) > 0:
-                for f1 in sorted(f0):
+                for f1, st in sorted(zip(f0, st0)):
                     file_path = os.path.join(s0, f1)
-                    file_size = os.path.getsize(file_path)
-                    file_modified = time.ctime(os.path.getmtime(file_path))
-                    file_created = time.ctime(os.path.getctime(file_path))
+                    if st is None:
+                        st = os.stat(file_path)
+                        st = (st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+                    file_size = st[0]
+                    file_modified = time.ctime(st[1] / 1e9)
+                    file_created = time.ctime(st[2] / 1e9)
                     file_type = f1.split(".")[-1]
-                    num_pages = None
-                    num_columns = None
-                    num_rows = None
-                    if file_type == "xlsx":
-                        try:
-                            excel_file = pd.ExcelFile(file_path)
-                            num_pages = len(excel_file.sheet_names)
-                            first_sheet = excel_file.sheet_names[0]
-                            sheet = excel_file.parse(first_sheet)
-                            num_columns = sheet.shape[1]
-                            num_rows = sheet.shape[0]
-                        except pd.errors.EmptyDataError:
-                            num_pages = 0
-                            num_columns = 0
-                            num_rows = 0
-                    elif file_type == "sas7bdat":
-                        try:
-                            sas_file = pd.read_sas(file_path)
-                            num_columns = sas_file.shape[1]
-                            num_rows = sas_file.shape[0]
-                        except pd.errors.EmptyDataError:
-                            num_columns = 0
-                            num_rows = 0
-                    elif file_type == "csv":
-                        try:
-                            csv_file = pd.read_csv(file_path)
-                            num_columns = csv_file.shape[1]
-                            num_rows = csv_file.shape[0]
-                        except pd.errors.EmptyDataError:
-                            num_columns = 0
-                            num_rows = 0
-                    elif file_type == "pdf":
-                        with open(file_path, "rb") as f:
-                            pdf = pypdf.PdfReader(f, strict=False)
-                            num_pages = pdf.get_num_pages()
-
-                    data.append((s1, level + 1, "file", f1, str(file_size), file_modified, file_created, file_type, str(num_pages), str(num_columns), str(num_rows)))
-            elif len(d0) == 0:
+                    info = (None, None, None)
+                    if file_type in _INSPECTED_TYPES:
+                        cached = file_info.get(os.path.abspath(file_path))
+                        if cached is not None and cached[0] == file_size and cached[1] == st[1]:
+                            info = cached[2]
+                        else:
+                            tasks.append((len(data), file_path, file_type, file_size, st[1]))
+
+                    data.append([s1, level + 1, "file", f1, str(file_size), file_modified, file_created, file_type] + [str(x) for x in info])
+            elif self.__empty_folder(s0, d0, f0):
                 data.append((s1, level, "folder", "<<<((( Empty Folder )))>>>", None, None, None, None, None, None, None))
+
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+        args = [(task[1], task[2], timeout) for task in tasks]
+        if n_jobs == 1 or len(tasks) <= 1:
+            results = [_inspect_file_with_timeout(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as executor:
+                results = list(executor.map(_inspect_file_with_timeout, *zip(*args), chunksize=max(1, len(tasks) // (n_jobs * 4))))
+
+        new_info = []
+        for (row, file_path, _, file_size, file_mtime), (info, failed) in zip(tasks, results):
+            data[row][8:] = [str(x) for x in info]
+            if not failed:
+                new_info.append((os.path.abspath(file_path), file_size, file_mtime, info))
+        if self.cache is not None:
+            self.cache.save_files(new_info)
         df = pd.DataFrame(data, columns=["path", "level", "type", "file", "size_in_bytes", "modified", "created", "file_type", "N_page", "N_column", "N_row"])
         return df
 
-    def list_files_string(self):
+    def list_files_string(self, refresh=False):
         """
         List files in the specified directory using the default output format.
 
+        Args:
+            refresh (bool): Whether to rescan the directory tree. Without it, the last scan is rendered, so several
+                outputs can be rendered from one scan; a tree that was not scanned yet is scanned. Defaults to False.
+
         Returns:
             str: The file list as a string.
         """
         out0 = []
-        for s0, d0, f0 in sorted(os.walk(self.path)):
+        for s0, d0, f0, _ in self.scan(refresh=refresh):
             if s0.startswith(self.path):
                 s1 = s0[len(self.path):] if len(s0) > len(self.path) else ""
             else:
@@ -199,79 +1728,47 @@ class LsrTree:
             subindent = "... " * (level + 1)
             for f1 in sorted(f0):
                 out0.append(f"{subindent}{f1}")
-            if len(f0) == 0 and len(d0) == 0:
+            if self.__empty_folder(s0, d0, f0):
                 out0.append(f"{subindent}(((empty folder)))") 
 
         return "\n".join(out0)
 
-    def list_files_tree(self):
+    def list_files_tree(self, refresh=False):
         """
         List files in the specified directory and return the result as a tree structure.
 
+        Each folder is followed by its files and then its subfolders, both sorted by name.
+
+        Args:
+            refresh (bool): Whether to rescan the directory tree. Without it, the last scan is rendered, so several
+                outputs can be rendered from one scan; a tree that was not scanned yet is scanned. Defaults to False.
+
         Returns:
             str: The tree structure representing the file list.
         """
         pre = ['', '    ', '│   ', '├── ', '└── ', '  ']
-        data = []
-        dir_path = os.path.dirname(self.path)
+        records = {s0: (d0, f0) for s0, d0, f0, _ in self.scan(refresh=refresh)}
+        rows = []
+        stack = [(self.path, None, 0)]
+        while stack:
+            s0, parent, level = stack.pop()
+            name = os.path.basename(s0)
+            if s0 not in records:
+                rows.append((s0, parent, level, True, f"{name}/"))
+                continue
+            d0, f0 = records[s0]
+            prop = ""
+            if self.with_counts:
+                prop = f"{pre[5]}<<<((( F={len(f0)}; D={len(d0)} )))>>>" if not self.__empty_folder(s0, d0, f0) else f"{pre[5]}<<<((( Empty Folder )))>>>"
+            rows.append((s0, parent, level, True, f"{name}/{prop}"))
+            for f1 in sorted(f0):
+                rows.append((os.path.join(s0, f1), s0, level + 1, False, f1))
+            for d1 in sorted(d0, reverse=True):
+                stack.append((os.path.join(s0, d1), s0, level + 1))
 
-        for s0, d0, f0 in sorted(os.walk(self.path)):
-            if s0.startswith(dir_path):
-                s1 = s0[len(dir_path):] if len(s0) > len(dir_path) else ""
-            else:
-                s1 = s0 
-            if s1 and s1.startswith('/'):
-                s1 = s1[1:] 
-            level = s1.count(os.sep)
-            if len(d0) + len(f0) > 0:
-                if self.with_counts:
-                    data.append((os.path.dirname(s1), level, "folder", os.path.basename(s1), f"{pre[5]}<<<((( F={len(f0)}; D={len(d0)} )))>>>"))
-                else:
-                    data.append((os.path.dirname(s1), level, "folder", os.path.basename(s1), ""))
-                for index, f1 in enumerate(sorted(f0)):
-                    data.append((s1, level + 1, "file", f1, ""))
-                for index, d1 in enumerate(sorted(d0)):
-                    data.append((s1, level + 1, "folder", d1, ""))
-            else:
-                if self.with_counts:
-                    data.append((os.path.dirname(s1), level, "folder", os.path.basename(s1), f"{pre[5]}<<<((( Empty Folder )))>>>"))
-                else:
-                    data.append((os.path.dirname(s1), level, "folder", os.path.basename(s1), ""))
-
-        colnames = ["path", "level", "type", "file", "property"]
-        df0 = pd.DataFrame(data, columns=colnames)
-        df0['row_index'] = df0.index
-
-        df = df0.groupby(df0.columns.difference(['property', 'row_index']).tolist(), sort=False).agg({'row_index': 'max', 'property': lambda x: ''.join(x)}).reset_index().sort_values('row_index')
-        prelst = pd.DataFrame([['' for _ in range(df['level'].max())] for _ in range(len(df))])
-        prelst = pd.concat([prelst, df], axis=1).sort_values('row_index')
-        prelst.reset_index(drop=True, inplace=True)
-        prelst['row_index'] = prelst.index
-
-        for index, row in prelst.iterrows():
-            if row['level'] > 0:
-                prelst.loc[index, :(row['level'] - 1)] = [pre[1]] * (row['level'])
-
-        folder_paths = prelst[prelst['type'] == 'folder'][['path', 'file', 'level']].apply(lambda row: (os.path.join(row['path'], row['file']), row['level']), axis=1)
-        for folder_path, level in folder_paths:
-            index_set = prelst[prelst['path'] == folder_path]['row_index']
-
-            if not index_set.empty:
-                min_row_index = index_set.min()
-                max_row_index = index_set.max()
-                prelst.loc[(min_row_index):(max_row_index), level] = [pre[2]] * (max_row_index - min_row_index + 1)
-                prelst.loc[index_set, level] = [pre[3]] * len(index_set)
-                prelst.loc[max_row_index, level] = pre[4]
-
-        prelst['file'] = prelst.apply(lambda row: row['file'] + '/' + row['property'] if row['type'] == 'folder' else row['file'], axis=1)
-
-        prelst = prelst.loc[:, :'file']
-        prelst_joined = prelst.apply(lambda row: ''.join(row), axis=1)
-        return "\n".join(prelst_joined)
+        return "\n".join(render_tree(rows))
 
 if __name__ == "__main__":
     #lsr = LsrTree("mtbp3/data/test_lsr", outfmt="list")
     #print(lsr.list_files())
     pass
-
-
@@ -1,7 +1,7 @@
 import unittest
 import pandas as pd
 import numpy as np
-from mtbp3Lab.statlab.corr import CorrCalculator
+from mtbp3Lab.statlab.corr import CorrCalculator, OnlineCorrCalculator
 import matplotlib.pyplot as plt
 
 class TestCorrCalculator(unittest.TestCase):
@@ -22,9 +22,97 @@ class TestCorrCalculator(unittest.TestCase):
         tau = self.corr_calculator_list.calculate_kendall_tau()
         self.assertEqual(tau, expected_tau)
 
+    def test_calculate_kendall_tau_merge_matches_matrix(self):
+        rng = np.random.default_rng(2024)
+        for _ in range(20):
+            y1 = rng.integers(0, 5, size=40).tolist()
+            y2 = rng.integers(0, 4, size=40).tolist()
+            calc = CorrCalculator([y1, y2])
+            self.assertAlmostEqual(calc.calculate_kendall_tau(method='merge'), calc.calculate_kendall_tau(method='matrix'), places=12)
+
+    def test_calculate_kendall_tau_with_ties(self):
+        calc = CorrCalculator([[1, 2, 2, 3, 4], [1, 3, 2, 2, 5]])
+        self.assertAlmostEqual(calc.calculate_kendall_tau(), 0.6666666666666666, places=12)
+
+    def test_calculate_spearman_rho(self):
+        calc = CorrCalculator([[1, 2, 2, 3, 4], [1, 3, 2, 2, 5]])
+        expected_rho = pd.DataFrame({'x': [1, 2, 2, 3, 4], 'y': [1, 3, 2, 2, 5]}).corr(method='spearman').iloc[0, 1]
+        self.assertAlmostEqual(calc.calculate_spearman_rho(), expected_rho, places=12)
+
+    def test_calculate_corr_matrix_pairwise(self):
+        rng = np.random.default_rng(7)
+        y_df = pd.DataFrame(rng.integers(0, 6, size=(60, 4)).astype(float), columns=['a', 'b', 'c', 'd'])
+        y_df = y_df.mask(rng.random(y_df.shape) < 0.1)
+        calc = CorrCalculator(y_df, remove_na='pairwise')
+        for method in ['kendall', 'spearman']:
+            corr = calc.calculate_corr_matrix(method=method)
+            self.assertListEqual(corr.columns.tolist(), ['a', 'b', 'c', 'd'])
+            np.testing.assert_allclose(corr.values, y_df.corr(method=method).values, atol=1e-12)
+
+    def test_calculate_corr_matrix_n_jobs(self):
+        y_df = pd.DataFrame(np.random.default_rng(8).normal(size=(30, 5)))
+        calc = CorrCalculator(y_df)
+        corr1 = calc.calculate_corr_matrix(method='kendall', n_jobs=1)
+        corr2 = calc.calculate_corr_matrix(method='kendall', n_jobs=2)
+        self.assertTrue(corr1.equals(corr2))
+
+    def test_y_arr_storage(self):
+        y_df = pd.DataFrame({'x': [1.0, 2.0, np.nan, 4.0], 'y': [2.0, 1.0, 3.0, 5.0]})
+        calc = CorrCalculator(y_df)
+        self.assertEqual(calc.y_arr.dtype, np.float64)
+        self.assertTrue(calc.y_arr.flags['F_CONTIGUOUS'])
+        self.assertEqual(calc.y_arr.shape, (3, 2))
+        self.assertListEqual(calc.y_list, [[1.0, 2.0, 4.0], [2.0, 1.0, 5.0]])
+        self.assertListEqual(calc.y_df.index.tolist(), [0, 1, 3])
+        with self.assertRaises(ValueError):
+            CorrCalculator(y_df, remove_na=False)
+
+    def test_y_arr_with_strings(self):
+        calc = CorrCalculator([['a', 'c', None, 'b'], [1, 3, 2, 2]])
+        self.assertListEqual(calc.y_categories[0].tolist(), ['a', 'b', 'c'])
+        self.assertListEqual(calc.y_list, [['a', 'c', 'b'], [1, 3, 2]])
+        self.assertAlmostEqual(calc.calculate_kendall_tau(), 1.0, places=12)
+
     def test_plot_y_list(self):
         self.corr_calculator_df.plot_y_list()
         # No assertion, just checking if the plot is displayed correctly
 
+class TestOnlineCorrCalculator(unittest.TestCase):
+
+    def test_update_matches_corr_calculator(self):
+        rng = np.random.default_rng(11)
+        online = OnlineCorrCalculator(block_size=4)
+        y1 = []
+        y2 = []
+        for size in [30, 5, 12, 0, 40, 3]:
+            x_batch = rng.integers(0, 6, size=size).tolist()
+            y_batch = (np.array(x_batch) + rng.integers(0, 4, size=size)).tolist()
+            online.update(x_batch, y_batch)
+            y1 += x_batch
+            y2 += y_batch
+            calc = CorrCalculator([y1, y2])
+            self.assertAlmostEqual(online.calculate_kendall_tau(), calc.calculate_kendall_tau(), places=12)
+        self.assertAlmostEqual(online.calculate_spearman_rho(), calc.calculate_spearman_rho(), places=12)
+        self.assertAlmostEqual(online.recompute(), calc.calculate_kendall_tau(), places=12)
+
+    def test_update_one_pair_at_a_time(self):
+        rng = np.random.default_rng(12)
+        online = OnlineCorrCalculator(block_size=3)
+        y1 = rng.integers(0, 8, size=100).tolist()
+        y2 = rng.integers(0, 5, size=100).tolist()
+        online.update(y1[:2], y2[:2])
+        for k in range(2, 100):
+            online.update([y1[k]], [y2[k]])
+            if k % 11 == 0:
+                self.assertAlmostEqual(online.calculate_kendall_tau(), CorrCalculator([y1[:k + 1], y2[:k + 1]]).calculate_kendall_tau(), places=12)
+        self.assertAlmostEqual(online.calculate_kendall_tau(), CorrCalculator([y1, y2]).calculate_kendall_tau(), places=12)
+
+    def test_update_ignores_na(self):
+        online = OnlineCorrCalculator()
+        online.update([1, 2, np.nan, 4], [1, 2, 3, np.nan])
+        online.update([3], [3])
+        self.assertEqual(online.n, 3)
+        self.assertEqual(online.calculate_kendall_tau(), 1.0)
+
 if __name__ == "__main__":
     unittest.main()
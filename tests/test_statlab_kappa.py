@@ -1,6 +1,11 @@
 import unittest
-from mtbp3Lab.statlab.kappa import KappaCalculator
+import numpy as np
+from mtbp3Lab.statlab.kappa import KappaCalculator, FleissKappaAccumulator, calculate_batch_kappa, _fleiss_kappa_jackknife, _fleiss_kappa_delta_var
 import statsmodels.stats.inter_rater as ir
+import pandas as pd
+import os
+import tempfile
+import warnings
 
 class TestKappaCalculator(unittest.TestCase):
 
@@ -21,12 +26,124 @@ class TestKappaCalculator(unittest.TestCase):
         self.assertGreaterEqual(self.c1.cohen_kappa, -1)
         self.assertLessEqual(self.c1.cohen_kappa, 1)
 
+    def test_cohen_with_category_from_one_rater(self):
+        c = KappaCalculator([['b', 'a', 'a', 'c', 'a'], ['a', 'a', 'b', 'c', 'd']])
+        gt0 = ir.cohens_kappa([[1, 1, 0, 1], [1, 0, 0, 0], [0, 0, 1, 0], [0, 0, 0, 0]])
+        self.assertAlmostEqual(gt0.kappa, c.cohen_kappa, places=6)
+        self.assertListEqual(c.y_code_category.tolist(), ['a', 'b', 'c', 'd'])
+
     def test_bootstrap_cohen_ci(self):
         result = self.c1.bootstrap_cohen_ci(n_iterations=1000, confidence_level=0.95, out_digits=6)
         self.assertIsInstance(result, str)
         self.assertIn("Cohen's kappa:", result)
         self.assertIn("Confidence Interval", result)
 
+    def test_bootstrap_cohen_ci_seed(self):
+        result1 = self.c1.bootstrap_cohen_ci(n_iterations=500, outfmt='list', seed=123, chunk_size=70)
+        result2 = self.c1.bootstrap_cohen_ci(n_iterations=500, outfmt='list', seed=np.random.default_rng(123), chunk_size=70)
+        self.assertListEqual(result1, result2)
+        self.assertLessEqual(result1[3], self.c1.cohen_kappa)
+        self.assertGreaterEqual(result1[4], self.c1.cohen_kappa)
+
+    def test_bootstrap_cohen_ci_n_jobs(self):
+        result1 = self.c1.bootstrap_cohen_ci(n_iterations=1000, outfmt='list', seed=5, chunk_size=300, n_jobs=1)
+        result2 = self.c1.bootstrap_cohen_ci(n_iterations=1000, outfmt='list', seed=5, chunk_size=300, n_jobs=2)
+        self.assertListEqual(result1, result2)
+
+    def test_bootstrap_fleiss_ci(self):
+        result = self.c2.bootstrap_fleiss_ci(n_iterations=1000, outfmt='string', seed=5)
+        self.assertIn("Fleiss' kappa:", result)
+        result1 = self.c2.bootstrap_fleiss_ci(n_iterations=1000, outfmt='list', seed=5, chunk_size=300, n_jobs=1)
+        result2 = self.c2.bootstrap_fleiss_ci(n_iterations=1000, outfmt='list', seed=5, chunk_size=300, n_jobs=2)
+        self.assertListEqual(result1, result2)
+        self.assertAlmostEqual(result1[0], self.c2.fleiss_kappa, places=12)
+        self.assertLess(result1[3], result1[4])
+
+    def test_bootstrap_ci_degenerate_replicates(self):
+        c = KappaCalculator([['a', 'b', 'a'], ['a', 'b', 'a']])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            result = c.bootstrap_cohen_ci(n_iterations=50, seed=0)
+            self.assertIn("Confidence Interval (95.0%): [1.000000, 1.000000]", result)
+            self.assertRegex(result, r"undefined kappa dropped: \d+ of 50")
+            for method in ['percentile', 'bca']:
+                result = c.bootstrap_fleiss_ci(n_iterations=50, seed=0, outfmt='list', method=method)
+                self.assertTrue(np.isfinite(result[3:]).all())
+            c = KappaCalculator(pd.DataFrame({'x': [2, 0], 'y': [0, 2]}), infmt='count_df')
+            result = c.bootstrap_fleiss_ci(n_iterations=50, seed=0, outfmt='list')
+            self.assertTrue(np.isfinite(result[3:]).all())
+
+    def test_fleiss_kappa_jackknife(self):
+        y_count = self.c2.y_count.to_numpy()
+        patterns, freq = np.unique(y_count, axis=0, return_counts=True)
+        jackknife = _fleiss_kappa_jackknife(patterns, freq)
+        for q in range(len(patterns)):
+            i = np.flatnonzero((y_count == patterns[q]).all(axis=1))[0]
+            self.assertAlmostEqual(jackknife[q], ir.fleiss_kappa(np.delete(y_count, i, axis=0)), places=10)
+
+    def test_bootstrap_fleiss_ci_bca(self):
+        result = self.c2.bootstrap_fleiss_ci(n_iterations=2000, outfmt='list', seed=5, method='bca')
+        self.assertEqual(len(result), 5)
+        self.assertLess(result[3], result[4])
+        self.assertLessEqual(result[3], self.c2.fleiss_kappa)
+        self.assertGreaterEqual(result[4], self.c2.fleiss_kappa)
+
+    def test_fleiss_z_test(self):
+        result = self.c2.fleiss_z_test(outfmt='list')
+        y = self.c2.y_count.to_numpy(dtype=float)
+        n, R = y.shape[0], y[0].sum()
+        p = y.sum(axis=0) / (n * R)
+        S_p2, S_p3 = (p ** 2).sum(), (p ** 3).sum()
+        var = 2 / (n * R * (R - 1)) * (S_p2 - (2 * R - 3) * S_p2 ** 2 + 2 * (R - 2) * S_p3) / (1 - S_p2) ** 2
+        self.assertAlmostEqual(result[1], var, places=12)
+        self.assertAlmostEqual(result[2], self.c2.fleiss_kappa / np.sqrt(var), places=10)
+        self.assertTrue(0 <= result[3] <= 1)
+        self.assertAlmostEqual(self.c2.fleiss_z_test(outfmt='list', alternative='two-sided')[3], 2 * min(result[3], 1 - result[3]), places=10)
+
+    def test_asymptotic_fleiss_ci(self):
+        result = self.c2.asymptotic_fleiss_ci(outfmt='list')
+        patterns, freq = np.unique(self.c2.y_count.to_numpy(dtype=float), axis=0, return_counts=True)
+        jackknife = _fleiss_kappa_jackknife(patterns, freq)
+        n = freq.sum()
+        jackknife_var = (n - 1) / n * (freq @ (jackknife - freq @ jackknife / n) ** 2)
+        self.assertAlmostEqual(result[1], _fleiss_kappa_delta_var(patterns, freq), places=12)
+        self.assertAlmostEqual(result[1] / jackknife_var, 1, delta=0.1)
+        self.assertLess(result[3], self.c2.fleiss_kappa)
+        self.assertGreater(result[4], self.c2.fleiss_kappa)
+
+    def test_sample_df(self):
+        y_df = pd.DataFrame({'r1': [1, 2, None, 1, None, 3], 'r2': [1, None, 1, None, 2, 3], 'r3': [None, 2, 1, 1, 1, None]})
+        c = KappaCalculator(y_df, infmt='sample_df')
+        self.assertListEqual(c.y_count.columns.tolist(), ['1.0', '2.0', '3.0'])
+        self.assertListEqual(c.y_count.sum(axis=1).tolist(), [2.0] * 6)
+        self.assertAlmostEqual(c.fleiss_kappa, ir.fleiss_kappa(c.y_count), places=10)
+        self.assertListEqual(c.y_list[2], ['stringna', '2.0', '1.0', '1.0', '1.0', 'stringna'])
+
+    def test_sample_list_with_stringna(self):
+        c = KappaCalculator([['a', 'NA', 'b', 'a'], ['NA', 'b', 'NA', 'a'], ['a', 'a', 'a', 'NA']], stringna='NA')
+        self.assertListEqual(c.y_count.values.tolist(), [[2, 0], [1, 1], [1, 1], [2, 0]])
+        self.assertEqual(c.n_rater, 2)
+
+    def test_count_sq_df(self):
+        y_count_sq = pd.DataFrame([[5, 2, 0], [1, 7, 3], [0, 2, 9]], index=['a', 'b', 'c'], columns=['a', 'b', 'c'])
+        c = KappaCalculator(y_count_sq, infmt='count_sq_df')
+        self.assertAlmostEqual(c.cohen_kappa, ir.cohens_kappa(y_count_sq.values).kappa, places=10)
+        self.assertEqual(c.y_count.shape, (29, 3))
+        self.assertAlmostEqual(c.fleiss_kappa, ir.fleiss_kappa(c.y_count), places=10)
+        self.assertEqual(len(c.y_list[0]), 29)
+        result = c.bootstrap_cohen_ci(n_iterations=500, outfmt='list', seed=1)
+        self.assertLess(result[3], result[4])
+
+    def test_weighted_cohen_kappa(self):
+        y_count_sq = pd.DataFrame([[5, 2, 0], [1, 7, 3], [0, 2, 9]], index=[1, 2, 3], columns=[1, 2, 3])
+        c = KappaCalculator(y_count_sq, infmt='count_sq_df')
+        self.assertAlmostEqual(c.calculate_weighted_cohen_kappa('linear'), ir.cohens_kappa(y_count_sq.values, wt='linear').kappa, places=10)
+        self.assertAlmostEqual(c.calculate_weighted_cohen_kappa('quadratic'), ir.cohens_kappa(y_count_sq.values, wt='quadratic').kappa, places=10)
+        self.assertAlmostEqual(c.calculate_weighted_cohen_kappa('unweighted'), c.cohen_kappa, places=10)
+        result = c.bootstrap_cohen_ci(n_iterations=500, outfmt='list', seed=1, weights='quadratic')
+        self.assertAlmostEqual(result[0], c.calculate_weighted_cohen_kappa('quadratic'), places=10)
+        self.assertLess(result[3], result[4])
+
     def test_fleiss_kappa(self):
         gt1 = ir.fleiss_kappa(self.c1.y_count)
         gt2 = ir.fleiss_kappa(self.c2.y_count)
@@ -36,5 +153,90 @@ class TestKappaCalculator(unittest.TestCase):
         self.assertGreaterEqual(gt2, -1)
         self.assertLessEqual(gt2, 1)
 
+class TestCalculateBatchKappa(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        truth = rng.integers(0, 4, (3, 60))
+        self.ratings = np.clip(truth[:, :, np.newaxis] + rng.integers(-1, 2, (3, 60, 3)), 0, 3)
+        self.df = pd.DataFrame({
+            'endpoint': np.repeat(['e1', 'e2', 'e3'], 60 * 3),
+            'subject': np.tile(np.repeat(np.arange(60), 3), 3),
+            'rater': np.tile(['a', 'b', 'c'], 3 * 60),
+            'rating': self.ratings.ravel(),
+        }).sample(frac=1, random_state=1)
+
+    def test_batch_kappa(self):
+        result = calculate_batch_kappa(self.df)
+        self.assertEqual(len(result), 3 * 4)
+        for e, endpoint in enumerate(['e1', 'e2', 'e3']):
+            r = result[result['endpoint'] == endpoint]
+            cohen = r[(r['method'] == 'cohen') & (r['rater_1'] == 'a') & (r['rater_2'] == 'c')]
+            c = KappaCalculator([self.ratings[e, :, 0].tolist(), self.ratings[e, :, 2].tolist()])
+            self.assertAlmostEqual(cohen['kappa'].iloc[0], c.cohen_kappa, places=10)
+            fleiss = r[r['method'] == 'fleiss']
+            self.assertEqual(fleiss['n_rater'].iloc[0], 3)
+            self.assertAlmostEqual(fleiss['kappa'].iloc[0], ir.fleiss_kappa(ir.aggregate_raters(self.ratings[e])[0]), places=10)
+
+    def test_batch_kappa_missing_and_n_jobs(self):
+        df = self.df.copy()
+        df.loc[(df['endpoint'] == 'e2') & (df['subject'] < 10) & (df['rater'] == 'b'), 'rating'] = np.nan
+        result = calculate_batch_kappa(df)
+        r = result[(result['endpoint'] == 'e2')].set_index(['rater_1', 'rater_2'])
+        self.assertEqual(r.loc[('a', 'b'), 'n_subject'], 50)
+        self.assertEqual(r.loc[('a', 'c'), 'n_subject'], 60)
+        self.assertEqual(result[(result['endpoint'] == 'e2') & (result['method'] == 'fleiss')]['n_subject'].iloc[0], 50)
+        pd.testing.assert_frame_equal(result, calculate_batch_kappa(df, n_jobs=2))
+
+class TestFleissKappaAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame(rng.choice(['x', 'y', 'z'], (300, 4)), columns=['r1', 'r2', 'r3', 'r4'])
+        self.c = KappaCalculator(self.df, infmt='sample_df')
+
+    def test_update_sample_df(self):
+        acc = FleissKappaAccumulator()
+        for i in range(0, 300, 70):
+            acc.update(self.df.iloc[i:i + 70])
+        self.assertEqual(acc.n_sample, 300)
+        self.assertAlmostEqual(acc.fleiss_kappa, self.c.fleiss_kappa, places=10)
+
+    def test_update_count_df(self):
+        acc = FleissKappaAccumulator(infmt='count_df')
+        acc.update(self.c.y_count.iloc[:100])
+        acc.update(self.c.y_count.iloc[100:, ::-1])
+        self.assertAlmostEqual(acc.fleiss_kappa, self.c.fleiss_kappa, places=10)
+
+    def test_update_csv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ratings.csv')
+            self.df.to_csv(path, index=False)
+            acc = FleissKappaAccumulator().update_csv(path, chunksize=64)
+        self.assertAlmostEqual(acc.fleiss_kappa, self.c.fleiss_kappa, places=10)
+
+    def test_update_csv_mixed_dtypes(self):
+        df = pd.DataFrame({'r1': ['1', '1', '2', '1', '2', 'x', '1', '2', '2', 'x'],
+                           'r2': ['1', '2', '2', '1', '1', '1', 'x', '2', '1', 'x'],
+                           'r3': ['1', '1', '2', '2', '2', 'x', '1', 'x', '2', 'x']})
+        c = KappaCalculator(df, infmt='sample_df')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ratings.csv')
+            df.to_csv(path, index=False)
+            chunks = [chunk['r1'].dtype for chunk in pd.read_csv(path, chunksize=5)]
+            self.assertNotEqual(chunks[0], chunks[1])
+            acc = FleissKappaAccumulator().update_csv(path, chunksize=5)
+        self.assertListEqual(sorted(acc.category), ['1', '2', 'x'])
+        self.assertAlmostEqual(acc.fleiss_kappa, c.fleiss_kappa, places=10)
+        acc = FleissKappaAccumulator().update(df.iloc[:5].astype(int)).update(df.iloc[5:])
+        self.assertAlmostEqual(acc.fleiss_kappa, c.fleiss_kappa, places=10)
+
+    def test_fleiss_kappa_var(self):
+        acc = FleissKappaAccumulator(infmt='count_df').update(pd.DataFrame([[4, 1, 0], [1, 2, 2]] * 50))
+        p = np.array([250, 150, 100]) / 500
+        S_p2, S_p3 = (p ** 2).sum(), (p ** 3).sum()
+        expected = 2 / (100 * 5 * 4) * (S_p2 - 7 * S_p2 ** 2 + 6 * S_p3) / (1 - S_p2) ** 2
+        self.assertAlmostEqual(acc.fleiss_kappa_var, expected, places=12)
+
 if __name__ == "__main__":
     unittest.main()
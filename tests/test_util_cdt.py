@@ -53,5 +53,30 @@ class TestCdt(unittest.TestCase):
         result = cdt.diff_2cols_in_2df(self.df1, self.df2, 'gp', 'gp')
         self.assertEqual(result, expected_output)
 
+class TestListTree(unittest.TestCase):
+
+    def test_list_tree(self):
+        lst = ['r/', 'r/a/', 'r/a/x', 'r/a/y/', 'r/a/y/z', 'r/b/', 'r/c']
+        tree = cdt.ListTree(lst).list_tree()
+        expected = ['    r:', '    ├── a:', '    │   ├── x', '    │   └── y:', '    │       └── z', '    ├── b:', '    └── c']
+        self.assertEqual(tree.tolist(), expected)
+
+    def test_list_tree_to_right(self):
+        lst = ['a/', 'a/b/', 'a/b/c', 'a/d']
+        tree = cdt.ListTree(lst, label=['<0>', '<1>', '<2>', '<3>']).list_tree(to_right=True)
+        expected = ['        <0>a    ', '    <1>b ──┤    ', '<2>c ──┘   │    ', '    <3>d ──┘    ']
+        self.assertEqual(tree.tolist(), expected)
+
+    def test_list_tree_sorts_by_path_component(self):
+        lst = ['r/', 'r/a/', 'r/a/b', 'r/a-b', 'r/c']
+        tree = cdt.ListTree(lst).list_tree()
+        expected = ['    r:', '    ├── a:', '    │   └── b', '    ├── a-b', '    └── c']
+        self.assertEqual(tree.tolist(), expected)
+
+    def test_render_tree(self):
+        rows = [('r', None, 0, True, 'r/'), ('r/a', 'r', 1, True, 'a/'), ('r/a/x', 'r/a', 2, False, 'x'), ('r/b', 'r', 1, False, 'b')]
+        self.assertEqual(cdt.render_tree(rows), ['r/', '├── a/', '│   └── x', '└── b'])
+        self.assertEqual(cdt.render_tree(rows, to_right=True), ['r/', 'a/ ──┤', 'x ──┘   │', 'b ──┘'])
+
 if __name__ == "__main__":
     unittest.main()
@@ -3,6 +3,13 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 import unittest
 from mtbp3Lab import util
 import os
+import tempfile
+from unittest import mock
+import zipfile
+import zlib
+import pandas as pd
+import time
+import threading
 
 
 class TestLsrTree(unittest.TestCase):
@@ -47,5 +54,539 @@ class TestLsrTree(unittest.TestCase):
         expected_files = 'testfolder2/  <<<((( F=2; D=0 )))>>>\n├── testfile20\n└── testfile3'
         self.assertEqual(files, expected_files)
 
+class TestListFilesTree(unittest.TestCase):
+
+    def test_list_files_tree_nesting(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, 'r')
+            for d in ['a/b', 'a-b', 'e']:
+                os.makedirs(os.path.join(root, d))
+            for f in ['a/f1', 'a/b/f2', 'a-b/f3', 'f5']:
+                open(os.path.join(root, f), 'w').close()
+            tree = util.lsr.LsrTree(root, outfmt="tree", with_counts=True).list_files()
+        expected = 'r/  <<<((( F=1; D=3 )))>>>\n├── f5\n├── a/  <<<((( F=1; D=1 )))>>>\n│   ├── f1\n│   └── b/  <<<((( F=1; D=0 )))>>>\n│       └── f2\n├── a-b/  <<<((( F=1; D=0 )))>>>\n│   └── f3\n└── e/  <<<((( Empty Folder )))>>>'
+        self.assertEqual(tree, expected)
+
+class TestScanDirTree(unittest.TestCase):
+
+    def test_scan_dir_tree_matches_os_walk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for d in ['a/b/c', 'a-b', 'a.b/x', 'e']:
+                os.makedirs(os.path.join(tmp, d))
+            for f in ['a/f1', 'a/b/f2', 'a-b/f3', 'a.b/x/f4', 'f5']:
+                with open(os.path.join(tmp, f), 'w') as fp:
+                    fp.write('x' * len(f))
+            os.symlink(os.path.join(tmp, 'a'), os.path.join(tmp, 'link_a'))
+            os.symlink(os.path.join(tmp, 'missing'), os.path.join(tmp, 'broken'))
+            expected = [(s0, sorted(d0), sorted(f0)) for s0, d0, f0 in sorted(os.walk(tmp))]
+            for n_threads in [1, 4]:
+                records = util.lsr.scan_dir_tree(tmp, n_threads=n_threads, with_stat=True)
+                self.assertEqual([(s0, sorted(d0), sorted(f0)) for s0, d0, f0, _ in records], expected)
+            stats = dict(zip(records[0][2], records[0][3]))
+            self.assertEqual(stats['f5'][0], 2)
+            self.assertIsNone(stats['broken'])
+
+class TestEntryTable(unittest.TestCase):
+
+    def test_entry_table(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'a', 'b'))
+            for f in ['x.csv', 'a/y.pdf', 'a/b/z']:
+                with open(os.path.join(tmp, f), 'w') as fp:
+                    fp.write(f)
+            records = util.lsr.scan_dir_tree(tmp, with_stat=True)
+            table = util.lsr.EntryTable(tmp, records)
+            self.assertEqual(list(table), records)
+            self.assertEqual((table.n_dirs, table.n_files), (3, 3))
+            self.assertEqual(table.dir_parent.tolist(), [-1, 0, 1])
+            self.assertEqual(table.dir_level.tolist(), [0, 1, 2])
+            df = table.to_dataframe()
+        self.assertEqual(str(df['size_in_bytes'].dtype), 'int64')
+        self.assertEqual(str(df['modified'].dtype), 'datetime64[ns]')
+        self.assertEqual(str(df['file_type'].dtype), 'category')
+        self.assertEqual(df['path'].astype(str).tolist(), ['', '/a', '/a/b'])
+        self.assertEqual(df['size_in_bytes'].tolist(), [5, 7, 5])
+
+    def test_list_files_rescans(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for f in ['a', 'b']:
+                open(os.path.join(tmp, f), 'w').close()
+            for outfmt in ['list', 'json', 'string', 'dataframe', 'tree']:
+                lsrt = util.lsr.LsrTree(tmp, outfmt=outfmt)
+                first = lsrt.list_files()
+                open(os.path.join(tmp, 'c_' + outfmt), 'w').close()
+                second = lsrt.list_files()
+                self.assertNotEqual(str(first), str(second))
+                self.assertIn('c_' + outfmt, str(second) if outfmt != 'dataframe' else second['file'].tolist())
+            self.assertIs(lsrt.scan(), lsrt.entries)
+
+    def test_render_one_scan(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for f in ['a/x.csv', 'a/b/y.csv', 'c/z.txt']:
+                os.makedirs(os.path.dirname(os.path.join(tmp, f)), exist_ok=True)
+                open(os.path.join(tmp, f), 'w').close()
+            lsrt = util.lsr.LsrTree(tmp, n_threads=1)
+            with mock.patch('os.scandir', wraps=os.scandir) as scandir:
+                files = lsrt.list_files_list()
+                self.assertEqual(scandir.call_count, 4)
+                text = lsrt.list_files_string()
+                lsrt.list_files_tree()
+                lsrt.list_files_json()
+                self.assertEqual(scandir.call_count, 4)
+                lsrt.list_files_list(refresh=True)
+                self.assertEqual(scandir.call_count, 8)
+            self.assertEqual(len(files), 3)
+            self.assertIn('z.txt', text)
+
+class TestIterEntries(unittest.TestCase):
+
+    def test_iter_dir_tree_matches_os_walk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for d in ['a/b/c', 'a-b', 'a.b/x', 'e']:
+                os.makedirs(os.path.join(tmp, d))
+            for f in ['a/f1', 'a/b/f2', 'a-b/f3', 'a.b/x/f4', 'f5']:
+                open(os.path.join(tmp, f), 'w').close()
+            expected = [(s0, sorted(d0), sorted(f0)) for s0, d0, f0 in sorted(os.walk(tmp))]
+            for n_threads in [1, 3]:
+                records = util.lsr.iter_dir_tree(tmp, n_threads=n_threads, prefetch=2)
+                self.assertEqual([(s0, sorted(d0), sorted(f0)) for s0, d0, f0, _ in records], expected)
+
+    def test_iter_dir_tree_keeps_reads_concurrent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(60):
+                for j in range(4):
+                    os.makedirs(os.path.join(tmp, f'd{i:02d}', f's{j}'))
+            scan_dir = util.lsr._scan_dir
+            threads = []
+
+            def record(*args, **kwargs):
+                threads.append(threading.current_thread() is threading.main_thread())
+                time.sleep(0.001)
+                return scan_dir(*args, **kwargs)
+
+            with mock.patch.object(util.lsr, '_scan_dir', record):
+                records = list(util.lsr.iter_dir_tree(tmp, n_threads=4))
+            self.assertEqual(len(records), 301)
+            # the directories found below the first frontier are read in the pool, not on the calling thread
+            self.assertLess(sum(threads), 30)
+
+    def test_iter_entries(self):
+        lsrt = util.lsr.LsrTree(util.get_data('test_lsr'))
+        entries = list(lsrt.iter_entries(with_stat=True))
+        self.assertEqual(entries[0].type, 'folder')
+        self.assertEqual(entries[0].name, 'test_lsr')
+        files = [os.path.join(e.path, e.name) for e in entries if e.type == 'file']
+        self.assertEqual(files, lsrt.list_files_list())
+        self.assertTrue(all(e.size is not None for e in entries if e.type == 'file'))
+        first = next(lsrt.iter_entries())
+        self.assertEqual(first.level, 0)
+
+class TestDiff(unittest.TestCase):
+
+    def _write(self, root, name, text, mtime=1000000000):
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(text)
+        os.utime(path, (mtime, mtime))
+
+    def test_diff_roots(self):
+        with tempfile.TemporaryDirectory() as old, tempfile.TemporaryDirectory() as new:
+            for root in [old, new]:
+                self._write(root, 'same.csv', 'a,b')
+                self._write(root, 'sub/touched.csv', 'x')
+            self._write(old, 'resized.csv', 'a')
+            self._write(new, 'resized.csv', 'ab')
+            self._write(old, 'edited.csv', 'a', mtime=1000000000)
+            self._write(new, 'edited.csv', 'b', mtime=1000000001)
+            self._write(old, 'sub/renamed.csv', 'move me')
+            self._write(new, 'other/renamed2.csv', 'move me')
+            self._write(old, 'gone.csv', 'gone!')
+            self._write(new, 'new.csv', 'new')
+            os.utime(os.path.join(new, 'sub/touched.csv'), (1000000002, 1000000002))
+            df = util.lsr.LsrTree(old).diff(new)
+            self.assertEqual(list(zip(df['status'], df['path'])), [
+                ('modified', 'edited.csv'), ('removed', 'gone.csv'), ('added', 'new.csv'),
+                ('moved', os.path.join('other', 'renamed2.csv')), ('modified', 'resized.csv'),
+                ('modified', os.path.join('sub', 'touched.csv'))])
+            self.assertEqual(df.loc[3, 'old_path'], os.path.join('sub', 'renamed.csv'))
+            self.assertEqual(df.loc[4, ['old_size', 'new_size']].tolist(), [1, 2])
+            df = util.lsr.LsrTree(old).diff(util.lsr.LsrTree(new), with_hash=True)
+            self.assertEqual(df['path'].tolist(), ['edited.csv', 'gone.csv', 'new.csv', os.path.join('other', 'renamed2.csv'), 'resized.csv'])
+
+    def test_diff_hashes_only_changed(self):
+        with tempfile.TemporaryDirectory() as old, tempfile.TemporaryDirectory() as new:
+            for root in [old, new]:
+                self._write(root, 'same.csv', 'a,b')
+            self._write(old, 'a.csv', 'abc')
+            self._write(new, 'b.csv', 'abd', mtime=1000000005)
+            with mock.patch.object(util.lsr, '_file_hash', wraps=util.lsr._file_hash) as file_hash:
+                df = util.lsr.LsrTree(old).diff(new, with_hash=True)
+            self.assertEqual(sorted(os.path.basename(c.args[0]) for c in file_hash.call_args_list), ['a.csv', 'b.csv'])
+        self.assertEqual(list(zip(df['status'], df['path'])), [('removed', 'a.csv'), ('added', 'b.csv')])
+
+    def test_diff_saved_scan(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as out:
+            for i in range(3):
+                self._write(tmp, f'd{i}/f.csv', 'same size', mtime=1000000000 + i)
+            saved = os.path.join(out, 'scan.json')
+            util.lsr.LsrTree(tmp).scan(with_stat=True).save(saved)
+            table = util.lsr.EntryTable.load(saved)
+            self.assertEqual(list(table), list(util.lsr.LsrTree(tmp).scan(with_stat=True)))
+            self.assertEqual(len(util.lsr.LsrTree(tmp).diff(table)), 0)
+            for i in range(3):
+                os.rename(os.path.join(tmp, f'd{i}', 'f.csv'), os.path.join(tmp, f'd{2 - i}', f'g{i}.csv'))
+            self._write(tmp, 'new.csv', 'new')
+            df = util.lsr.diff_entry_tables(table, util.lsr.LsrTree(tmp).scan(with_stat=True))
+        self.assertEqual(df['status'].tolist(), ['moved'] * 3 + ['added'])
+        self.assertEqual(list(zip(df['path'], df['old_path']))[:3], [
+            (os.path.join('d0', 'g2.csv'), os.path.join('d2', 'f.csv')),
+            (os.path.join('d1', 'g1.csv'), os.path.join('d1', 'f.csv')),
+            (os.path.join('d2', 'g0.csv'), os.path.join('d0', 'f.csv'))])
+
+    def test_diff_saved_scan_with_hash(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as out:
+            self._write(tmp, 'a.txt', 'old')
+            self._write(tmp, 'sub/b.txt', 'move me')
+            self._write(tmp, 'same.txt', 'same')
+            cache = util.lsr.ScanCache(':memory:')
+            lsrt = util.lsr.LsrTree(tmp, cache=cache)
+            lsrt.scan(with_stat=True).save(os.path.join(out, 'plain.json'))
+            lsrt.file_hashes()
+            lsrt.entries.save(os.path.join(out, 'hashed.json'))
+            self._write(tmp, 'a.txt', 'new', mtime=1000000001)
+            self._write(tmp, 'same.txt', 'same', mtime=1000000001)
+            os.rename(os.path.join(tmp, 'sub', 'b.txt'), os.path.join(tmp, 'c.txt'))
+            new = util.lsr.LsrTree(tmp).scan(with_stat=True)
+            expected = [('modified', 'a.txt', ''), ('moved', 'c.txt', os.path.join('sub', 'b.txt'))]
+            with mock.patch.object(util.lsr, '_file_hash', wraps=util.lsr._file_hash) as file_hash:
+                df = util.lsr.diff_entry_tables(util.lsr.EntryTable.load(os.path.join(out, 'hashed.json')), new, with_hash=True)
+                self.assertEqual(list(zip(df['status'], df['path'], df['old_path'].fillna(''))), expected)
+                df = util.lsr.diff_entry_tables(util.lsr.EntryTable.load(os.path.join(out, 'plain.json')), new, with_hash=True, cache=cache)
+                self.assertEqual(list(zip(df['status'], df['path'], df['old_path'].fillna(''))), expected)
+                # without saved checksums, the old files of the same root are not read and changed files are modified
+                df = util.lsr.diff_entry_tables(util.lsr.EntryTable.load(os.path.join(out, 'plain.json')), new, with_hash=True)
+                self.assertEqual(list(zip(df['status'], df['path'], df['old_path'].fillna(''))), expected + [('modified', 'same.txt', '')])
+            self.assertFalse(any(os.path.join('sub', 'b.txt') in c.args[0] for c in file_hash.call_args_list))
+
+    def test_diff_filtered(self):
+        with tempfile.TemporaryDirectory() as old, tempfile.TemporaryDirectory() as new:
+            for root in [old, new]:
+                self._write(root, 'm5/ae.xpt', 'ae')
+            self._write(new, '.git/objects/x', 'x')
+            self._write(new, 'm5/dm.xpt', 'dm')
+            self._write(new, 'm5/notes.txt', 'notes')
+            df = util.lsr.LsrTree(old, exclude='.git', include='m5/*').diff(new)
+            self.assertEqual(list(zip(df['status'], df['path'])), [('added', os.path.join('m5', 'dm.xpt')), ('added', os.path.join('m5', 'notes.txt'))])
+            df = util.lsr.LsrTree(old, include='*.xpt').diff(new)
+            self.assertEqual(df['path'].tolist(), [os.path.join('m5', 'dm.xpt')])
+
+class TestFindDuplicates(unittest.TestCase):
+
+    def test_file_hash(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'x')
+            with open(path, 'wb') as fp:
+                fp.write(os.urandom(5000))
+            with open(path, 'rb') as fp:
+                expected = util.lsr.hashlib.sha256(fp.read()).hexdigest()
+            self.assertEqual(util.lsr._file_hash(path, block_size=1024), expected)
+            open(os.path.join(tmp, 'empty'), 'w').close()
+            self.assertEqual(util.lsr.hash_files([path, os.path.join(tmp, 'empty'), os.path.join(tmp, 'missing')], n_threads=2),
+                             [expected, util.lsr.hashlib.sha256(b'').hexdigest(), None])
+
+    def test_find_duplicates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for f, text in [('define.xml', '<odm/>'), ('m5/define.xml', '<odm/>'), ('m5/copy.xml', '<odm/>'),
+                            ('other.xml', '<xyz/>'), ('a.pdf', 'pdf!'), ('b/a.pdf', 'pdf!'), ('c.txt', 'unique text'),
+                            ('e1', ''), ('e2', '')]:
+                os.makedirs(os.path.dirname(os.path.join(tmp, f)), exist_ok=True)
+                with open(os.path.join(tmp, f), 'w') as fp:
+                    fp.write(text)
+            cache = util.lsr.ScanCache(':memory:')
+            lsrt = util.lsr.LsrTree(tmp, cache=cache)
+            with mock.patch.object(util.lsr, '_file_hash', wraps=util.lsr._file_hash) as file_hash:
+                df = lsrt.find_duplicates()
+                self.assertEqual(file_hash.call_count, 6)
+                self.assertTrue(util.lsr.LsrTree(tmp, cache=cache).find_duplicates().equals(df))
+                self.assertEqual(file_hash.call_count, 6)
+        self.assertEqual(df['group'].tolist(), [0, 0, 0, 1, 1])
+        self.assertEqual(df['size'].tolist(), [6, 6, 6, 4, 4])
+        self.assertEqual(df['path'].tolist(), ['define.xml', os.path.join('m5', 'copy.xml'), os.path.join('m5', 'define.xml'),
+                                               'a.pdf', os.path.join('b', 'a.pdf')])
+
+class TestPathFilter(unittest.TestCase):
+
+    def _tree(self, tmp):
+        for f in ['m5/datasets/ae.xpt', 'm5/datasets/define.xml', 'm5/datasets/sub/dm.xpt', 'm1/cover.pdf',
+                  '.git/objects/x', 'archive/old.xpt', 'top.xpt']:
+            os.makedirs(os.path.dirname(os.path.join(tmp, f)), exist_ok=True)
+            open(os.path.join(tmp, f), 'w').close()
+
+    def test_path_filter(self):
+        pf = util.lsr.PathFilter(include='m5/*.xpt', exclude=['.git', 'archive/'], max_depth=2)
+        self.assertTrue(pf.keep_file('m5/datasets/sub/ae.xpt', 'ae.xpt'))
+        self.assertFalse(pf.keep_file('top.xpt', 'top.xpt'))
+        self.assertTrue(pf.keep_dir('m5/datasets', 'datasets'))
+        self.assertFalse(pf.keep_dir('m1', 'm1'))
+        self.assertFalse(pf.keep_dir('a/.git', '.git'))
+        self.assertTrue(pf.walk_dir('m5/datasets'))
+        self.assertFalse(pf.walk_dir('m5/datasets/sub'))
+        pf = util.lsr.PathFilter(include=r'\.xpt$', exclude=r'(^|/)archive$', regex=True)
+        self.assertTrue(pf.keep_file('top.xpt', 'top.xpt'))
+        self.assertTrue(pf.keep_dir('m1', 'm1'))
+        self.assertFalse(pf.keep_dir('archive', 'archive'))
+
+    def test_filtered_walk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self._tree(tmp)
+            with mock.patch.object(util.lsr.os, 'scandir', wraps=os.scandir) as scandir:
+                lsrt = util.lsr.LsrTree(tmp, include='m5/*.xpt', exclude='.git')
+                files = lsrt.list_files_list()
+            read = sorted(os.path.relpath(c.args[0], tmp) for c in scandir.call_args_list)
+            self.assertEqual(read, ['.', 'm5', os.path.join('m5', 'datasets'), os.path.join('m5', 'datasets', 'sub')])
+            self.assertEqual(files, ['/m5/datasets/ae.xpt', '/m5/datasets/sub/dm.xpt'])
+            lsrt = util.lsr.LsrTree(tmp, exclude=['.git', 'archive'], max_depth=1)
+            self.assertEqual(lsrt.list_files_list(), ['top.xpt', '/m1/cover.pdf'])
+            self.assertEqual(lsrt.scan()[2][1], ['datasets'])
+            entries = [e for e in lsrt.iter_entries() if e.type == 'file']
+            self.assertEqual([os.path.join(e.path, e.name) for e in entries], ['top.xpt', '/m1/cover.pdf'])
+
+    def test_filtered_walk_with_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self._tree(tmp)
+            os.makedirs(os.path.join(tmp, 'm1', 'empty'))
+            cache = util.lsr.ScanCache(':memory:')
+            full = util.lsr.LsrTree(tmp, cache=cache).list_files_list()
+            filtered = util.lsr.LsrTree(tmp, cache=cache, include='*.xpt', exclude='archive', n_threads=1).list_files_list()
+            # folders that are only empty because of the filter are not marked as empty
+            self.assertEqual(filtered, ['top.xpt', '/m1/empty/(((empty folder)))', '/m5/datasets/ae.xpt', '/m5/datasets/sub/dm.xpt'])
+            self.assertEqual(util.lsr.LsrTree(tmp, include='*.xpt', exclude='archive').list_files_string().count('(((empty folder)))'), 1)
+            self.assertEqual(util.lsr.LsrTree(tmp, cache=cache).list_files_list(), full)
+
+class TestScanCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, 'root')
+        for d in ['a/b', 'c']:
+            os.makedirs(os.path.join(self.root, d))
+        for f, text in [('a/t1.csv', 'x,y\n1,2\n3,4\n'), ('a/b/t2.csv', 'x\n1\n'), ('c/f3', 'abc')]:
+            with open(os.path.join(self.root, f), 'w') as fp:
+                fp.write(text)
+        self.cache = util.lsr.ScanCache(os.path.join(self.tmp.name, 'cache.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_unchanged_dirs_are_not_read(self):
+        first = util.lsr.LsrTree(self.root, outfmt="dataframe", cache=self.cache).list_files()
+        with mock.patch('os.scandir', wraps=os.scandir) as scandir, mock.patch.object(util.lsr, '_inspect_file', wraps=util.lsr._inspect_file) as inspect:
+            second = util.lsr.LsrTree(self.root, outfmt="dataframe", cache=self.cache).list_files()
+            self.assertEqual(scandir.call_count, 0)
+            self.assertEqual(inspect.call_count, 0)
+        self.assertTrue(first.equals(second))
+
+        with open(os.path.join(self.root, 'c', 'new.csv'), 'w') as fp:
+            fp.write('x\n1\n2\n3\n')
+        with mock.patch('os.scandir', wraps=os.scandir) as scandir, mock.patch.object(util.lsr, '_inspect_file', wraps=util.lsr._inspect_file) as inspect:
+            third = util.lsr.LsrTree(self.root, outfmt="dataframe", cache=self.cache).list_files()
+            self.assertEqual(scandir.call_count, 1)
+            self.assertEqual(inspect.call_count, 1)
+        self.assertEqual(third[third['file'] == 'new.csv']['N_row'].iloc[0], '3')
+
+    def test_prune_and_limit(self):
+        util.lsr.LsrTree(self.root, outfmt="dataframe", cache=self.cache).list_files()
+        self.assertEqual(len(self.cache.load_dirs(self.root)), 4)
+        os.remove(os.path.join(self.root, 'a', 'b', 't2.csv'))
+        os.rmdir(os.path.join(self.root, 'a', 'b'))
+        self.assertEqual(self.cache.prune(self.root), 2)
+        self.assertEqual(len(self.cache.load_dirs(self.root)), 3)
+        self.cache.max_files = 1
+        self.cache.save_files([])
+        self.assertEqual(len(self.cache.load_files(self.root)), 1)
+
+class TestInspectFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_inspect_csv(self):
+        cases = ['a,b,c\n1,2,3\n4,5,6\n', 'a,b\n1,2\n3,4', 'a,b\n"x\ny",2\n3,4\n', 'a,b\n1,2\n\n3,4\n\n', 'a,b,c\n', 'a,b\r\n1,2\r\n\r\n3,4\r\n',
+                 'a,b\n1,2\n \n3,4\n\t\n', 'a,b\n1,2\r3,4\n', 'a,b\n1,2\n , \n3,4\n  ',
+                 'a,b\r1,2\r3,4\r', '\na,b\n1,2\n', ' \r\n\r\na,b\r\n1,2\r\n', '\ra,b,c\r1,2,3']
+        for i, text in enumerate(cases):
+            path = os.path.join(self.tmp.name, f'{i}.csv')
+            with open(path, 'w', newline='') as fp:
+                fp.write(text)
+            self.assertEqual(util.lsr._inspect_file(path, 'csv'), (None,) + pd.read_csv(path).shape[::-1])
+        path = os.path.join(self.tmp.name, 'empty.csv')
+        open(path, 'w').close()
+        self.assertEqual(util.lsr._inspect_file(path, 'csv'), (None, 0, 0))
+
+    def test_inspect_xlsx(self):
+        path = os.path.join(self.tmp.name, 'book.xlsx')
+        main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+        rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+        with zipfile.ZipFile(path, 'w') as z:
+            z.writestr('xl/workbook.xml', f'<workbook xmlns="{main}" xmlns:r="{rel}"><sheets><sheet name="A" sheetId="1" r:id="rId2"/><sheet name="B" sheetId="2" r:id="rId1"/></sheets></workbook>')
+            z.writestr('xl/_rels/workbook.xml.rels', '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Target="worksheets/sheet1.xml"/><Relationship Id="rId2" Target="worksheets/sheet2.xml"/></Relationships>')
+            z.writestr('xl/worksheets/sheet1.xml', f'<worksheet xmlns="{main}"><dimension ref="A1:B2"/><sheetData/></worksheet>')
+            # the declared dimension also covers the formatted empty cell B30
+            cells = ''.join(f'<row r="{r}"><c r="A{r}"><v>{r}</v></c>' + (f'<c r="AB{r}" t="inlineStr"><is><t>x</t></is></c>' if r == 4 else '') + '</row>' for r in range(1, 12))
+            z.writestr('xl/worksheets/sheet2.xml', f'<worksheet xmlns="{main}"><dimension ref="A1:AB30"/><sheetData>{cells}<row r="30"><c r="B30" s="1"/></row></sheetData></worksheet>')
+        self.assertEqual(util.lsr._inspect_file(path, 'xlsx'), (2, 28, 10))
+
+    def test_pdf_num_pages(self):
+        for n in [1, 12]:
+            writer = util.lsr.pypdf.PdfWriter()
+            for _ in range(n):
+                writer.add_blank_page(100, 100)
+            path = os.path.join(self.tmp.name, f'{n}.pdf')
+            writer.write(path)
+            self.assertEqual(util.lsr._pdf_num_pages(path), n)
+            with open(path, 'rb') as fp:
+                data = fp.read()
+            # a startxref that points at an object which is not a cross-reference stream: left to pypdf
+            stream = os.path.join(self.tmp.name, f'{n}_stream.pdf')
+            with open(stream, 'wb') as fp:
+                fp.write(data[:data.rindex(b'startxref')] + b'startxref\n%d\n%%%%EOF\n' % data.index(b'1 0 obj'))
+            self.assertIsNone(util.lsr._pdf_num_pages(stream))
+            broken = os.path.join(self.tmp.name, f'{n}_broken.pdf')
+            with open(broken, 'wb') as fp:
+                fp.write(data[:data.rindex(b'startxref')] + b'startxref\n0\n%%EOF\n')
+            self.assertIsNone(util.lsr._pdf_num_pages(broken))
+            self.assertEqual(util.lsr._inspect_file(broken, 'pdf'), (n, None, None))
+            # an incremental update that appends a new catalog and page tree
+            k = int(data[data.rindex(b'/Size') + 5:].split()[0])
+            prev = int(data[data.rindex(b'startxref') + 9:].split()[0])
+            catalog = f'{k} 0 obj\n<< /Type /Catalog /Pages {k + 1} 0 R >>\nendobj\n'.encode()
+            pages = f'{k + 1} 0 obj\n<< /Type /Pages /Kids [] /Count 0 >>\nendobj\n'.encode()
+            xref = len(data) + len(catalog) + len(pages)
+            update = catalog + pages + (f'xref\n{k} 2\n{len(data):010d} 00000 n \n{len(data) + len(catalog):010d} 00000 n \n'
+                                        f'trailer\n<< /Size {k + 2} /Root {k} 0 R /Prev {prev} >>\nstartxref\n{xref}\n%%EOF\n').encode()
+            updated = os.path.join(self.tmp.name, f'{n}_updated.pdf')
+            with open(updated, 'wb') as fp:
+                fp.write(data + update)
+            self.assertEqual(util.lsr._pdf_num_pages(updated), 0)
+            self.assertEqual(len(util.lsr.pypdf.PdfReader(updated).pages), 0)
+
+    def test_pdf_num_pages_xref_stream(self):
+        # the catalog and page tree in an object stream, indexed by a predicted cross-reference stream
+        objects = [b'<< /Type /Catalog /Pages 2 0 R >>', b'<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>']
+        header = b'1 0 2 %d ' % (len(objects[0]) + 1)
+        content = zlib.compress(header + b' '.join(objects))
+        data = b'%PDF-1.5\n'
+        offsets = []
+        for body in [b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 10 10] >>'] * 2 + [
+                b'<< /Type /ObjStm /N 2 /First %d /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream' % (len(header), len(content), content)]:
+            offsets.append(len(data))
+            data += b'%d 0 obj\n%s\nendobj\n' % (len(offsets) + 2, body)
+        offsets.append(len(data))
+        entries = [(0, 0, 0), (2, 5, 0), (2, 5, 1)] + [(1, offset, 0) for offset in offsets]
+        rows = [bytes([kind]) + offset.to_bytes(2, 'big') + bytes([index]) for kind, offset, index in entries]
+        # PNG Up rows, restarted by a None row
+        predicted = b''.join(bytes([2]) + bytes((a - b) % 256 for a, b in zip(row, prev)) if k != 3 else bytes([0]) + row
+                             for k, (row, prev) in enumerate(zip(rows, [bytes(4)] + rows)))
+        stream = zlib.compress(predicted)
+        data += (b'6 0 obj\n<< /Type /XRef /Size 7 /W [1 2 1] /Root 1 0 R /Filter /FlateDecode /DecodeParms << /Columns 4 /Predictor 12 >> /Length %d >>\n'
+                 b'stream\n%s\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n' % (len(stream), stream, offsets[-1]))
+        path = os.path.join(self.tmp.name, 'stream.pdf')
+        with open(path, 'wb') as fp:
+            fp.write(data)
+        self.assertEqual(len(util.lsr.pypdf.PdfReader(path).pages), 2)
+        self.assertEqual(util.lsr._pdf_num_pages(path), 2)
+        # an incremental update written by pypdf: a cross-reference stream with /Prev at a classic table
+        writer = util.lsr.pypdf.PdfWriter()
+        writer.add_blank_page(100, 100)
+        writer.write(path)
+        writer = util.lsr.pypdf.PdfWriter(path, incremental=True)
+        writer.add_blank_page(100, 100)
+        updated = os.path.join(self.tmp.name, 'updated.pdf')
+        writer.write(updated)
+        with open(updated, 'rb') as fp:
+            self.assertIn(b'/Type /XRef', fp.read())
+        with mock.patch.object(util.lsr.pypdf, 'PdfReader', wraps=util.lsr.pypdf.PdfReader) as reader:
+            self.assertEqual(util.lsr._inspect_file(updated, 'pdf'), (2, None, None))
+            self.assertEqual(reader.call_count, 0)
+
+    def test_inspect_pdf_fallback(self):
+        writer = util.lsr.pypdf.PdfWriter()
+        writer.add_blank_page(100, 100)
+        path = os.path.join(self.tmp.name, 'a.pdf')
+        writer.write(path)
+        with mock.patch.object(util.lsr.pypdf, 'PdfReader', wraps=util.lsr.pypdf.PdfReader) as reader:
+            self.assertEqual(util.lsr._inspect_file(path, 'pdf'), (1, None, None))
+            self.assertEqual(reader.call_count, 0)
+            with mock.patch.object(util.lsr, '_pdf_num_pages', return_value=None):
+                self.assertEqual(util.lsr._inspect_file(path, 'pdf'), (1, None, None))
+            self.assertEqual(reader.call_count, 1)
+        empty = os.path.join(self.tmp.name, 'empty.pdf')
+        open(empty, 'w').close()
+        self.assertIsNone(util.lsr._pdf_num_pages(empty))
+
+    def test_inspect_bogus_xpt(self):
+        for name in ['bogus.xpt', 'bogus2.xpt']:
+            path = os.path.join(self.tmp.name, name)
+            with open(path, 'w') as fp:
+                fp.write('not an xport file\n' * 20)
+        self.assertEqual(util.lsr._inspect_file(path, 'xpt'), (None, None, None))
+        for n_jobs in [1, 2]:
+            df = util.lsr.LsrTree(self.tmp.name, n_jobs=n_jobs).list_files_dataframe()
+            self.assertEqual(df[['N_column', 'N_row']].values.tolist(), [['None', 'None']] * 2)
+
+class TestListFilesDataframeJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for d in ['a', 'b']:
+            os.makedirs(os.path.join(self.tmp.name, d))
+            for i in range(4):
+                with open(os.path.join(self.tmp.name, d, f'{i}.csv'), 'w') as fp:
+                    fp.write('x,y\n' + '1,2\n' * i)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_n_jobs(self):
+        df1 = util.lsr.LsrTree(self.tmp.name).list_files_dataframe()
+        df2 = util.lsr.LsrTree(self.tmp.name).list_files_dataframe(n_jobs=2)
+        self.assertTrue(df1.equals(df2))
+        self.assertEqual(df2['N_row'].tolist(), ['0', '1', '2', '3'] * 2)
+
+    def test_timeout(self):
+        inspect_file = util.lsr._inspect_file
+
+        def slow_inspect_file(file_path, file_type):
+            if file_path.endswith('2.csv'):
+                time.sleep(10)
+            return inspect_file(file_path, file_type)
+
+        with mock.patch.object(util.lsr, '_inspect_file', slow_inspect_file):
+            start = time.time()
+            df = util.lsr.LsrTree(self.tmp.name, timeout=0.2).list_files_dataframe()
+            self.assertLess(time.time() - start, 5)
+        self.assertEqual(df['N_row'].tolist(), ['0', '1', 'None', '3'] * 2)
+
+    def test_unreadable_file(self):
+        writer = util.lsr.pypdf.PdfWriter()
+        writer.add_blank_page(100, 100)
+        path = os.path.join(self.tmp.name, 'a', 'truncated.pdf')
+        writer.write(path)
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        with open(path, 'wb') as fp:
+            fp.write(data[:60])
+        cache = util.lsr.ScanCache(':memory:')
+        for n_jobs in [2, 1]:
+            df = util.lsr.LsrTree(self.tmp.name, cache=cache).list_files_dataframe(n_jobs=n_jobs)
+            self.assertEqual(df.loc[df['file'] == 'truncated.pdf', 'N_page'].tolist(), ['None'])
+            self.assertEqual(df.loc[df['file_type'] == 'csv', 'N_row'].tolist(), ['0', '1', '2', '3'] * 2)
+        self.assertNotIn(os.path.abspath(path), cache.load_files(self.tmp.name))
+
 if __name__ == "__main__":
     unittest.main()